@@ -0,0 +1,232 @@
+"""Chunked, concurrent rewriting of long texts.
+
+One chat-completions call per note truncates long notes at the completion
+token limit and makes the user wait for a single long generation.
+`ChunkedRewrite` instead splits the text on headings and paragraph breaks
+into chunks of at most `budget_tokens` (see `split_for_rewrite()`),
+rewrites up to `concurrency` chunks at once, and hands the results back in
+the original order. Each chunk is one streamed request
+(`AIClient.rewrite_stream()`), retried on its own until its first token
+arrives and restarted up to `MIDSTREAM_RETRIES` times if it drops after
+that, so a transient failure repeats only its own chunk. Streaming keeps
+the client's timeout a limit on the gap between tokens rather than on the
+whole (up to `output_tokens()` long) generation, and lets `cancel()` stop
+requests in flight.
+
+Token counts are estimated from character counts (`CHARS_PER_TOKEN`);
+no tokenizer is needed for budgeting that only has to be roughly right.
+"""
+from __future__ import annotations
+import concurrent.futures
+import queue
+import re
+import threading
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .client import DEFAULT_MAX_TOKENS, AIClient
+
+# Rough average for English prose with GPT-style tokenizers.
+CHARS_PER_TOKEN = 4
+# Prompt tokens of note text per chunk.
+DEFAULT_CHUNK_TOKENS = 1000
+# Chunks rewritten at once unless `AI_NOTEPAD_REWRITE_CONCURRENCY` says
+# otherwise (see config/settings.py); keep at or below
+# `ai.session.POOL_MAXSIZE` so every request gets a pooled connection.
+DEFAULT_CONCURRENCY = 4
+# Restarts of a chunk whose stream fails after its first token.
+MIDSTREAM_RETRIES = 1
+
+_para_end_re = re.compile(r"\n{2,}")
+_heading_re = re.compile(r"^#{1,6}[ \t]", re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def output_tokens(chunk: str) -> int:
+    """Completion budget for rewriting `chunk`: room for it to grow, never below the default."""
+    return max(DEFAULT_MAX_TOKENS, 2 * estimate_tokens(chunk))
+
+
+def needs_chunking(text: str, budget_tokens: int = DEFAULT_CHUNK_TOKENS) -> bool:
+    return estimate_tokens(text) > budget_tokens
+
+
+def _blocks(text: str) -> Iterator[Tuple[str, bool]]:
+    """`(block, starts_with_heading)`: cuts after blank lines and before headings."""
+    cuts = {m.end() for m in _para_end_re.finditer(text)}
+    cuts.update(m.start() for m in _heading_re.finditer(text))
+    start = 0
+    for end in sorted(cuts | {len(text)}):
+        if end > start:
+            yield text[start:end], bool(_heading_re.match(text, start))
+            start = end
+
+
+def _units(text: str, budget_tokens: int) -> Iterator[Tuple[str, bool]]:
+    """Blocks of `text`; too-long ones come as lines, then hard slices."""
+    limit = budget_tokens * CHARS_PER_TOKEN
+    for block, heading in _blocks(text):
+        if len(block) <= limit:
+            yield block, heading
+            continue
+        for line in block.splitlines(keepends=True):
+            for i in range(0, len(line), limit):
+                yield line[i:i + limit], heading
+                heading = False
+
+
+def split_for_rewrite(text: str, budget_tokens: int = DEFAULT_CHUNK_TOKENS) -> List[str]:
+    """Cut `text` into chunks of at most `budget_tokens` (estimated).
+
+    Chunks end on paragraph breaks and, once at least half full, before a
+    Markdown heading, so a section is rewritten together where it fits.
+    Paragraphs over the budget are split on lines, and lines over it are
+    cut mid-line. Joining the chunks gives back `text` exactly.
+    """
+    chunks: List[str] = []
+    buf: List[str] = []
+    size = 0
+    for unit, heading in _units(text, budget_tokens):
+        tokens = estimate_tokens(unit)
+        if buf and (size + tokens > budget_tokens or (heading and size >= budget_tokens // 2)):
+            chunks.append("".join(buf))
+            buf, size = [], 0
+        buf.append(unit)
+        size += tokens
+    if buf:
+        chunks.append("".join(buf))
+    return chunks
+
+
+def _split_ws(chunk: str) -> Tuple[str, str, str]:
+    core = chunk.strip()
+    if not core:
+        return chunk, "", ""
+    lead = chunk[:len(chunk) - len(chunk.lstrip())]
+    trail = chunk[len(chunk.rstrip()):]
+    return lead, core, trail
+
+
+class ChunkedRewrite:
+    """Rewrite `text` chunk by chunk; iterate to get the results in order.
+
+    `make_prompt(chunk)` builds the prompt for one chunk, e.g.
+    `lambda t: build_prompt("fix_grammar", t)`. Each chunk asks for
+    `max_tokens` completion tokens, or `output_tokens(chunk)` if that is
+    None. The whitespace around each chunk is kept from the original, so
+    paragraph breaks between chunks survive the stitching.
+
+    Iterating (on a worker thread) starts the requests and yields each
+    chunk's rewrite as soon as it and every chunk before it are done. A
+    chunk that still fails after its retries, or whose answer was cut off
+    at its `max_tokens`, raises `RuntimeError` and cancels the other
+    chunks; a truncated chunk is never stitched in. `cancel()` may be called from any thread: the iteration
+    stops, chunks not yet sent are dropped, and requests in flight are
+    closed. This is the same iterate/`cancel()` interface as
+    `ai.client.RewriteStream`. Iterate once.
+    """
+
+    def __init__(
+        self,
+        client: AIClient,
+        text: str,
+        make_prompt: Callable[[str], str],
+        budget_tokens: int = DEFAULT_CHUNK_TOKENS,
+        concurrency: int = DEFAULT_CONCURRENCY,
+        max_tokens: Optional[int] = None,
+    ) -> None:
+        self.client = client
+        self.make_prompt = make_prompt
+        self.concurrency = max(1, concurrency)
+        self.max_tokens = max_tokens
+        self.chunks = split_for_rewrite(text, budget_tokens)
+        self._wakeups: queue.SimpleQueue = queue.SimpleQueue()
+        self._cancelled = False
+        self._lock = threading.Lock()
+        self._streams: set = set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            streams = list(self._streams)
+        for stream in streams:
+            stream.cancel()
+        self._wakeups.put(None)
+
+    def _rewrite_one(self, chunk: str) -> str:
+        lead, core, trail = _split_ws(chunk)
+        if self._cancelled or not core:
+            return chunk
+        max_tokens = self.max_tokens or output_tokens(core)
+        restarts = MIDSTREAM_RETRIES
+        while True:
+            stream = self.client.rewrite_stream(self.make_prompt(core), max_tokens=max_tokens)
+            with self._lock:
+                if self._cancelled:
+                    return chunk
+                self._streams.add(stream)
+            tokens: List[str] = []
+            try:
+                for token in stream:
+                    tokens.append(token)
+            except Exception:
+                # Before the first token the stream has already retried;
+                # a drop after it restarts the chunk from scratch.
+                if self._cancelled or not tokens or restarts <= 0:
+                    raise
+                restarts -= 1
+                continue
+            finally:
+                with self._lock:
+                    self._streams.discard(stream)
+            break
+        if self._cancelled:
+            return chunk
+        result = "".join(tokens)
+        if stream.finish_reason == "length":
+            raise RuntimeError(
+                f"the rewrite reached max_tokens ({max_tokens}) and was cut off; "
+                "raise max_tokens in the rewrite mode's advanced settings"
+            )
+        return lead + result.strip() + trail
+
+    def __iter__(self) -> Iterator[str]:
+        if self._cancelled or not self.chunks:
+            return
+        executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=min(self.concurrency, len(self.chunks)), thread_name_prefix="ai-chunk"
+        )
+        try:
+            futures = [executor.submit(self._rewrite_one, chunk) for chunk in self.chunks]
+            for fut in futures:
+                fut.add_done_callback(lambda _f: self._wakeups.put(None))
+            for i, fut in enumerate(futures):
+                # Any completion (or cancel()) wakes us; re-check the one we need.
+                while not fut.done() and not self._cancelled:
+                    self._wakeups.get()
+                if self._cancelled:
+                    return
+                try:
+                    piece = fut.result()
+                except Exception as e:
+                    # Stop the other chunks' requests; their results are useless now.
+                    self.cancel()
+                    raise RuntimeError(f"AI request failed for chunk {i + 1} of {len(futures)}: {e}") from e
+                yield piece
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def result(self) -> str:
+        """Run to completion and return the stitched text."""
+        return "".join(self)
+
+
+def rewrite_chunked(client: AIClient, text: str, make_prompt: Callable[[str], str], **kwargs) -> str:
+    """`ChunkedRewrite(client, text, make_prompt, **kwargs).result()`."""
+    return ChunkedRewrite(client, text, make_prompt, **kwargs).result()
@@ -1,12 +1,19 @@
 """Minimal AI client wrapper for Azure OpenAI with timeout, retries, and an in-memory request log."""
 from __future__ import annotations
+import json as jsonlib
+import threading
 import time
-from typing import Any, Callable, Optional, List, Dict
+from typing import Any, Callable, Iterable, Iterator, Optional, List, Dict
 import requests
 from requests import Response
 from config.settings import get_settings
+from . import session as http_session
 from .retry import retry_loop
 
+# Completion tokens requested per call unless the client, the call or the
+# rewrite mode (`advanced_settings["max_tokens"]`) says otherwise.
+DEFAULT_MAX_TOKENS = 512
+
 
 class AIRequestLog:
     """Ephemeral in-memory log of AI request attempts for diagnostics and retry handling."""
@@ -18,16 +25,189 @@ class AIRequestLog:
         self.entries.append({"prompt": prompt, "attempt": attempt, "success": success, "error": error, "ts": time.time()})
 
 
+def iter_sse_tokens(
+    lines: Iterable[bytes | str], on_finish: Optional[Callable[[str], None]] = None
+) -> Iterator[str]:
+    """Yield the text deltas of a chat-completions server-sent-event stream.
+
+    Each event is a `data: {json}` line; the stream ends with `data: [DONE]`.
+    Comments, blank lines and events without content (role announcements,
+    Azure's `prompt_filter_results`) are skipped. `on_finish(reason)` is
+    called with the `finish_reason` of the event that carries one.
+    """
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode("utf-8")
+        line = line.strip()
+        if not line.startswith("data:"):
+            continue
+        data = line[5:].strip()
+        if data == "[DONE]":
+            return
+        event = jsonlib.loads(data)
+        choices = event.get("choices") if isinstance(event, dict) else None
+        if not choices:
+            continue
+        delta = choices[0].get("delta") or {}
+        text = delta.get("content") or choices[0].get("text")
+        if text:
+            yield text
+        reason = choices[0].get("finish_reason")
+        if reason and on_finish is not None:
+            on_finish(reason)
+
+
+class RewriteStream:
+    """Tokens of one streamed rewrite.
+
+    Iterate on a worker thread; `cancel()` may be called from any thread and
+    closes the HTTP response, which ends the iteration (without an error)
+    even while it is blocked waiting for the next token. Iterate once.
+    After the iteration, `finish_reason` is the server's (`"length"`: the
+    answer was cut off at `max_tokens`), or None if it sent none.
+    """
+
+    def __init__(self, client: "AIClient", url: str, headers: dict, payload: dict, prompt: str) -> None:
+        self._client = client
+        self._url = url
+        self._headers = headers
+        self._payload = payload
+        self._prompt = prompt
+        self._lock = threading.Lock()
+        self._response: Optional[Response] = None
+        self._cancelled = False
+        self.finish_reason: Optional[str] = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    def cancel(self) -> None:
+        with self._lock:
+            self._cancelled = True
+            resp, self._response = self._response, None
+        if resp is not None:
+            try:
+                # close() alone does not wake a read blocked in another
+                # thread; shutting the socket down does (urllib3 >= 2.3).
+                shutdown = getattr(resp.raw, "shutdown", None)
+                if shutdown is not None:
+                    shutdown()
+                resp.close()
+            except Exception:
+                pass
+
+    def _set_finish_reason(self, reason: str) -> None:
+        self.finish_reason = reason
+
+    def _open(self) -> Optional[Response]:
+        """POST the request, retrying like `rewrite()` until the stream starts."""
+        client = self._client
+        delays = list(retry_loop(client.max_retries)) + [None]
+        for attempt, delay in enumerate(delays, start=1):
+            if self._cancelled:
+                return None
+            try:
+                resp = client.stream_transport(self._url, headers=self._headers, json=self._payload, timeout=client.timeout)
+                resp.raise_for_status()
+            except Exception as e:
+                client.log.record(self._prompt, attempt, False, error=str(e))
+                if delay is None:
+                    raise RuntimeError("AI request failed") from e
+                time.sleep(delay)
+                continue
+            client.log.record(self._prompt, attempt, True)
+            with self._lock:
+                if not self._cancelled:
+                    self._response = resp
+                    return resp
+            resp.close()
+            return None
+        return None
+
+    def __iter__(self) -> Iterator[str]:
+        resp = self._open()
+        if resp is None:
+            return
+        try:
+            if "json" in (resp.headers.get("Content-Type") or ""):
+                # The endpoint ignored `stream`; deliver the whole answer at once.
+                data = resp.json()
+                self.finish_reason = _finish_reason(data)
+                text = _completion_text(data)
+                if text:
+                    yield text
+                return
+            # chunk_size=None hands over each chunk as it arrives instead of
+            # waiting for a fixed number of bytes.
+            yield from iter_sse_tokens(resp.iter_lines(chunk_size=None), on_finish=self._set_finish_reason)
+        except Exception:
+            if not self._cancelled:
+                raise
+        finally:
+            self.cancel()
+
+
+def mode_max_tokens(mode: object) -> Optional[int]:
+    """The `max_tokens` a rewrite mode's advanced settings ask for, if any."""
+    adv = getattr(mode, "advanced_settings", None) or {}
+    try:
+        value = int(adv.get("max_tokens") or 0)
+    except (TypeError, ValueError, AttributeError):
+        return None
+    return value if value > 0 else None
+
+
+def _finish_reason(data: Any) -> Optional[str]:
+    choices = data.get("choices") if isinstance(data, dict) else None
+    if choices and isinstance(choices, list) and isinstance(choices[0], dict):
+        return choices[0].get("finish_reason")
+    return None
+
+
+def _completion_text(data: Any) -> str:
+    """The text of a non-streamed chat-completions (or completions) response."""
+    if not isinstance(data, dict):
+        return ""
+    choices = data.get("choices")
+    if choices and isinstance(choices, list):
+        msg = choices[0].get("message") or {}
+        return (msg.get("content") or choices[0].get("text") or "").strip()
+    return data.get("text") or ""
+
+
 class AIClient:
-    def __init__(self, transport: Optional[Callable[..., Response]] = None, timeout: float = 6.0, max_retries: int = 2) -> None:
+    def __init__(
+        self,
+        transport: Optional[Callable[..., Response]] = None,
+        timeout: float = 6.0,
+        max_retries: int = 2,
+        session: Optional[requests.Session] = None,
+        stream_transport: Optional[Callable[..., Response]] = None,
+        max_tokens: int = DEFAULT_MAX_TOKENS,
+    ) -> None:
         self.transport = transport or self._default_transport
+        self.stream_transport = stream_transport or self._default_stream_transport
         self.timeout = timeout
         self.max_retries = max_retries
+        self.max_tokens = max_tokens
+        # None: use the process-wide pooled session from `ai.session`.
+        self.session = session
         self.settings = get_settings()
         self.log = AIRequestLog()
 
     def _default_transport(self, url: str, headers: dict, json: dict, timeout: float) -> Response:
-        return requests.post(url, headers=headers, json=json, timeout=timeout)
+        session = self.session or http_session.get_session()
+        return session.post(url, headers=headers, json=json, timeout=timeout)
+
+    def _default_stream_transport(self, url: str, headers: dict, json: dict, timeout: float) -> Response:
+        session = self.session or http_session.get_session()
+        return session.post(url, headers=headers, json=json, timeout=timeout, stream=True)
+
+    def close(self) -> None:
+        """Close a session passed to the constructor; the shared one closes at exit."""
+        if self.session is not None:
+            self.session.close()
 
     def _build_urls_and_headers(self, deployment: str) -> (str, dict):
         endpoint = self.settings.azure_openai_endpoint
@@ -47,18 +227,37 @@ class AIClient:
             headers["api-key"] = api_key
         return chat_url, headers
 
-    def rewrite(self, prompt: str, deployment: Optional[str] = None) -> str:
-        self.settings = get_settings()
-        deployment = deployment or self.settings.azure_openai_deployment
-        url, headers = self._build_urls_and_headers(deployment)
-
+    def _payload(self, prompt: str, max_tokens: Optional[int] = None) -> dict:
         # Build chat-style payload (works with Azure chat completions)
-        payload = {
+        return {
             "messages": [{"role": "user", "content": prompt}],
-            "max_tokens": 512,
+            "max_tokens": max_tokens or self.max_tokens,
             "temperature": 0.2,
         }
 
+    def rewrite_stream(
+        self, prompt: str, deployment: Optional[str] = None, max_tokens: Optional[int] = None
+    ) -> RewriteStream:
+        """Like `rewrite()`, but returns the answer token by token as it is generated.
+
+        Configuration errors are raised here; network errors are raised while
+        iterating. Failures before the first token are retried like
+        `rewrite()`; once tokens flow there is no retry.
+        """
+        self.settings = get_settings()
+        deployment = deployment or self.settings.azure_openai_deployment
+        url, headers = self._build_urls_and_headers(deployment)
+        headers["Accept"] = "text/event-stream"
+        payload = self._payload(prompt, max_tokens)
+        payload["stream"] = True
+        return RewriteStream(self, url, headers, payload, prompt)
+
+    def rewrite(self, prompt: str, deployment: Optional[str] = None, max_tokens: Optional[int] = None) -> str:
+        self.settings = get_settings()
+        deployment = deployment or self.settings.azure_openai_deployment
+        url, headers = self._build_urls_and_headers(deployment)
+        payload = self._payload(prompt, max_tokens)
+
         last_exc: Optional[Exception] = None
         attempt = 0
         # Try initial + retries
@@ -150,6 +349,10 @@ class AIClient:
         `instruction_template` attribute, or a string key referring to a
         preset in `ai.presets.PRESETS`.
         """
+        return self.rewrite(self.mode_prompt(mode, text), max_tokens=mode_max_tokens(mode))
+
+    def mode_prompt(self, mode: object | str, text: str) -> str:
+        """The prompt `apply_rewrite_mode()` sends for `mode` and `text`."""
         from storage import db as storage_db
         from ai.presets import PRESETS
 
@@ -167,5 +370,4 @@ class AIClient:
             raise KeyError("Unknown rewrite mode or preset")
 
         # Build prompt by interpolating input into template placeholders
-        prompt = template.replace("{text}", text).replace("{input}", text)
-        return self.rewrite(prompt)
+        return template.replace("{text}", text).replace("{input}", text)
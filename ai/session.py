@@ -0,0 +1,61 @@
+"""Shared keep-alive HTTP session for AI requests.
+
+Every `AIClient` in the process posts through one `requests.Session`, so
+rewrites, retries and connection tests reuse pooled TCP/TLS connections
+instead of paying a new handshake per request. The pool is sized for the UI
+executor plus the settings dialog, and responses are gzip-negotiated.
+
+urllib3's connection pool is thread-safe. The session's only other mutable
+state is its cookie jar, which is disabled here (the Azure API does not use
+cookies), so one session can be shared by every worker thread.
+"""
+from __future__ import annotations
+import atexit
+import threading
+from http.cookiejar import DefaultCookiePolicy
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Distinct hosts kept in the pool, and connections kept per host.
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = 8
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def create_session(pool_connections: int = POOL_CONNECTIONS, pool_maxsize: int = POOL_MAXSIZE) -> requests.Session:
+    """A new pooled session; `AIClient` retries itself, so the adapter does not."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=0)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive"})
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide session, creating it on first use."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = create_session()
+        return _session
+
+
+def close_session() -> None:
+    """Close the shared session's pooled connections; registered with `atexit`.
+
+    A later `get_session()` starts a fresh one.
+    """
+    global _session
+    with _session_lock:
+        session, _session = _session, None
+    if session is not None:
+        session.close()
+
+
+atexit.register(close_session)
@@ -0,0 +1 @@
+"""Ad-hoc performance benchmarks (not collected by pytest)."""
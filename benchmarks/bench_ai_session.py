@@ -0,0 +1,143 @@
+"""Per-request AI latency: a new connection per call vs. the pooled session.
+
+Usage: python -m benchmarks.bench_ai_session [--requests 200] [--delay-ms 0] [--tls]
+
+Runs a local stand-in for the chat-completions endpoint (HTTP/1.1
+keep-alive, gzip responses) and times `requests.post` against
+`ai.session.create_session().post`. Over plain HTTP on loopback the gap
+is only the TCP handshake. `--tls` serves HTTPS with a throwaway
+self-signed certificate, so new connections also pay the TLS handshake,
+as they do against Azure.
+"""
+from __future__ import annotations
+import argparse
+import datetime
+import gzip
+import ipaddress
+import json
+import ssl
+import statistics
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict
+
+import requests
+
+from ai import session as ai_session
+
+_PAYLOAD = {"messages": [{"role": "user", "content": "Fix grammar: " + "lorem ipsum " * 50}], "max_tokens": 512}
+_RESPONSE = gzip.compress(json.dumps({"choices": [{"message": {"content": "lorem ipsum " * 50}}]}).encode())
+
+
+def _handler(delay_s: float) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Headers and body go out in separate writes; without this, Nagle
+        # plus delayed ACKs add ~40 ms to every keep-alive response.
+        disable_nagle_algorithm = True
+
+        def do_POST(self) -> None:
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if delay_s:
+                time.sleep(delay_s)
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(_RESPONSE)))
+            self.end_headers()
+            self.wfile.write(_RESPONSE)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return Handler
+
+
+def _self_signed(directory: Path) -> Path:
+    """Write a localhost key and certificate to one PEM file and return it."""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "127.0.0.1")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=1))
+        .not_valid_after(now + datetime.timedelta(hours=1))
+        .add_extension(x509.SubjectAlternativeName([x509.IPAddress(ipaddress.ip_address("127.0.0.1"))]), critical=False)
+        .add_extension(x509.BasicConstraints(ca=True, path_length=None), critical=True)
+        .sign(key, hashes.SHA256())
+    )
+    pem = directory / "bench.pem"
+    pem.write_bytes(
+        key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+        + cert.public_bytes(serialization.Encoding.PEM)
+    )
+    return pem
+
+
+def _time(post: Callable[[], requests.Response], n: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        resp = post()
+        resp.raise_for_status()
+        resp.json()
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {"mean_ms": statistics.fmean(samples), "p95_ms": samples[int(len(samples) * 0.95) - 1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay-ms", type=float, default=0.0, help="simulated server processing time")
+    parser.add_argument("--tls", action="store_true", help="serve HTTPS with a self-signed certificate")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server = ThreadingHTTPServer(("127.0.0.1", 0), _handler(args.delay_ms / 1000.0))
+        verify: bool | str = True
+        if args.tls:
+            pem = _self_signed(Path(tmp))
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(pem)
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+            verify = str(pem)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        scheme = "https" if args.tls else "http"
+        url = f"{scheme}://127.0.0.1:{server.server_address[1]}/openai/deployments/bench/chat/completions"
+        headers = {"Content-Type": "application/json"}
+        session = ai_session.create_session()
+        try:
+            results = {
+                "requests.post": _time(
+                    lambda: requests.post(url, headers=headers, json=_PAYLOAD, timeout=5, verify=verify), args.requests
+                ),
+                "pooled session": _time(
+                    lambda: session.post(url, headers=headers, json=_PAYLOAD, timeout=5, verify=verify), args.requests
+                ),
+            }
+        finally:
+            session.close()
+            server.shutdown()
+            server.server_close()
+
+    print(f"{args.requests} requests over {'HTTPS' if args.tls else 'HTTP'}, {args.delay_ms:g} ms server delay")
+    print(f"{'transport':<16}{'mean ms':>10}{'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<16}{r['mean_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
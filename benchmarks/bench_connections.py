@@ -0,0 +1,101 @@
+"""Per-operation latency: connection per call vs. the shared ConnectionManager.
+
+Usage: python -m benchmarks.bench_connections [--notes 10000] [--ops 200]
+"""
+from __future__ import annotations
+import argparse
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from storage import db as storage_db
+from storage import repository
+
+
+def _seed(db_path: Path, notes: int) -> List[int]:
+    conn = storage_db.get_connection(db_path)
+    try:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO notes (title, body) VALUES (?, ?)",
+            ((f"Note {i}", f"body {i} lorem ipsum dolor sit amet {i % 97}") for i in range(notes)),
+        )
+        conn.commit()
+        cur.execute("SELECT id FROM notes")
+        return [r[0] for r in cur.fetchall()]
+    finally:
+        conn.close()
+
+
+def _time_ops(fn: Callable[[int], None], ids: List[int], ops: int) -> Dict[str, float]:
+    samples = []
+    for _ in range(ops):
+        nid = random.choice(ids)
+        t0 = time.perf_counter()
+        fn(nid)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {
+        "mean_ms": statistics.fmean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p95_ms": samples[int(len(samples) * 0.95) - 1],
+    }
+
+
+def run(notes: int = 10000, ops: int = 200) -> Dict[str, Dict[str, Dict[str, float]]]:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        ids = _seed(db_path, notes)
+
+        def per_call(op: Callable[..., object]) -> Callable[[int], None]:
+            # Old behaviour: open (and migrate) a fresh connection for every call.
+            def inner(nid: int) -> None:
+                conn = storage_db.get_connection(db_path)
+                try:
+                    op(nid, conn)
+                finally:
+                    conn.close()
+            return inner
+
+        manager = storage_db.get_manager(db_path)
+
+        def managed(op: Callable[..., object], write: bool) -> Callable[[int], None]:
+            def inner(nid: int) -> None:
+                ctx = manager.writer() if write else manager.reader()
+                with ctx as conn:
+                    op(nid, conn)
+            return inner
+
+        operations = {
+            "update_note": (lambda nid, c: repository.update_note(nid, "t", f"changed {nid}", conn=c), True),
+            "get_note": (lambda nid, c: repository.get_note(nid, conn=c), False),
+            "search": (lambda nid, c: repository.search(f"body{nid % 97}", conn=c), False),
+            "get_tags_for_note": (lambda nid, c: repository.get_tags_for_note(nid, conn=c), False),
+        }
+        results: Dict[str, Dict[str, Dict[str, float]]] = {}
+        for name, (op, write) in operations.items():
+            results[name] = {
+                "per_call": _time_ops(per_call(op), ids, ops),
+                "manager": _time_ops(managed(op, write), ids, ops),
+            }
+        storage_db.close_all()
+        return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=10000)
+    parser.add_argument("--ops", type=int, default=200)
+    args = parser.parse_args()
+    results = run(args.notes, args.ops)
+    print(f"{'operation':<20}{'mode':<10}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, modes in results.items():
+        for mode, stats in modes.items():
+            print(f"{name:<20}{mode:<10}{stats['mean_ms']:>10.3f}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""Autosave throughput and concurrent search latency per database profile.
+
+Usage: python -m benchmarks.bench_db_profiles [--notes 5000] [--saves 500]
+"""
+from __future__ import annotations
+import argparse
+import random
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from storage import db as storage_db
+from storage import repository
+
+
+def _seed(manager: storage_db.ConnectionManager, notes: int) -> List[int]:
+    with manager.writer() as conn:
+        cur = conn.cursor()
+        cur.executemany(
+            "INSERT INTO notes (title, body) VALUES (?, ?)",
+            ((f"Note {i}", f"draft {i} " + "lorem ipsum " * 40) for i in range(notes)),
+        )
+        conn.commit()
+        cur.execute("SELECT id FROM notes")
+        return [r[0] for r in cur.fetchall()]
+
+
+def bench_profile(profile: str, notes: int, saves: int) -> Dict[str, float]:
+    with tempfile.TemporaryDirectory() as tmp:
+        manager = storage_db.ConnectionManager(Path(tmp) / "bench.db", profile=profile)
+        try:
+            ids = _seed(manager, notes)
+            search_ms: List[float] = []
+            done = threading.Event()
+
+            def searcher() -> None:
+                while not done.is_set():
+                    with manager.reader() as conn:
+                        t0 = time.perf_counter()
+                        repository.search("lorem", conn=conn)
+                        search_ms.append((time.perf_counter() - t0) * 1000.0)
+
+            reader = threading.Thread(target=searcher)
+            reader.start()
+            t0 = time.perf_counter()
+            for i in range(saves):
+                nid = random.choice(ids)
+                with manager.writer() as conn:
+                    repository.update_note(nid, f"Note {nid}", f"autosave {i} " + "lorem ipsum " * 40, conn=conn)
+            elapsed = time.perf_counter() - t0
+            done.set()
+            reader.join()
+        finally:
+            manager.close()
+    search_ms.sort()
+    return {
+        "saves_per_s": saves / elapsed,
+        "search_p50_ms": search_ms[len(search_ms) // 2] if search_ms else 0.0,
+        "search_p95_ms": search_ms[int(len(search_ms) * 0.95) - 1] if search_ms else 0.0,
+        "searches": float(len(search_ms)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--saves", type=int, default=500)
+    args = parser.parse_args()
+    print(f"{'profile':<10}{'saves/s':>10}{'search p50':>12}{'search p95':>12}{'searches':>10}")
+    for name in storage_db.PROFILES:
+        r = bench_profile(name, args.notes, args.saves)
+        print(f"{name:<10}{r['saves_per_s']:>10.1f}{r['search_p50_ms']:>12.3f}{r['search_p95_ms']:>12.3f}{int(r['searches']):>10}")
+
+
+if __name__ == "__main__":
+    main()
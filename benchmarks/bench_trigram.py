@@ -0,0 +1,100 @@
+"""Substring search latency: LIKE full scan vs. trigram indexes.
+
+Usage: python -m benchmarks.bench_trigram [--notes 100000] [--queries 50] [--side-table]
+
+`--side-table` also benchmarks the pure-SQL `note_trigrams` fallback. It
+is much slower to build, so it is off by default.
+"""
+from __future__ import annotations
+import argparse
+import random
+import sqlite3
+import statistics
+import string
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from storage import migrations, trigram
+
+_WORDS = ["alpha", "buffer", "cursor", "delta", "engine", "filter", "gamma", "handler", "index", "journal"]
+
+
+def _identifier(rng: random.Random) -> str:
+    return rng.choice(_WORDS) + "".join(rng.choice(string.ascii_letters) for _ in range(6)) + rng.choice(_WORDS).title()
+
+
+def _body(rng: random.Random) -> str:
+    words = [rng.choice(_WORDS) for _ in range(15)]
+    words.insert(rng.randrange(len(words)), _identifier(rng) + "()")
+    return " ".join(words)
+
+
+def _build(db_path: Path, notes: int, seed: int) -> List[str]:
+    rng = random.Random(seed)
+    migrations.migrate(db_path)
+    conn = sqlite3.connect(str(db_path))
+    bodies = [_body(rng) for _ in range(notes)]
+    conn.executemany("INSERT INTO notes (title, body) VALUES (?, ?)", ((f"Note {i}", b) for i, b in enumerate(bodies)))
+    conn.commit()
+    conn.close()
+    # Query fragments taken from the middle of generated identifiers.
+    samples = []
+    for b in rng.sample(bodies, 50):
+        ident = next(w for w in b.split() if w.endswith("()"))
+        samples.append(ident[3:11])
+    return samples
+
+
+def _to_side_table(conn: sqlite3.Connection) -> None:
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type='trigger' AND name LIKE 'notes_ai_trigram_%'").fetchall():
+        conn.execute(f"DROP TRIGGER {name}")
+    conn.execute("DROP TABLE IF EXISTS notes_trigram")
+    conn.executescript(migrations.TRIGRAM_SIDE_SQL)
+    trigram.rebuild_side_table(conn)
+    conn.commit()
+
+
+def _time(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000.0)
+    samples.sort()
+    return {"mean_ms": statistics.fmean(samples), "p95_ms": samples[int(len(samples) * 0.95) - 1]}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--notes", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--side-table", action="store_true")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        queries = _build(db_path, args.notes, seed=7)[: args.queries]
+        conn = sqlite3.connect(str(db_path))
+
+        def like_scan(q: str) -> object:
+            likeq = f"%{q}%"
+            return conn.execute("SELECT id FROM notes WHERE title LIKE ? OR body LIKE ?", (likeq, likeq)).fetchall()
+
+        results = {"like_scan": _time(like_scan, queries)}
+        if trigram.native_available(conn):
+            results["fts5_trigram"] = _time(lambda q: trigram.substring_ids(conn, q), queries)
+        if args.side_table:
+            _to_side_table(conn)
+            results["side_table"] = _time(lambda q: trigram.substring_ids(conn, q), queries)
+        conn.close()
+
+    print(f"{args.notes} notes, {len(queries)} substring queries")
+    print(f"{'method':<14}{'mean ms':>10}{'p95 ms':>10}")
+    for name, r in results.items():
+        print(f"{name:<14}{r['mean_ms']:>10.3f}{r['p95_ms']:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
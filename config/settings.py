@@ -6,27 +6,38 @@ This app supports configuring settings via:
 - persisted DB settings saved from the Settings dialog
 
 Precedence: explicit environment variables > DB settings.
+
+`get_settings()` returns a cached, immutable `SettingsSnapshot`, so the AI
+hot path reads no files, database or keyring. The cache is rebuilt after
+`invalidate_settings()` (the Settings dialog calls it on save), when one
+of the settings environment variables changes, or when `.env`'s mtime
+changes. `.env` is stat'ed at most every `DOTENV_CHECK_INTERVAL` seconds.
 """
 from __future__ import annotations
 
 import os
 import sys
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
-
+from typing import Optional, Tuple
 
-def _load_dotenv() -> None:
-    """Best-effort load of `.env`.
+_ENV_KEYS = (
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_DEPLOYMENT",
+    "AZURE_OPENAI_API_VERSION",
+    "AZURE_OPENAI_TIMEOUT",
+    "AZURE_OPENAI_API_KEY",
+    "AI_NOTEPAD_DB_PROFILE",
+    "AI_NOTEPAD_REWRITE_CONCURRENCY",
+    "AI_NOTEPAD_KEY_CACHE_IDLE_TTL",
+)
+# Seconds between `.env` mtime checks by `get_settings()`.
+DOTENV_CHECK_INTERVAL = 2.0
 
-    This matters for PyInstaller onefile builds because the process working
-    directory may not be the repo root.
-    """
-
-    try:
-        from dotenv import load_dotenv  # type: ignore
-    except Exception:
-        return
 
+def _dotenv_candidates() -> list[Path]:
     candidates: list[Path] = []
     try:
         candidates.append(Path.cwd() / ".env")
@@ -45,12 +56,53 @@ def _load_dotenv() -> None:
             candidates.append(Path(sys.executable).resolve().parent / ".env")
     except Exception:
         pass
+    return candidates
 
-    for p in candidates:
+
+def _find_dotenv() -> Optional[Path]:
+    for p in _dotenv_candidates():
         if p.exists():
-            # override=True so editing `.env` actually affects the app.
-            load_dotenv(dotenv_path=str(p), override=True)
-            return
+            return p
+    return None
+
+
+def _load_dotenv() -> None:
+    """Best-effort load of `.env`.
+
+    This matters for PyInstaller onefile builds because the process working
+    directory may not be the repo root.
+    """
+
+    try:
+        from dotenv import load_dotenv  # type: ignore
+    except Exception:
+        return
+
+    p = _find_dotenv()
+    if p is not None:
+        # override=True so editing `.env` actually affects the app.
+        load_dotenv(dotenv_path=str(p), override=True)
+
+def get_db_profile() -> Optional[str]:
+    """Name of the database profile (`safe`, `balanced`, `fast`) if configured."""
+    _load_dotenv()
+    return os.environ.get("AI_NOTEPAD_DB_PROFILE") or None
+
+
+def _idle_ttl_from_env() -> Optional[float]:
+    raw = os.environ.get("AI_NOTEPAD_KEY_CACHE_IDLE_TTL")
+    if not raw:
+        return None
+    try:
+        return max(0.0, float(raw))
+    except ValueError:
+        return None
+
+
+def get_key_cache_idle_ttl() -> Optional[float]:
+    """Seconds an unused derived API-key key stays cached, if configured."""
+    _load_dotenv()
+    return _idle_ttl_from_env()
 
 class Settings:
     def __init__(self) -> None:
@@ -59,6 +111,11 @@ class Settings:
         self.azure_openai_api_version: Optional[str] = None
         self.azure_openai_timeout: Optional[float] = None
         self.azure_openai_api_key: Optional[str] = None
+        self.db_profile: Optional[str] = None
+        # Chunks of a long note rewritten at once (see ai/chunking.py).
+        self.rewrite_concurrency: Optional[int] = None
+        # Idle seconds before a derived fallback key is wiped (storage/utils.py).
+        self.key_cache_idle_ttl: Optional[float] = None
 
         # Load dotenv first so `os.environ.get(...)` sees it.
         _load_dotenv()
@@ -99,6 +156,17 @@ class Settings:
             except Exception:
                 pass
 
+        self.db_profile = os.environ.get("AI_NOTEPAD_DB_PROFILE") or None
+
+        env_concurrency = os.environ.get("AI_NOTEPAD_REWRITE_CONCURRENCY")
+        if env_concurrency:
+            try:
+                self.rewrite_concurrency = max(1, int(env_concurrency))
+            except ValueError:
+                pass
+
+        self.key_cache_idle_ttl = _idle_ttl_from_env()
+
         # API key: env > keyring (if available)
         self.azure_openai_api_key = os.environ.get("AZURE_OPENAI_API_KEY")
         if not self.azure_openai_api_key:
@@ -113,5 +181,101 @@ class Settings:
         if not self.azure_openai_endpoint or not self.azure_openai_deployment:
             raise RuntimeError("Azure OpenAI endpoint and deployment must be configured")
 
-def get_settings() -> Settings:
-    return Settings()
+    def snapshot(self) -> "SettingsSnapshot":
+        return SettingsSnapshot(
+            azure_openai_endpoint=self.azure_openai_endpoint,
+            azure_openai_deployment=self.azure_openai_deployment,
+            azure_openai_api_version=self.azure_openai_api_version,
+            azure_openai_timeout=self.azure_openai_timeout,
+            azure_openai_api_key=self.azure_openai_api_key,
+            db_profile=self.db_profile,
+            rewrite_concurrency=self.rewrite_concurrency,
+            key_cache_idle_ttl=self.key_cache_idle_ttl,
+        )
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    """Immutable copy of `Settings`, shared by every caller until invalidated."""
+
+    azure_openai_endpoint: Optional[str] = None
+    azure_openai_deployment: Optional[str] = None
+    azure_openai_api_version: Optional[str] = None
+    azure_openai_timeout: Optional[float] = None
+    azure_openai_api_key: Optional[str] = None
+    db_profile: Optional[str] = None
+    rewrite_concurrency: Optional[int] = None
+    key_cache_idle_ttl: Optional[float] = None
+
+    def validate(self) -> None:
+        if not self.azure_openai_endpoint or not self.azure_openai_deployment:
+            raise RuntimeError("Azure OpenAI endpoint and deployment must be configured")
+
+    def __repr__(self) -> str:
+        # Never show the API key in logs or tracebacks.
+        return (
+            f"SettingsSnapshot(endpoint={self.azure_openai_endpoint!r}, deployment={self.azure_openai_deployment!r}, "
+            f"api_version={self.azure_openai_api_version!r}, api_key={'set' if self.azure_openai_api_key else 'unset'})"
+        )
+
+
+_cache_lock = threading.Lock()
+_snapshot: Optional[SettingsSnapshot] = None
+_env_fingerprint: Optional[Tuple[Optional[str], ...]] = None
+_dotenv_stamp: Optional[Tuple[Optional[Path], Optional[int]]] = None
+_dotenv_checked_at = 0.0
+# Bumped by `invalidate_settings()`; a rebuild that raced with it is not cached.
+_generation = 0
+
+
+def _env_values() -> Tuple[Optional[str], ...]:
+    return tuple(os.environ.get(k) for k in _ENV_KEYS)
+
+
+def _dotenv_mtime() -> Tuple[Optional[Path], Optional[int]]:
+    p = _find_dotenv()
+    if p is None:
+        return None, None
+    try:
+        return p, p.stat().st_mtime_ns
+    except OSError:
+        return p, None
+
+
+def invalidate_settings() -> None:
+    """Drop the cached snapshot; the next `get_settings()` reloads everything."""
+    global _snapshot, _generation
+    with _cache_lock:
+        _snapshot = None
+        _generation += 1
+
+
+def get_settings() -> SettingsSnapshot:
+    """The current settings, rebuilt only when a source may have changed.
+
+    The lock only guards the cached fields. Checking `.env` and building a
+    new snapshot (database, keyring, key derivation) happen outside it, so
+    callers holding a current snapshot never wait on that I/O.
+    """
+    global _snapshot, _env_fingerprint, _dotenv_stamp, _dotenv_checked_at
+    now = time.monotonic()
+    with _cache_lock:
+        snapshot, fingerprint, stamp, checked_at, generation = (
+            _snapshot, _env_fingerprint, _dotenv_stamp, _dotenv_checked_at, _generation
+        )
+    if snapshot is not None and _env_values() == fingerprint:
+        if now - checked_at < DOTENV_CHECK_INTERVAL:
+            return snapshot
+        if _dotenv_mtime() == stamp:
+            with _cache_lock:
+                if _snapshot is snapshot:
+                    _dotenv_checked_at = now
+            return snapshot
+    stamp = _dotenv_mtime()
+    fresh = Settings().snapshot()
+    # After Settings() so values loaded from `.env` are part of the print.
+    fingerprint = _env_values()
+    with _cache_lock:
+        if _generation == generation:
+            _snapshot, _env_fingerprint, _dotenv_stamp, _dotenv_checked_at = fresh, fingerprint, stamp, now
+    return fresh
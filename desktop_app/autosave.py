@@ -0,0 +1,117 @@
+"""Event-driven autosave: debounce on the Tk thread, persist on a worker."""
+from __future__ import annotations
+import concurrent.futures
+import hashlib
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from storage import db as storage_db
+from storage import journal, repository
+
+
+def content_hash(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+@dataclass
+class Document:
+    """The note an editor is showing; `note_id` is None until first saved."""
+
+    note_id: Optional[int] = None
+    title: str = "Untitled"
+    # Hash of the last content handed to the writer (None: nothing saved yet).
+    saved_hash: Optional[bytes] = None
+
+
+class Autosaver:
+    """Save a widget's text after edits pause, skipping unchanged content.
+
+    `changed()` is called from the Tk thread on every `<<Modified>>` event
+    and (re)arms an `after()` timer. When it fires, `get_text()` is read on
+    the Tk thread and hashed; the write goes to a single background worker
+    only if the hash differs from the last saved version, so SQLite never
+    blocks the UI and no-op saves never reach the database. Existing notes
+    are saved through the shared write-behind journal, which batches
+    commits across every open editor. `on_saved(note_id, title)`, if
+    given, runs on the Tk thread after each save so lists showing the note
+    can update just its row.
+    """
+
+    def __init__(
+        self,
+        widget: Any,
+        get_text: Callable[[], str],
+        delay_ms: int = 2000,
+        db_path: str | Path | None = None,
+        on_saved: Optional[Callable[[int, str], None]] = None,
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.widget = widget
+        self.get_text = get_text
+        self.delay_ms = delay_ms
+        self.db_path = db_path
+        self.on_saved = on_saved
+        self.document = Document()
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="autosave")
+        self._after_id: Optional[str] = None
+
+    def load(self, note_id: Optional[int], text: str, title: str = "Untitled") -> None:
+        """Switch to another note; call `flush()` first to keep pending edits."""
+        self._cancel_timer()
+        self.document = Document(note_id=note_id, title=title, saved_hash=content_hash(text))
+
+    def _cancel_timer(self) -> None:
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+
+    def changed(self) -> None:
+        self._cancel_timer()
+        self._after_id = self.widget.after(self.delay_ms, self.flush)
+
+    def flush(self) -> Optional[concurrent.futures.Future]:
+        """Queue a save now if the content changed; returns the pending write."""
+        self._cancel_timer()
+        content = self.get_text()
+        digest = content_hash(content)
+        doc = self.document
+        if digest == doc.saved_hash:
+            return None
+        doc.saved_hash = digest
+        return self._executor.submit(self._persist, doc, content, digest)
+
+    def _persist(self, doc: Document, content: str, digest: bytes) -> None:
+        try:
+            if doc.note_id is None:
+                with storage_db.get_manager(self.db_path).writer() as conn:
+                    doc.note_id = repository.create_note(doc.title, content, conn=conn)
+            else:
+                journal.get_write_behind(self.db_path).submit(doc.note_id, content)
+        except Exception:
+            self.logger.exception("Autosave failed")
+            if doc.saved_hash == digest:
+                doc.saved_hash = None  # retry on the next flush
+            return
+        self._notify(doc)
+
+    def _notify(self, doc: Document) -> None:
+        if self.on_saved is None:
+            return
+        try:
+            self.widget.after(0, self.on_saved, doc.note_id, doc.title)
+        except Exception:
+            pass  # widget destroyed
+
+    def close(self) -> None:
+        """Save pending edits and wait until they are committed."""
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
+        if self.document.note_id is not None:
+            journal.get_write_behind(self.db_path).flush(timeout=10.0)
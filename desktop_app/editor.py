@@ -2,45 +2,112 @@
 from __future__ import annotations
 import tkinter as tk
 from tkinter import scrolledtext
-import threading
-import time
-from typing import Optional
-from storage import repository
+from typing import Callable, Optional, Sequence, Tuple
+
+from storage import chunks as storage_chunks
+
+from .autosave import Autosaver
+from .large_document import ChunkedAutosaver, LargeDocument
+
 
 class Editor(tk.Frame):
-    def __init__(self, master=None, note_id: Optional[int] = None):
+    def __init__(self, master=None, note_id: Optional[int] = None, on_saved: Optional[Callable[[int, str], None]] = None):
         super().__init__(master)
-        self.note_id = note_id
+        self.on_saved = on_saved
         self.text = scrolledtext.ScrolledText(self)
         self.text.pack(fill=tk.BOTH, expand=True)
-        self._debounce_ms = 2000
-        self._last_change = time.time()
-        self._stop = False
+        # Snapshots only hit the journal; the write-behind queue batches commits.
+        self._debounce_ms = 300
+        self._plain = Autosaver(self, self._content, delay_ms=self._debounce_ms, on_saved=on_saved)
+        self.autosave = self._plain
+        self.autosave.document.note_id = note_id
+        # Created on the first large note; see large_document.py.
+        self._large: Optional[LargeDocument] = None
+        self._chunked: Optional[ChunkedAutosaver] = None
         self.text.bind("<<Modified>>", self._on_modified)
-        self._autosave_thread = threading.Thread(target=self._autosave_loop, daemon=True)
-        self._autosave_thread.start()
+
+    @property
+    def note_id(self) -> Optional[int]:
+        return self.autosave.document.note_id
+
+    @property
+    def large_mode(self) -> bool:
+        return self.autosave is not self._plain
+
+    def _content(self) -> str:
+        return self.text.get("1.0", tk.END).rstrip()
 
     def _on_modified(self, event=None):
-        try:
-            self.text.edit_modified(False)
-        except Exception:
-            pass
-        self._last_change = time.time()
-
-    def _autosave_loop(self):
-        while not self._stop:
-            time.sleep(0.5)
-            if time.time() - self._last_change > (self._debounce_ms / 1000.0):
-                self._save()
-                self._last_change = time.time() + 9999
+        # Tk only fires <<Modified>> when the flag flips, so reset it each time.
+        if not self.text.edit_modified():
+            return
+        self.text.edit_modified(False)
+        self.autosave.changed()
+
+    def load_note(self, note_id: int, body: str, title: str = "Untitled") -> None:
+        """Show `body` and make `note_id` the autosave target.
+
+        Bodies of `LARGE_NOTE_CHARS` or more switch to large-document mode
+        and are moved into chunked storage.
+        """
+        if len(body) >= storage_chunks.LARGE_NOTE_CHARS:
+            split = storage_chunks.split_body(body)
+            pieces = list(zip(storage_chunks.initial_seqs(len(split)), split))
+            # The conversion must land after any save of the note being left.
+            pending = self.autosave.flush()
+            self.load_chunks(note_id, pieces, title=title)
+            self._chunked.convert(note_id, pieces, after=pending)
+            return
+        self.autosave.flush()
+        if self._large is not None:
+            self._large.unload()
+        self.autosave = self._plain
+        self.text.delete("1.0", tk.END)
+        self.text.insert("1.0", body)
+        self.text.edit_modified(False)
+        self.autosave.load(note_id, self._content(), title=title)
+
+    def load_chunks(
+        self,
+        note_id: int,
+        pieces: Sequence[Tuple[int, str]],
+        title: str = "Untitled",
+        offset: Optional[int] = None,
+        term: Optional[str] = None,
+    ) -> None:
+        """Show a chunked note in large-document mode, loading it incrementally.
+
+        With `offset` (e.g. a search hit's `chunk_offset`), the view jumps
+        there, or to the first `term` after it, once loading finishes.
+        """
+        self.autosave.flush()
+        if self._large is None:
+            self._large = LargeDocument(self.text)
+            self._chunked = ChunkedAutosaver(self, self._large, delay_ms=self._debounce_ms, on_saved=self.on_saved)
+        self.autosave = self._chunked
+        self.autosave.load(note_id, title=title)
+        done = None if offset is None else (lambda: self.show_position(offset, term))
+        self._large.load(pieces, done=done)
+
+    def show_position(self, offset: int, term: Optional[str] = None) -> None:
+        """Put the cursor at character `offset`, or on `term` within a chunk of it."""
+        index = f"1.0 + {offset} chars"
+        if term:
+            stop = f"{index} + {storage_chunks.CHUNK_TARGET} chars"
+            index = self.text.search(term, index, stopindex=stop, nocase=True) or index
+        self.text.mark_set(tk.INSERT, index)
+        self.text.see(index)
+
+    def set_title(self, note_id: int, title: str) -> None:
+        """Keep the title autosave reports in `on_saved` in step with a rename."""
+        if self.note_id == note_id:
+            self.autosave.document.title = title
 
     def _save(self):
-        content = self.text.get("1.0", tk.END).rstrip()
-        if self.note_id is None:
-            self.note_id = repository.create_note("Untitled", content)
-        else:
-            repository.update_note(self.note_id, "Untitled", content)
+        self.autosave.flush()
 
     def destroy(self) -> None:
-        self._stop = True
+        self._plain.close()
+        if self._chunked is not None:
+            self._chunked.close()
         super().destroy()
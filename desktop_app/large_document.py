@@ -0,0 +1,345 @@
+"""Large-document mode for the editor: chunked loading and region saves.
+
+Multi-megabyte notes (logs, pasted dumps) are stored as ordered chunks (see
+`storage/chunks.py`). In this mode the editor inserts them a few at a time
+from `after()` callbacks, so the window stays responsive while the note
+loads. A Tk mark named `chunk_<seq>` sits at the start of each chunk. A
+proxy on the text widget's Tcl command sees every insert and delete and
+marks the chunk(s) it touches as dirty. Autosave reads and writes only
+those chunks, so the work per keystroke and per save does not depend on
+the note's size.
+"""
+from __future__ import annotations
+import concurrent.futures
+import tkinter as tk
+from typing import Any, Callable, Dict, List, Optional, Sequence, Set, Tuple
+
+from storage import chunks as storage_chunks
+from storage import db as storage_db
+from storage import journal, repository
+
+from .autosave import Autosaver, Document, content_hash
+
+MARK_PREFIX = "chunk_"
+# Characters inserted per `after()` step while a large note loads.
+LOAD_STEP_CHARS = 256 * 1024
+# A dirty chunk that grows past this many characters is split on save.
+SPLIT_CHARS = 2 * storage_chunks.CHUNK_TARGET
+
+Changes = Tuple[Dict[int, str], List[int]]
+
+
+class ChunkMap:
+    """Ordered chunk sequence numbers, their saved hashes and the dirty set."""
+
+    def __init__(self) -> None:
+        self.seqs: List[int] = []
+        self.hashes: Dict[int, bytes] = {}
+        self.dirty: Set[int] = set()
+
+    def reset(self, pieces: Sequence[Tuple[int, str]]) -> None:
+        self.seqs = [seq for seq, _ in pieces]
+        self.hashes = {seq: content_hash(content) for seq, content in pieces}
+        self.dirty = set()
+
+    def next_seq(self, seq: int) -> Optional[int]:
+        i = self.seqs.index(seq)
+        return self.seqs[i + 1] if i + 1 < len(self.seqs) else None
+
+    def mark_dirty(self, first: int, last: Optional[int] = None) -> None:
+        """Mark `first` (through `last`, inclusive) as modified."""
+        if last is None or last == first:
+            self.dirty.add(first)
+            return
+        i, j = self.seqs.index(first), self.seqs.index(last)
+        self.dirty.update(self.seqs[min(i, j):max(i, j) + 1])
+
+    def add(self, seq: int) -> None:
+        self.seqs.append(seq)
+        self.seqs.sort()
+
+    def remove(self, seq: int) -> None:
+        self.seqs.remove(seq)
+        self.hashes.pop(seq, None)
+        self.dirty.discard(seq)
+
+    def new_seqs(self, after: int, count: int) -> Optional[List[int]]:
+        """`count` unused seqs between `after` and its successor, or None."""
+        hi = self.next_seq(after)
+        out: List[int] = []
+        lo = after
+        for k in range(count):
+            if hi is None:
+                seq = lo + storage_chunks.SEQ_GAP
+            else:
+                # Spread evenly over the gap so later splits still have room.
+                seq = after + (hi - after) * (k + 1) // (count + 1)
+                if seq <= lo or seq >= hi:
+                    return None
+            out.append(seq)
+            lo = seq
+        return out
+
+    def is_unchanged(self, seq: int, content: str) -> bool:
+        return self.hashes.get(seq) == content_hash(content)
+
+
+class LargeDocument:
+    """Chunk marks, dirty tracking and incremental loading for a `tk.Text`."""
+
+    def __init__(self, text: tk.Text) -> None:
+        self.text = text
+        self.map = ChunkMap()
+        self.active = False
+        self._generation = 0
+        self._orig = text._w + "_orig"
+        text.tk.call("rename", text._w, self._orig)
+        text.tk.createcommand(text._w, self._proxy)
+
+    # -- Tcl command proxy ----------------------------------------------
+
+    def _call(self, *args: Any) -> Any:
+        return self.text.tk.call((self._orig,) + args)
+
+    def _proxy(self, *args: Any) -> Any:
+        if self.active and args and args[0] in ("insert", "delete", "replace") and len(args) > 1:
+            try:
+                first = self._chunk_at(args[1])
+                last = first
+                if args[0] != "insert" and len(args) > 2:
+                    # The range end is exclusive: its last character is one before.
+                    last = self._chunk_at(f"{args[2]} -1c")
+            except tk.TclError:
+                first = last = None
+            if first is None:
+                first = self._ensure_first_chunk()
+            self.map.mark_dirty(first, last if last is not None else first)
+        return self._call(*args)
+
+    def _chunk_at(self, index: str) -> Optional[int]:
+        """Seq of the chunk containing `index`, by binary search over the marks.
+
+        Marks have left gravity, so text typed at a chunk's start belongs
+        to that chunk.
+        """
+        pos = self._call("index", index)
+        seqs = self.map.seqs
+        lo, hi = 0, len(seqs)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._call("compare", self._mark(seqs[mid]), "<=", pos):
+                lo = mid + 1
+            else:
+                hi = mid
+        return seqs[lo - 1] if lo else None
+
+    def _ensure_first_chunk(self) -> int:
+        """A chunk starting at 1.0 for text typed before every existing chunk."""
+        first = self.map.seqs[0] if self.map.seqs else None
+        seq = storage_chunks.seq_between(None, first)
+        if seq is None:  # no room before the first chunk: widen it instead
+            seq = first
+        else:
+            self.map.add(seq)
+        self._set_mark(seq, "1.0")
+        return seq
+
+    @staticmethod
+    def _mark(seq: int) -> str:
+        return f"{MARK_PREFIX}{seq}"
+
+    def _set_mark(self, seq: int, index: str) -> None:
+        self._call("mark", "set", self._mark(seq), index)
+        self._call("mark", "gravity", self._mark(seq), "left")
+
+    # -- loading ----------------------------------------------------------
+
+    def load(self, pieces: Sequence[Tuple[int, str]], done: Optional[Callable[[], None]] = None) -> None:
+        """Replace the text with `pieces`, inserting them over several idle steps.
+
+        The widget is read-only until the last step, which calls `done()`.
+        """
+        self._generation += 1
+        gen = self._generation
+        self.active = False
+        for name in self._call("mark", "names"):
+            if str(name).startswith(MARK_PREFIX):
+                self._call("mark", "unset", name)
+        self.map.reset(pieces)
+        self.text.configure(state=tk.NORMAL)
+        self._call("delete", "1.0", "end")
+        self.text.configure(state=tk.DISABLED)
+        queue = list(pieces)
+
+        def step(start: int) -> None:
+            if gen != self._generation:
+                return  # another note was loaded meanwhile
+            self.text.configure(state=tk.NORMAL)
+            size = 0
+            i = start
+            while i < len(queue) and (size < LOAD_STEP_CHARS or i == start):
+                seq, content = queue[i]
+                self._set_mark(seq, "end -1c")
+                self._call("insert", "end -1c", content)
+                size += len(content)
+                i += 1
+            if i < len(queue):
+                self.text.configure(state=tk.DISABLED)
+                self.text.after(1, step, i)
+                return
+            self.text.edit_reset()
+            self.text.edit_modified(False)
+            self.active = True
+            if done is not None:
+                done()
+
+        step(0)
+
+    def unload(self) -> None:
+        self._generation += 1
+        self.active = False
+        self.text.configure(state=tk.NORMAL)
+
+    # -- saving ------------------------------------------------------------
+
+    def _chunk_text(self, seq: int) -> str:
+        nxt = self.map.next_seq(seq)
+        end = self._mark(nxt) if nxt is not None else "end -1c"
+        return str(self._call("get", self._mark(seq), end))
+
+    def collect_changes(self) -> Optional[Changes]:
+        """Read the dirty chunks, re-split oversized ones, and clear the dirty set.
+
+        Returns `(upserts, deletes)`, or None when the chunk numbering ran
+        out of room and the whole body has to be rewritten.
+        """
+        upserts: Dict[int, str] = {}
+        deletes: List[int] = []
+        for seq in sorted(self.map.dirty):
+            if seq not in self.map.seqs:
+                continue
+            content = self._chunk_text(seq)
+            if not content:
+                self._call("mark", "unset", self._mark(seq))
+                self.map.remove(seq)
+                deletes.append(seq)
+                continue
+            pieces = storage_chunks.split_body(content) if len(content) > SPLIT_CHARS else [content]
+            new = self.map.new_seqs(seq, len(pieces) - 1) if len(pieces) > 1 else []
+            if new is None:
+                return None
+            offset = len(pieces[0])
+            for extra_seq, piece in zip(new, pieces[1:]):
+                self._set_mark(extra_seq, f"{self._mark(seq)} +{offset}c")
+                self.map.add(extra_seq)
+                offset += len(piece)
+            for piece_seq, piece in zip([seq] + new, pieces):
+                if not self.map.is_unchanged(piece_seq, piece):
+                    upserts[piece_seq] = piece
+                    self.map.hashes[piece_seq] = content_hash(piece)
+        self.map.dirty.clear()
+        return upserts, deletes
+
+    def renumber(self) -> List[Tuple[int, str]]:
+        """Re-split the whole text into fresh chunks (rarely needed)."""
+        body = str(self._call("get", "1.0", "end -1c"))
+        for seq in list(self.map.seqs):
+            self._call("mark", "unset", self._mark(seq))
+        pieces = storage_chunks.split_body(body)
+        fresh = list(zip(storage_chunks.initial_seqs(len(pieces)), pieces))
+        offset = 0
+        for seq, piece in fresh:
+            self._set_mark(seq, f"1.0 +{offset}c")
+            offset += len(piece)
+        self.map.reset(fresh)
+        return fresh
+
+
+class ChunkedAutosaver(Autosaver):
+    """Autosaver that writes only the dirty chunks of a `LargeDocument`.
+
+    Chunk writes bypass the write-behind journal: each one is committed as
+    soon as the worker runs it, so it is as durable as a journal append
+    and there is no batched window for the journal to cover. A full-body
+    snapshot that write-behind still holds for the note would overwrite the
+    chunks, so conversions commit pending snapshots first.
+    """
+
+    def __init__(self, widget: Any, document: LargeDocument, delay_ms: int = 2000, db_path=None, on_saved=None) -> None:
+        super().__init__(widget, lambda: "", delay_ms=delay_ms, db_path=db_path, on_saved=on_saved)
+        self.large = document
+        self._rewrite = False
+
+    def load(self, note_id: Optional[int], text: str = "", title: str = "Untitled") -> None:
+        self._cancel_timer()
+        self._rewrite = False
+        self.document = Document(note_id=note_id, title=title)
+
+    def convert(
+        self,
+        note_id: int,
+        pieces: Sequence[Tuple[int, str]],
+        after: Optional[concurrent.futures.Future] = None,
+    ) -> concurrent.futures.Future:
+        """Move the whole body into `pieces` (`(seq, content)`) on the worker.
+
+        `after` is a save still running on another autosaver (e.g. the
+        plain one the editor just left); the conversion waits for it.
+        """
+        return self._executor.submit(self._convert, self.document, note_id, list(pieces), after)
+
+    def _convert(
+        self,
+        doc: Document,
+        note_id: int,
+        pieces: List[Tuple[int, str]],
+        after: Optional[concurrent.futures.Future],
+    ) -> None:
+        if after is not None:
+            concurrent.futures.wait([after])  # its own saver logs failures
+        if not journal.get_write_behind(self.db_path).flush(timeout=10.0):
+            self.logger.warning("Write-behind did not drain before converting note %s", note_id)
+        self._write(doc, repository.convert_to_chunked, note_id, pieces)
+
+    def flush(self) -> Optional[concurrent.futures.Future]:
+        self._cancel_timer()
+        doc = self.document
+        if doc.note_id is None:
+            return None
+        if self._rewrite:
+            self._rewrite = False
+            return self.convert(doc.note_id, self.large.renumber())
+        if not self.large.map.dirty:
+            return None
+        changes = self.large.collect_changes()
+        if changes is None:
+            return self.convert(doc.note_id, self.large.renumber())
+        upserts, deletes = changes
+        if not upserts and not deletes:
+            return None
+        return self._executor.submit(self._write, doc, repository.update_note_chunks, doc.note_id, upserts, deletes)
+
+    def _write(self, doc: Document, func: Callable[..., Any], *args: Any) -> None:
+        try:
+            with storage_db.get_manager(self.db_path).writer() as conn:
+                func(*args, conn=conn)
+        except Exception:
+            self.logger.exception("Autosave failed")
+            try:
+                self.widget.after(0, self._retry, doc)
+            except Exception:
+                pass  # widget destroyed
+            return
+        self._notify(doc)
+
+    def _retry(self, doc: Document) -> None:
+        # The stored chunks no longer match our map; rewrite them all next time.
+        if doc is self.document:
+            self._rewrite = True
+            self.changed()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+        finally:
+            self._executor.shutdown(wait=True)
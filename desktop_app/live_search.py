@@ -0,0 +1,130 @@
+"""Debounced search-as-you-type running on a background worker."""
+from __future__ import annotations
+import concurrent.futures
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from storage import db as storage_db
+from storage import repository
+
+
+class LiveSearch:
+    """Run the latest query typed into a widget without blocking Tk.
+
+    `schedule()` is called on every keystroke from the Tk thread; the query
+    only runs once typing pauses for `delay_ms`. Queries run one at a time
+    on a single worker thread with its own SQLite connection. When a newer
+    query is submitted, a query still in flight is cancelled with
+    `sqlite3.Connection.interrupt()` and its results are discarded.
+    `on_results(text, page)` is invoked on the Tk thread via `after()`.
+    `submit()` can run a one-off query with its own `search_fn` and
+    callback (e.g. for Enter), under the same cancellation rules.
+    """
+
+    def __init__(
+        self,
+        widget: Any,
+        on_results: Callable[[str, Any], None],
+        delay_ms: int = 150,
+        limit: int = 50,
+        db_path: str | Path | None = None,
+        search_fn: Optional[Callable[[str, sqlite3.Connection], Any]] = None,
+    ) -> None:
+        self.logger = logging.getLogger(__name__)
+        self.widget = widget
+        self.on_results = on_results
+        self.delay_ms = delay_ms
+        self.limit = limit
+        self.db_path = db_path
+        self.search_fn = search_fn or self._default_search
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="live-search")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._running: Optional[int] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._after_id: Optional[str] = None
+
+    def _default_search(self, text: str, conn: sqlite3.Connection) -> Any:
+        return repository.search_notes(repository.prefix_query(text), limit=self.limit, conn=conn)
+
+    def schedule(self, text: str) -> None:
+        """Debounce: (re)start the timer for `text`."""
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+        self._after_id = self.widget.after(self.delay_ms, self.submit, text)
+
+    def submit(
+        self,
+        text: str,
+        on_results: Optional[Callable[[str, Any], None]] = None,
+        search_fn: Optional[Callable[[str, sqlite3.Connection], Any]] = None,
+    ) -> None:
+        """Run `text` now, cancelling whatever query is pending or running.
+
+        `on_results` and `search_fn` override the instance's for this query.
+        """
+        if self._after_id is not None:
+            try:
+                self.widget.after_cancel(self._after_id)
+            except Exception:
+                pass
+            self._after_id = None
+        with self._lock:
+            self._generation += 1
+            gen = self._generation
+            if self._running is not None and self._conn is not None:
+                self._conn.interrupt()
+        self._executor.submit(self._run, gen, text, on_results or self.on_results, search_fn or self.search_fn)
+
+    def _run(
+        self,
+        gen: int,
+        text: str,
+        on_results: Callable[[str, Any], None],
+        search_fn: Callable[[str, sqlite3.Connection], Any],
+    ) -> None:
+        with self._lock:
+            if gen != self._generation:
+                return  # superseded before it started
+        if not text.strip():
+            self._deliver(gen, text, None, on_results)
+            return
+        with storage_db.get_manager(self.db_path).reader() as conn:
+            with self._lock:
+                self._conn = conn
+                self._running = gen
+            try:
+                result = search_fn(text, conn)
+            except sqlite3.OperationalError as e:
+                if "interrupt" in str(e).lower():
+                    return
+                self.logger.exception("Live search failed")
+                return
+            finally:
+                with self._lock:
+                    self._running = None
+        self._deliver(gen, text, result, on_results)
+
+    def _deliver(self, gen: int, text: str, result: Any, on_results: Callable[[str, Any], None]) -> None:
+        def deliver() -> None:
+            # Re-check on the Tk thread: a newer query may have been submitted meanwhile.
+            if gen == self._generation:
+                on_results(text, result)
+
+        try:
+            self.widget.after(0, deliver)
+        except Exception:
+            pass  # widget destroyed
+
+    def close(self) -> None:
+        with self._lock:
+            self._generation += 1
+            if self._running is not None and self._conn is not None:
+                self._conn.interrupt()
+        self._executor.shutdown(wait=False)
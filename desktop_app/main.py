@@ -5,7 +5,11 @@ import logging
 from pathlib import Path
 import tkinter as tk
 import tkinter.messagebox as messagebox
+from ai import session as ai_session
 from desktop_app.ui import App
+from storage import db as storage_db
+from storage import journal
+from storage import repository
 
 
 def _configure_logging() -> None:
@@ -31,6 +35,9 @@ def main() -> int:
     logger = logging.getLogger(__name__)
     try:
         logger.info("Starting AI Notepad")
+        # Replays saves a crash left in the journal before any note is shown.
+        journal.get_write_behind()
+        repository.catch_up_search_index()
         # Create Tk root and add top-level menu with Settings entry
         root = tk.Tk()
         root.title("AI Notepad (MVP)")
@@ -53,6 +60,9 @@ def main() -> int:
         root.config(menu=menubar)
 
         root.mainloop()
+        ai_session.close_session()
+        journal.close_all()
+        storage_db.close_all()
         logger.info("AI Notepad exited normally")
         return 0
     except Exception:
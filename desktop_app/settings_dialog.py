@@ -6,6 +6,7 @@ from storage import utils as storage_utils
 from pathlib import Path
 import os
 from ai.client import AIClient
+from config.settings import invalidate_settings
 import threading
 
 
@@ -232,6 +233,8 @@ class SettingsDialog(QtWidgets.QDialog):
                     else:
                         QtWidgets.QMessageBox.information(self, "Save Settings", "Passphrase not provided; API key not stored.")
 
+        # The AI client reads a cached settings snapshot; pick up the new values.
+        invalidate_settings()
         self.accept()
 
     def _load_modes(self) -> None:
@@ -4,11 +4,15 @@ import tkinter as tk
 from tkinter import scrolledtext
 import logging
 from .editor import Editor
+from .live_search import LiveSearch
+from .virtual_list import VirtualList
 from storage import repository
 from storage import db as storage_db
 from ai.presets import PRESETS, build_prompt
-from ai.client import AIClient
+from ai.client import AIClient, mode_max_tokens
+from ai import chunking
 import concurrent.futures
+import queue
 import tkinter.messagebox as messagebox
 from config.settings import get_settings
 
@@ -44,16 +48,30 @@ class App(tk.Frame):
         self.search_entry = tk.Entry(self.sidebar, textvariable=self.search_var)
         self.search_entry.pack(padx=8, pady=4, fill=tk.X)
         self.search_entry.bind('<Return>', self.on_search)
+        self.search_entry.bind('<KeyRelease>', self.on_search_typed)
+
+        # Live results, refreshed as the user types; later pages load on scroll
+        self.search_results = VirtualList(self.sidebar, on_select=self.open_search_hit, height=6)
+        # note id -> (body offset, query word) for hits inside chunked notes
+        self._hit_positions = {}
+        self.search_results.pack(padx=8, pady=4, fill=tk.X)
+        self._live_search = LiveSearch(self, self.show_search_results)
 
         tk.Label(self.sidebar, text="Notebooks").pack(padx=8, pady=(8,0))
-        self.notebooks_list = tk.Listbox(self.sidebar)
+        self.notebooks_list = VirtualList(self.sidebar, on_select=self.on_notebook_selected, height=6)
         self.notebooks_list.pack(padx=8, pady=4, fill=tk.BOTH, expand=True)
 
+        tk.Label(self.sidebar, text="Notes").pack(padx=8, pady=(8,0))
+        self.notes_list = VirtualList(self.sidebar, on_select=self.open_note)
+        # Notebook the notes list shows (None: all notes); see load_notes().
+        self._notes_notebook = None
+        self.notes_list.pack(padx=8, pady=4, fill=tk.BOTH, expand=True)
+
         tk.Label(self.sidebar, text="Recent").pack(padx=8, pady=(8,0))
-        self.recent_list = tk.Listbox(self.sidebar)
+        self.recent_list = VirtualList(self.sidebar, on_select=self.open_note, height=6)
         self.recent_list.pack(padx=8, pady=4, fill=tk.BOTH, expand=True)
 
-        self.editor = Editor(self)
+        self.editor = Editor(self, on_saved=self.note_saved)
         self.editor.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True)
 
         # AI rewrite controls
@@ -84,26 +102,139 @@ class App(tk.Frame):
         self.load_recent()
 
     def load_notebooks(self):
-        self.notebooks_list.delete(0, tk.END)
-        for nb in repository.list_notebooks():
-            self.notebooks_list.insert(tk.END, nb['name'])
+        self.notebooks_list.reset(items=[(nb['id'], nb['name']) for nb in repository.list_notebooks()])
+        self.load_notes(None)
+
+    def load_notes(self, notebook_id):
+        """Page the notes of `notebook_id` (None: all notes) into the notes list."""
+        self._notes_notebook = notebook_id
+
+        def loader(cursor):
+            kwargs = {} if notebook_id is None else {'notebook_id': notebook_id}
+            page = repository.list_notes(columns=('id', 'title'), limit=200, cursor=cursor, **kwargs)
+            return [(r.id, r.title or f"Note {r.id}") for r in page.records], page.next_cursor
+
+        self.notes_list.reset(loader=loader)
+
+    def on_notebook_selected(self, notebook_id):
+        self.load_notes(notebook_id)
+
+    # Single-row list updates; the lists are never reloaded for these.
+
+    def _relabel(self, note_id, title):
+        label = title or f"Note {note_id}"
+        for lst in (self.notes_list, self.recent_list, self.search_results):
+            if lst.model.index(note_id) >= 0:
+                lst.upsert(note_id, label)
+
+    def note_saved(self, note_id, title):
+        """Autosave callback: a note was created or saved, so it is now the newest."""
+        self._relabel(note_id, title)
+        # Lists are newest first. A note autosave just created has no
+        # notebook, so it only shows up in the all-notes view.
+        if self._notes_notebook is None or self.notes_list.model.index(note_id) >= 0:
+            self.notes_list.upsert(note_id, title or f"Note {note_id}", position=0)
+
+    def rename_note(self, note_id, title):
+        """Rename a note (by hand or to an AI-generated title)."""
+        repository.rename_note(note_id, title)
+        self.editor.set_title(note_id, title)
+        self._relabel(note_id, title)
+
+    def move_note(self, note_id, notebook_id):
+        """Move a note to `notebook_id` (None: no notebook)."""
+        repository.set_notebook(note_id, notebook_id)
+        if self._notes_notebook is None or self._notes_notebook == notebook_id:
+            note = repository.get_note(note_id, assemble=False)
+            if note:
+                self.notes_list.upsert(note_id, note.get('title') or f"Note {note_id}", position=0)
+        else:
+            self.notes_list.remove(note_id)
+
+    def create_notebook(self, name):
+        notebook_id = repository.create_notebook(name)
+        self.notebooks_list.upsert(notebook_id, name)
+        return notebook_id
 
     def load_recent(self):
-        self.recent_list.delete(0, tk.END)
-        for r in repository.list_recent():
-            self.recent_list.insert(tk.END, str(r['note_id']))
+        self.recent_list.reset(
+            items=[(r['id'], r['title'] or f"Note {r['id']}") for r in repository.list_recent(limit=repository.RECENT_CAP)]
+        )
 
     def on_search(self, event=None):
         q = self.search_var.get().strip()
         if not q:
             return
-        results = repository.search(q)
-        if results:
-            # open first result for now
-            nid = results[0]['id']
-            note = repository.get_note(nid)
-            self.editor.text.delete('1.0', tk.END)
-            self.editor.text.insert('1.0', note.get('body',''))
+        # Off the Tk thread, like live results; supersedes any pending one.
+        self._live_search.submit(
+            q,
+            on_results=self._open_best_hit,
+            search_fn=lambda text, conn: repository.search_notes(text, limit=1, conn=conn),
+        )
+
+    def _open_best_hit(self, text, page):
+        if page is not None and page.hits:
+            # hits are ranked, so the first one is the best match
+            self._remember_positions(text, page.hits)
+            self.open_search_hit(page.hits[0].id)
+
+    def on_search_typed(self, event=None):
+        if event is not None and event.keysym == 'Return':
+            return
+        self._live_search.schedule(self.search_var.get())
+
+    def _remember_positions(self, text, hits, positions=None):
+        """Record where chunked hits matched. Tk thread only.
+
+        With `positions`, only if those are still the current results'.
+        """
+        if positions is None:
+            positions = self._hit_positions
+        elif positions is not self._hit_positions:
+            return
+        words = text.split()
+        for h in hits:
+            if h.chunk_offset is not None:
+                positions[h.id] = (h.chunk_offset, words[0] if words else None)
+
+    def show_search_results(self, text, page):
+        self._hit_positions = positions = {}
+        if page is None:
+            self.search_results.reset()
+            return
+        query = repository.prefix_query(text)
+        self._remember_positions(text, page.hits)
+
+        def loader(cursor):
+            # Runs on the list's worker thread; hand the positions to Tk.
+            more = repository.search_notes(query, limit=50, cursor=cursor)
+            self.after(0, self._remember_positions, text, more.hits, positions)
+            return [(h.id, h.title) for h in more.hits], more.next_cursor
+
+        self.search_results.reset(items=[(h.id, h.title) for h in page.hits], loader=loader, cursor=page.next_cursor)
+
+    def destroy(self):
+        self._live_search.close()
+        super().destroy()
+
+    def open_search_hit(self, note_id: int):
+        """Open a search result, scrolled to the match for chunked notes."""
+        offset, term = self._hit_positions.get(note_id, (None, None))
+        self.open_note(note_id, offset=offset, term=term)
+
+    def open_note(self, note_id: int, offset=None, term=None):
+        note = repository.get_note(note_id, assemble=False)
+        if not note:
+            return
+        if note.get('chunked'):
+            self.editor.load_chunks(
+                note_id, repository.get_note_chunks(note_id), title=note.get('title') or 'Untitled', offset=offset, term=term
+            )
+        else:
+            self.editor.load_note(note_id, note.get('body', ''), title=note.get('title') or 'Untitled')
+        repository.touch_recent(note_id)
+        # Move just this row to the top instead of reloading the list.
+        self.recent_list.upsert(note_id, note.get('title') or f"Note {note_id}", position=0)
 
     def on_rewrite(self):
         sel = self.editor.text.tag_ranges(tk.SEL)
@@ -128,48 +259,56 @@ class App(tk.Frame):
             return
 
         sel_option = self.preset_var.get()
-        self.ai_status.config(text="Requesting AI...")
+        max_tokens = None
         # Determine if selection is a stored mode or a preset
         try:
             if sel_option.startswith("mode:"):
                 # format: mode:<id>:<name>
                 parts = sel_option.split(":", 2)
                 mode_id = int(parts[1])
-                conn = storage_db.get_connection()
-                mode = next((m for m in storage_db.list_rewrite_modes(conn) if m.id == mode_id), None)
+                with storage_db.get_manager().reader() as conn:
+                    mode = next((m for m in storage_db.list_rewrite_modes(conn) if m.id == mode_id), None)
                 if not mode:
                     raise RuntimeError("Selected rewrite mode not found")
-                fut = self._executor.submit(self._ai_client.apply_rewrite_mode, mode, text)
+                make_prompt = lambda t: self._ai_client.mode_prompt(mode, t)
+                max_tokens = mode_max_tokens(mode)
             elif sel_option.startswith("preset:"):
                 key = sel_option.split(":", 1)[1]
-                prompt = build_prompt(key, text)
-                fut = self._executor.submit(self._ai_client.rewrite, prompt)
+                make_prompt = lambda t: build_prompt(key, t)
             else:
                 # fallback to first preset
-                prompt = build_prompt(list(PRESETS.keys())[0], text)
-                fut = self._executor.submit(self._ai_client.rewrite, prompt)
-            self.logger.info("Submitting rewrite request", extra={"selection": sel_option})
+                make_prompt = lambda t: build_prompt(list(PRESETS.keys())[0], t)
+            if chunking.needs_chunking(text):
+                # Long text (typically a whole-note mode): rewrite chunks
+                # concurrently; the preview fills in chunk by chunk.
+                stream = chunking.ChunkedRewrite(
+                    self._ai_client,
+                    text,
+                    make_prompt,
+                    concurrency=settings.rewrite_concurrency or chunking.DEFAULT_CONCURRENCY,
+                    max_tokens=max_tokens,
+                )
+            else:
+                stream = self._ai_client.rewrite_stream(
+                    make_prompt(text), max_tokens=max_tokens or chunking.output_tokens(text)
+                )
         except Exception as e:
             self.logger.exception("Failed to submit rewrite request")
             messagebox.showerror("AI Error", str(e))
-            self.ai_status.config(text="")
             return
 
-        def cb(future):
-            try:
-                result = future.result()
-            except Exception as e:
-                err_msg = str(e)
-                self.logger.exception("AI rewrite failed")
-                self.master.after(0, lambda err=err_msg: (self.ai_status.config(text="AI error"), messagebox.showerror("AI Error", err)))
-                return
-
-            def show_preview():
-                self.ai_status.config(text="")
-                self.logger.info("AI rewrite received", extra={"chars": len(result) if result else 0})
-                PreviewDialog(self.master, original=text, rewritten=result, apply_callback=lambda r: self._apply_rewrite(sel, r))
+        # The preview opens immediately and fills in as tokens arrive.
+        dlg = PreviewDialog(
+            self.master, original=text, rewritten="", apply_callback=lambda r: self._apply_rewrite(sel, r), stream=stream
+        )
+        self.logger.info("Submitting rewrite request", extra={"selection": sel_option})
+        fut = self._executor.submit(dlg.consume, stream)
 
-            self.master.after(0, show_preview)
+        def cb(future):
+            if dlg.error:
+                self.logger.error("AI rewrite failed: %s", dlg.error)
+            else:
+                self.logger.info("AI rewrite received", extra={"cancelled": stream.cancelled})
         fut.add_done_callback(cb)
 
     def _apply_rewrite(self, sel, new_text):
@@ -237,8 +376,8 @@ class App(tk.Frame):
     def reload_rewrite_options(self):
         # Rebuild the rewrite options from storage and presets
         try:
-            conn = storage_db.get_connection()
-            modes = storage_db.list_rewrite_modes(conn)
+            with storage_db.get_manager().reader() as conn:
+                modes = storage_db.list_rewrite_modes(conn)
         except Exception:
             modes = []
 
@@ -278,11 +417,30 @@ def _build_menu_options_from_modes_and_presets(modes):
 
 
 class PreviewDialog(tk.Toplevel):
-    def __init__(self, master, original: str, rewritten: str, apply_callback):
+    """Side-by-side preview of a rewrite.
+
+    With `stream` (an `ai.client.RewriteStream`, or an
+    `ai.chunking.ChunkedRewrite` for long texts), the dialog opens at once
+    and `consume()` feeds it text from a worker thread; it is queued and
+    appended on the Tk thread at most every `FRAME_MS`. Accept is enabled
+    only when the stream ends cleanly with some text; after an error
+    (including an answer cut off at `max_tokens`) the partial text stays
+    visible, the error is shown below it and Accept stays disabled. Cancel
+    closes the stream mid-generation.
+    """
+
+    FRAME_MS = 33
+
+    def __init__(self, master, original: str, rewritten: str, apply_callback, stream=None):
         super().__init__(master)
         self.title("AI Rewrite Preview")
         self.apply_callback = apply_callback
         self.geometry("800x400")
+        self.stream = stream
+        self._pending = queue.SimpleQueue()
+        self._done = stream is None
+        self.error: str | None = None
+        self._after_id = None
 
         self.orig_text = scrolledtext.ScrolledText(self, width=40)
         self.orig_text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
@@ -296,20 +454,85 @@ class PreviewDialog(tk.Toplevel):
         btn_frame = tk.Frame(self)
         btn_frame.pack(side=tk.BOTTOM, fill=tk.X)
 
-        accept_btn = tk.Button(btn_frame, text="Accept", command=self._accept)
-        accept_btn.pack(side=tk.RIGHT, padx=8, pady=8)
+        self.accept_btn = tk.Button(btn_frame, text="Accept", command=self._accept)
+        self.accept_btn.pack(side=tk.RIGHT, padx=8, pady=8)
 
         cancel_btn = tk.Button(btn_frame, text="Cancel", command=self._cancel)
         cancel_btn.pack(side=tk.RIGHT, padx=8, pady=8)
 
+        self.status = tk.Label(btn_frame, text="")
+        self.status.pack(side=tk.LEFT, padx=8)
+        self.protocol("WM_DELETE_WINDOW", self._cancel)
+
+        if stream is not None:
+            self.accept_btn.config(state=tk.DISABLED)
+            self.status.config(text="Waiting for AI...")
+            self._after_id = self.after(self.FRAME_MS, self._pump)
+
+    def consume(self, stream) -> None:
+        """Read `stream` to the end. Runs on a worker thread; touches no widgets."""
+        try:
+            for token in stream:
+                self._pending.put(token)
+            if getattr(stream, "finish_reason", None) == "length":
+                self.error = (
+                    "the rewrite reached max_tokens and was cut off; "
+                    "raise max_tokens in the rewrite mode's advanced settings"
+                )
+        except Exception as e:
+            self.error = str(e) or "AI request failed"
+        finally:
+            self._done = True
+
+    def _pump(self):
+        # Check `_done` before draining so no token put before it is missed.
+        done = self._done
+        parts = []
+        while True:
+            try:
+                parts.append(self._pending.get_nowait())
+            except queue.Empty:
+                break
+        if parts:
+            chunk = "".join(parts)
+            if self.rew_text.compare('end-1c', '==', '1.0'):
+                chunk = chunk.lstrip()
+            self.rew_text.insert(tk.END, chunk)
+            self.rew_text.see(tk.END)
+            self.status.config(text="Generating...")
+        if not done:
+            self._after_id = self.after(self.FRAME_MS, self._pump)
+            return
+        self._after_id = None
+        if self.error:
+            # Partial output stays visible, but it is not offered for applying.
+            self.status.config(text=f"AI error: {self.error}", fg="red")
+        elif getattr(self.stream, "cancelled", False):
+            self.status.config(text="Cancelled")
+        elif not self.rew_text.get('1.0', tk.END).strip():
+            self.status.config(text="AI returned no text", fg="red")
+        else:
+            self.accept_btn.config(state=tk.NORMAL)
+            self.status.config(text="")
+
     def _accept(self):
+        if str(self.accept_btn['state']) == tk.DISABLED:
+            return  # stream failed, was cancelled or is still running
         new_text = self.rew_text.get('1.0', tk.END).rstrip()
         self.apply_callback(new_text)
         self.destroy()
 
     def _cancel(self):
+        if self.stream is not None:
+            self.stream.cancel()
         self.destroy()
 
+    def destroy(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+            self._after_id = None
+        super().destroy()
+
     def open_settings(self):
         QtWidgets, SettingsDialog = _load_qt_settings_dialog()
         if QtWidgets is None or SettingsDialog is None:
@@ -0,0 +1,283 @@
+"""Virtualized list widget for sidebars with many thousands of entries.
+
+`ListModel` keeps ids in an `array('q')` next to a list of labels, which is
+the whole in-memory footprint per item. `VirtualList` renders only the rows
+that fit in its `tk.Listbox`, drives its own scrollbar, and pulls further
+pages from a `loader` on a background thread as the user nears the end.
+Callers can push single-row changes (`upsert`, `remove`) instead of
+reloading the whole list.
+"""
+from __future__ import annotations
+import concurrent.futures
+import logging
+import tkinter as tk
+import tkinter.font as tkfont
+from array import array
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+
+Item = Tuple[int, str]
+# loader(cursor) -> (items, next_cursor); next_cursor None means no more pages.
+Loader = Callable[[Optional[str]], Tuple[Sequence[Item], Optional[str]]]
+
+
+class ListModel:
+    """Ordered `(id, label)` items in compact parallel arrays."""
+
+    def __init__(self) -> None:
+        self.ids = array("q")
+        self.labels: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def clear(self) -> None:
+        self.ids = array("q")
+        self.labels = []
+
+    def extend(self, items: Iterable[Item]) -> None:
+        for item_id, label in items:
+            self.ids.append(item_id)
+            self.labels.append(label)
+
+    def index(self, item_id: int) -> int:
+        try:
+            return self.ids.index(item_id)
+        except ValueError:
+            return -1
+
+    def upsert(self, item_id: int, label: str, position: Optional[int] = None) -> int:
+        """Relabel `item_id`, moving it to `position` if given; insert if missing.
+
+        New items go to `position` or the end. Returns the item's new index.
+        """
+        idx = self.index(item_id)
+        if idx >= 0 and (position is None or position == idx):
+            self.labels[idx] = label
+            return idx
+        if idx >= 0:
+            del self.ids[idx]
+            del self.labels[idx]
+        if position is None:
+            position = len(self.ids)
+        position = max(0, min(position, len(self.ids)))
+        self.ids.insert(position, item_id)
+        self.labels.insert(position, label)
+        return position
+
+    def remove(self, item_id: int) -> bool:
+        idx = self.index(item_id)
+        if idx < 0:
+            return False
+        del self.ids[idx]
+        del self.labels[idx]
+        return True
+
+
+class Viewport:
+    """Which slice of the model is on screen; pure arithmetic, no Tk."""
+
+    def __init__(self, rows: int = 20, prefetch_pages: float = 2.0) -> None:
+        self.top = 0
+        self.rows = max(1, rows)
+        # Load more once fewer than this many screens remain below the view.
+        self.prefetch_pages = prefetch_pages
+
+    def clamp(self, total: int) -> None:
+        self.top = max(0, min(self.top, total - self.rows))
+
+    def scroll_by(self, rows: int, total: int) -> None:
+        self.top += rows
+        self.clamp(total)
+
+    def scroll_to_fraction(self, fraction: float, total: int) -> None:
+        self.top = int(fraction * total)
+        self.clamp(total)
+
+    def ensure_visible(self, index: int, total: int) -> None:
+        if index < self.top:
+            self.top = index
+        elif index >= self.top + self.rows:
+            self.top = index - self.rows + 1
+        self.clamp(total)
+
+    def window(self, total: int) -> range:
+        return range(self.top, min(total, self.top + self.rows))
+
+    def fractions(self, total: int) -> Tuple[float, float]:
+        """Scrollbar thumb position, as `Scrollbar.set()` expects."""
+        if total <= self.rows:
+            return 0.0, 1.0
+        return self.top / total, min(1.0, (self.top + self.rows) / total)
+
+    def needs_more(self, total: int) -> bool:
+        return self.top + self.rows * (1 + self.prefetch_pages) >= total
+
+
+class VirtualList(tk.Frame):
+    """Listbox that shows a window onto a `ListModel` and pages in lazily."""
+
+    def __init__(
+        self,
+        master=None,
+        loader: Optional[Loader] = None,
+        on_select: Optional[Callable[[int], None]] = None,
+        height: int = 10,
+        **kwargs,
+    ) -> None:
+        super().__init__(master, **kwargs)
+        self.logger = logging.getLogger(__name__)
+        self.model = ListModel()
+        self.viewport = Viewport(rows=height)
+        self.on_select = on_select
+        self.selected_id: Optional[int] = None
+        self.listbox = tk.Listbox(self, height=height, exportselection=False, activestyle="none")
+        self.scrollbar = tk.Scrollbar(self, orient=tk.VERTICAL, command=self._on_scrollbar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.listbox.bind("<Configure>", self._on_resize)
+        self.listbox.bind("<<ListboxSelect>>", self._on_listbox_select)
+        self.listbox.bind("<MouseWheel>", self._on_wheel)
+        self.listbox.bind("<Button-4>", lambda e: self._scroll(-3))
+        self.listbox.bind("<Button-5>", lambda e: self._scroll(3))
+        self.listbox.bind("<Up>", lambda e: self._move_selection(-1))
+        self.listbox.bind("<Down>", lambda e: self._move_selection(1))
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="virtual-list")
+        self._loader: Optional[Loader] = None
+        self._cursor: Optional[str] = None
+        self._has_more = False
+        self._loading = False
+        self._generation = 0
+        if loader is not None:
+            self.reset(loader=loader)
+
+    # -- data -------------------------------------------------------------
+
+    def reset(self, items: Iterable[Item] = (), loader: Optional[Loader] = None, cursor: Optional[str] = None) -> None:
+        """Replace the contents with `items`, then page in from `loader`.
+
+        With `items` and `cursor`, the first page is already known and the
+        loader is only asked for the pages after `cursor`.
+        """
+        self._generation += 1
+        self.model.clear()
+        self.model.extend(items)
+        self.viewport.top = 0
+        self.selected_id = None
+        self._loader = loader
+        self._cursor = cursor
+        self._has_more = loader is not None and (cursor is not None or not len(self.model))
+        self._loading = False
+        self._render()
+
+    def upsert(self, item_id: int, label: str, position: Optional[int] = None) -> None:
+        """Add or relabel one item (optionally moving it) without a reload."""
+        self.model.upsert(item_id, label, position)
+        self._render()
+
+    def remove(self, item_id: int) -> None:
+        if self.model.remove(item_id):
+            if self.selected_id == item_id:
+                self.selected_id = None
+            self._render()
+
+    def _maybe_load(self) -> None:
+        if not self._has_more or self._loading or self._loader is None:
+            return
+        if not self.viewport.needs_more(len(self.model)):
+            return
+        self._loading = True
+        gen, loader, cursor = self._generation, self._loader, self._cursor
+        future = self._executor.submit(loader, cursor)
+
+        def done(f: concurrent.futures.Future) -> None:
+            try:
+                self.after(0, self._on_page, gen, f)
+            except Exception:
+                pass  # widget destroyed
+
+        future.add_done_callback(done)
+
+    def _on_page(self, gen: int, future: concurrent.futures.Future) -> None:
+        if gen != self._generation:
+            return  # reset() since the request went out
+        self._loading = False
+        try:
+            items, cursor = future.result()
+        except Exception:
+            self.logger.exception("Loading list page failed")
+            self._has_more = False
+            return
+        self.model.extend(items)
+        self._cursor = cursor
+        self._has_more = cursor is not None
+        self._render()
+
+    # -- view -------------------------------------------------------------
+
+    def _render(self) -> None:
+        total = len(self.model)
+        self.viewport.clamp(total)
+        window = self.viewport.window(total)
+        self.listbox.delete(0, tk.END)
+        if window:
+            self.listbox.insert(tk.END, *self.model.labels[window.start:window.stop])
+        if self.selected_id is not None:
+            idx = self.model.index(self.selected_id)
+            if idx in window:
+                self.listbox.selection_set(idx - window.start)
+        self.scrollbar.set(*self.viewport.fractions(total))
+        self._maybe_load()
+
+    def _on_resize(self, event=None) -> None:
+        try:
+            linespace = tkfont.nametofont(self.listbox.cget("font")).metrics("linespace")
+        except Exception:
+            linespace = tkfont.Font(font=self.listbox.cget("font")).metrics("linespace")
+        rows = max(1, self.listbox.winfo_height() // (linespace + 1))
+        if rows != self.viewport.rows:
+            self.viewport.rows = rows
+            self._render()
+
+    def _scroll(self, rows: int) -> str:
+        self.viewport.scroll_by(rows, len(self.model))
+        self._render()
+        return "break"
+
+    def _on_wheel(self, event) -> str:
+        return self._scroll(-3 if event.delta > 0 else 3)
+
+    def _on_scrollbar(self, *args) -> None:
+        total = len(self.model)
+        if args[0] == "moveto":
+            self.viewport.scroll_to_fraction(float(args[1]), total)
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self.viewport.rows if args[2] == "pages" else 1)
+            self.viewport.scroll_by(step, total)
+        self._render()
+
+    def _on_listbox_select(self, event=None) -> None:
+        sel = self.listbox.curselection()
+        if not sel:
+            return
+        idx = self.viewport.top + sel[0]
+        if idx < len(self.model):
+            self._select(idx)
+
+    def _move_selection(self, delta: int) -> str:
+        current = self.model.index(self.selected_id) if self.selected_id is not None else -1
+        idx = max(0, min(len(self.model) - 1, current + delta))
+        if len(self.model):
+            self.viewport.ensure_visible(idx, len(self.model))
+            self._select(idx)
+            self._render()
+        return "break"
+
+    def _select(self, idx: int) -> None:
+        self.selected_id = self.model.ids[idx]
+        if self.on_select is not None:
+            self.on_select(self.selected_id)
+
+    def destroy(self) -> None:
+        self._generation += 1
+        self._executor.shutdown(wait=False)
+        super().destroy()
@@ -0,0 +1,228 @@
+"""Chunked storage for very large note bodies.
+
+A note with `notes.chunked = 1` keeps its body in `note_chunks` rows instead
+of `notes.body` (which is left empty). Rows are ordered by `seq`. New
+chunks get sequence numbers `SEQ_GAP` apart, so a chunk can be inserted
+between two others without renumbering the rest of the note. Editing one
+region of a multi-megabyte note then rewrites only the rows covering it.
+
+Chunk boundaries fall on paragraph breaks chosen by content (see
+`split_body()`), so an edit moves at most the boundaries next to it. Each
+row stores a hash of its content, and `store_body()` rewrites only the
+chunks whose hash changed. When FTS5 is available, `note_chunks_fts`
+indexes every chunk separately.
+
+`repository.get_note()` and `iter_notes()` reassemble chunked bodies, so
+readers never need to know about the layout. The search fallbacks without
+FTS5 (`storage/trigram.py`, `storage/inverted_index.py` and the LIKE scans)
+read chunk contents too.
+"""
+from __future__ import annotations
+import hashlib
+import re
+import sqlite3
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+# Bodies at least this long open in the editor's large-document mode and
+# are stored chunked by the repository's update paths.
+LARGE_NOTE_CHARS = 512 * 1024
+# Largest chunk in characters; most end up between half and all of it.
+CHUNK_TARGET = 16 * 1024
+SEQ_GAP = 1 << 20
+# About one paragraph in this many ends a chunk once it is half full.
+_CUT_DIVISOR = 8
+
+_para_end_re = re.compile(r"\n{2,}")
+
+
+def chunk_hash(content: str) -> bytes:
+    return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+
+def _units(body: str, target: int) -> Iterator[str]:
+    """Paragraphs of `body`; too-long ones come as lines, then hard slices."""
+    start = 0
+    ends = [m.end() for m in _para_end_re.finditer(body)]
+    for end in ends + [len(body)]:
+        para = body[start:end]
+        start = end
+        if not para:
+            continue
+        if len(para) <= target:
+            yield para
+            continue
+        for line in para.splitlines(keepends=True):
+            for i in range(0, len(line), target):
+                yield line[i:i + target]
+
+
+def split_body(body: str, target: int = CHUNK_TARGET) -> List[str]:
+    """Cut `body` into chunks of at most `target` chars on paragraph breaks.
+
+    A chunk ends early, once at least half full, after a paragraph whose
+    checksum picks it as a cut point. These cuts depend only on the text
+    around them, so inserting text re-splits the chunks near the edit and
+    later boundaries stay put. Paragraphs longer than `target` are split
+    on lines, and lines longer than `target` are cut mid-line. Joining the
+    pieces gives back `body` exactly.
+    """
+    pieces: List[str] = []
+    buf: List[str] = []
+    size = 0
+    for unit in _units(body, target):
+        if size and size + len(unit) > target:
+            pieces.append("".join(buf))
+            buf, size = [], 0
+        buf.append(unit)
+        size += len(unit)
+        if size >= target // 2 and zlib.crc32(unit.encode("utf-8")) % _CUT_DIVISOR == 0:
+            pieces.append("".join(buf))
+            buf, size = [], 0
+    if buf:
+        pieces.append("".join(buf))
+    return pieces
+
+
+def initial_seqs(count: int) -> List[int]:
+    return [(i + 1) * SEQ_GAP for i in range(count)]
+
+
+def seq_between(before: Optional[int], after: Optional[int]) -> Optional[int]:
+    """A free sequence number strictly between two neighbours, if any."""
+    lo = before if before is not None else 0
+    if after is None:
+        return lo + SEQ_GAP
+    if after - lo > 1:
+        return (lo + after) // 2
+    return None
+
+
+def is_chunked(conn: sqlite3.Connection, note_id: int) -> bool:
+    row = conn.execute("SELECT chunked FROM notes WHERE id = ?", (note_id,)).fetchone()
+    return bool(row and row[0])
+
+
+def load_chunks(conn: sqlite3.Connection, note_id: int) -> List[Tuple[int, str]]:
+    """`(seq, content)` for every chunk of `note_id`, in order."""
+    cur = conn.execute("SELECT seq, content FROM note_chunks WHERE note_id = ? ORDER BY seq", (note_id,))
+    return [(r[0], r[1]) for r in cur.fetchall()]
+
+
+def assemble(conn: sqlite3.Connection, note_id: int) -> str:
+    return "".join(content for _seq, content in load_chunks(conn, note_id))
+
+
+def contents(conn: sqlite3.Connection, note_id: int) -> List[str]:
+    """Chunk texts of `note_id` in order; [] for unchunked notes.
+
+    Safe on schemas from before chunking, so the search indexes can call it
+    while migrations are still rebuilding them.
+    """
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='note_chunks'").fetchone() is None:
+        return []
+    return [content for _seq, content in load_chunks(conn, note_id)]
+
+
+def _rows(note_id: int, chunks: Iterable[Tuple[int, str]]) -> Iterator[Tuple[int, int, str, bytes, int]]:
+    for seq, content in chunks:
+        yield note_id, seq, content, chunk_hash(content), len(content)
+
+
+def write_chunks(conn: sqlite3.Connection, note_id: int, chunks: Sequence[Tuple[int, str]]) -> None:
+    """Replace all of `note_id`'s chunks and mark the note as chunked."""
+    conn.execute("DELETE FROM note_chunks WHERE note_id = ?", (note_id,))
+    conn.executemany(
+        "INSERT INTO note_chunks (note_id, seq, content, hash, size) VALUES (?, ?, ?, ?, ?)",
+        _rows(note_id, chunks),
+    )
+    conn.execute("UPDATE notes SET chunked = 1, body = '' WHERE id = ?", (note_id,))
+
+
+def store_body(conn: sqlite3.Connection, note_id: int, body: str) -> int:
+    """Write a whole new body for a note, rewriting only changed chunks.
+
+    Chunks at the start and end of the note whose hashes match the stored
+    ones are kept. Only the region between them is replaced, with new
+    sequence numbers spread across the gap. Returns the number of chunk
+    rows written.
+    """
+    pieces = split_body(body)
+    stored = conn.execute(
+        "SELECT seq, hash FROM note_chunks WHERE note_id = ? ORDER BY seq", (note_id,)
+    ).fetchall()
+    hashes = [chunk_hash(p) for p in pieces]
+    head = 0
+    while head < min(len(stored), len(pieces)) and stored[head][1] == hashes[head]:
+        head += 1
+    tail = 0
+    while (
+        tail < min(len(stored), len(pieces)) - head
+        and stored[len(stored) - 1 - tail][1] == hashes[len(pieces) - 1 - tail]
+    ):
+        tail += 1
+    middle = pieces[head:len(pieces) - tail]
+    lo = stored[head - 1][0] if head else 0
+    hi = stored[len(stored) - tail][0] if tail else None
+    seqs = _spread(lo, hi, len(middle))
+    if seqs is None:
+        write_chunks(conn, note_id, list(zip(initial_seqs(len(pieces)), pieces)))
+        return len(pieces)
+    conn.executemany(
+        "DELETE FROM note_chunks WHERE note_id = ? AND seq = ?",
+        ((note_id, seq) for seq, _hash in stored[head:len(stored) - tail]),
+    )
+    conn.executemany(
+        "INSERT INTO note_chunks (note_id, seq, content, hash, size) VALUES (?, ?, ?, ?, ?)",
+        _rows(note_id, zip(seqs, middle)),
+    )
+    conn.execute("UPDATE notes SET chunked = 1, body = '' WHERE id = ? AND chunked = 0", (note_id,))
+    return len(middle)
+
+
+def _spread(lo: int, hi: Optional[int], count: int) -> Optional[List[int]]:
+    """`count` increasing seqs strictly between `lo` and `hi`, or None."""
+    if hi is None:
+        return [lo + (i + 1) * SEQ_GAP for i in range(count)]
+    if hi - lo <= count:
+        return None
+    return [lo + (hi - lo) * (i + 1) // (count + 1) for i in range(count)]
+
+
+def apply_changes(
+    conn: sqlite3.Connection,
+    note_id: int,
+    upserts: Dict[int, str],
+    deletes: Iterable[int] = (),
+) -> None:
+    """Write only the changed chunks of `note_id`."""
+    conn.executemany(
+        "DELETE FROM note_chunks WHERE note_id = ? AND seq = ?",
+        ((note_id, seq) for seq in deletes),
+    )
+    conn.executemany(
+        "INSERT INTO note_chunks (note_id, seq, content, hash, size) VALUES (?, ?, ?, ?, ?) "
+        "ON CONFLICT(note_id, seq) DO UPDATE SET content = excluded.content, hash = excluded.hash, size = excluded.size "
+        "WHERE hash IS NOT excluded.hash",
+        _rows(note_id, upserts.items()),
+    )
+
+
+def chunk_offsets(conn: sqlite3.Connection, note_id: int, seqs: Iterable[int]) -> Dict[int, int]:
+    """Character offset of each chunk in `seqs` within the assembled body."""
+    return {
+        seq: conn.execute(
+            "SELECT coalesce(sum(size), 0) FROM note_chunks WHERE note_id = ? AND seq < ?", (note_id, seq)
+        ).fetchone()[0]
+        for seq in seqs
+    }
+
+
+def chunked_ids(conn: sqlite3.Connection, note_ids: Iterable[int]) -> set:
+    note_ids = list(note_ids)
+    out = set()
+    for start in range(0, len(note_ids), 500):
+        part = note_ids[start:start + 500]
+        placeholders = ",".join("?" * len(part))
+        out.update(r[0] for r in conn.execute(f"SELECT id FROM notes WHERE chunked = 1 AND id IN ({placeholders})", part))
+    return out
@@ -1,13 +1,19 @@
 """Database connection helpers."""
 from __future__ import annotations
+import atexit
+import logging
+import os
 import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Iterator
-from .migrations import migrate
+from typing import Iterator, Dict
+from .migrations import migrate, migrate_connection
 import json
 from dataclasses import dataclass, asdict
 from typing import Optional, List
 
+logger = logging.getLogger(__name__)
 
 @dataclass
 class ConnectionSettings:
@@ -125,11 +131,69 @@ def delete_rewrite_mode(conn: sqlite3.Connection, mode_id: int) -> None:
 
 DEFAULT_DB = Path.home().joinpath('.local', 'share', 'ai_notepad', 'notes.db')
 
-def get_connection(db_path: str | Path | None = None) -> sqlite3.Connection:
+
+@dataclass(frozen=True)
+class DBProfile:
+    """Per-connection PRAGMA settings trading durability for speed."""
+
+    name: str
+    journal_mode: str
+    synchronous: str
+    cache_size: int  # negative values are KiB, as in PRAGMA cache_size
+    mmap_size: int
+    temp_store: str
+    busy_timeout: int  # milliseconds
+
+
+PROFILES: Dict[str, DBProfile] = {
+    # fsync on every commit, as before, but readers no longer block on writers.
+    "safe": DBProfile("safe", "WAL", "FULL", -8000, 0, "DEFAULT", 5000),
+    # WAL + NORMAL only fsyncs at checkpoints; a power loss can drop the last
+    # commits but never corrupts the database.
+    "balanced": DBProfile("balanced", "WAL", "NORMAL", -32000, 64 * 1024 * 1024, "MEMORY", 5000),
+    # No fsync at all; for bulk imports and benchmarks.
+    "fast": DBProfile("fast", "WAL", "OFF", -64000, 256 * 1024 * 1024, "MEMORY", 2000),
+}
+DEFAULT_PROFILE = "balanced"
+
+
+def resolve_profile(profile: str | DBProfile | None = None) -> DBProfile:
+    """Return the profile object for `profile`, or the configured default."""
+    if isinstance(profile, DBProfile):
+        return profile
+    if profile is None:
+        try:
+            from config.settings import get_db_profile
+
+            configured = get_db_profile()
+        except Exception:
+            configured = os.environ.get("AI_NOTEPAD_DB_PROFILE")
+        return PROFILES.get((configured or "").strip().lower(), PROFILES[DEFAULT_PROFILE])
+    try:
+        return PROFILES[profile.strip().lower()]
+    except KeyError:
+        raise ValueError(f"Unknown database profile {profile!r}; expected one of {sorted(PROFILES)}") from None
+
+
+def apply_profile(conn: sqlite3.Connection, profile: str | DBProfile | None = None) -> DBProfile:
+    prof = resolve_profile(profile)
+    conn.execute(f"PRAGMA busy_timeout = {int(prof.busy_timeout)}")
+    conn.execute(f"PRAGMA journal_mode = {prof.journal_mode}")
+    conn.execute(f"PRAGMA synchronous = {prof.synchronous}")
+    conn.execute(f"PRAGMA cache_size = {int(prof.cache_size)}")
+    conn.execute(f"PRAGMA mmap_size = {int(prof.mmap_size)}")
+    conn.execute(f"PRAGMA temp_store = {prof.temp_store}")
+    return prof
+
+
+def get_connection(db_path: str | Path | None = None, profile: str | DBProfile | None = None) -> sqlite3.Connection:
     db_path = Path(db_path) if db_path else DEFAULT_DB
-    migrate(db_path)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(db_path), check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA foreign_keys = ON")
+    apply_profile(conn, profile)
+    migrate_connection(conn)
     return conn
 
 def connection_context(db_path: str | Path | None = None) -> Iterator[sqlite3.Connection]:
@@ -138,3 +202,107 @@ def connection_context(db_path: str | Path | None = None) -> Iterator[sqlite3.Co
         yield conn
     finally:
         conn.close()
+
+
+class ConnectionManager:
+    """Long-lived connections for a single database file.
+
+    The database is migrated once when the manager is created. Writes go
+    through one shared connection guarded by a re-entrant lock; reads use a
+    connection per thread so they never wait on the writer lock.
+    """
+
+    def __init__(self, db_path: str | Path, profile: str | DBProfile | None = None) -> None:
+        self.db_path = Path(db_path)
+        self.profile = resolve_profile(profile)
+        migrate(self.db_path)
+        self._write_lock = threading.RLock()
+        self._writer: Optional[sqlite3.Connection] = None
+        self._local = threading.local()
+        self._readers: List[sqlite3.Connection] = []
+        self._readers_lock = threading.Lock()
+        self._closed = False
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA foreign_keys = ON")
+        apply_profile(conn, self.profile)
+        return conn
+
+    @contextmanager
+    def writer(self) -> Iterator[sqlite3.Connection]:
+        """Yield the shared writer connection while holding the write lock."""
+        with self._write_lock:
+            if self._closed:
+                raise RuntimeError("ConnectionManager is closed")
+            if self._writer is None:
+                self._writer = self._open()
+            yield self._writer
+
+    @contextmanager
+    def reader(self) -> Iterator[sqlite3.Connection]:
+        """Yield the calling thread's read connection."""
+        if self._closed:
+            raise RuntimeError("ConnectionManager is closed")
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._open()
+            self._local.conn = conn
+            with self._readers_lock:
+                self._readers.append(conn)
+        yield conn
+
+    def close(self) -> None:
+        """Close the writer and every reader opened by this manager."""
+        with self._write_lock:
+            self._closed = True
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            with self._readers_lock:
+                for conn in self._readers:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                self._readers.clear()
+
+
+_managers: Dict[Path, ConnectionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_manager(db_path: str | Path | None = None, profile: str | DBProfile | None = None) -> ConnectionManager:
+    """Return the process-wide manager for `db_path`, creating it on first use.
+
+    `profile` only applies when the manager is created; asking for a
+    different profile later logs a warning and returns the existing manager.
+    """
+    db_path = Path(db_path) if db_path else DEFAULT_DB
+    key = db_path.resolve()
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            manager = ConnectionManager(db_path, profile)
+            _managers[key] = manager
+        elif profile is not None and resolve_profile(profile) != manager.profile:
+            logger.warning(
+                "Database %s is already open with profile %r; ignoring requested profile %r",
+                key,
+                manager.profile.name,
+                resolve_profile(profile).name,
+            )
+        return manager
+
+
+def close_all() -> None:
+    """Shut down every connection manager; registered with `atexit`."""
+    with _managers_lock:
+        managers = list(_managers.values())
+        _managers.clear()
+    for manager in managers:
+        manager.close()
+
+
+atexit.register(close_all)
@@ -0,0 +1,117 @@
+"""Streaming export of notes to JSONL or a zip of Markdown files.
+
+Both exporters walk `repository.iter_notes()`, so memory use does not grow
+with the number of notes. Markdown files carry the same front matter that
+`storage.importer` reads, so an archive can be imported again.
+"""
+from __future__ import annotations
+import json
+import re
+import sqlite3
+import zipfile
+from dataclasses import dataclass
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from . import repository
+
+_unsafe_re = re.compile(r'[<>:"\\|?*\x00-\x1f]+')
+_slug_re = re.compile(r"[^A-Za-z0-9]+")
+
+
+@dataclass
+class ExportResult:
+    count: int = 0
+    # Highest `updated_at` written.
+    last_updated_at: Optional[str] = None
+    # Pass as `since` for the next incremental export; it also covers notes
+    # saved again within the second of the last one written.
+    next_since: Optional[str] = None
+
+
+def _notebook_names(conn: Optional[sqlite3.Connection]) -> Dict[int, str]:
+    return {nb["id"]: nb["name"] for nb in repository.list_notebooks(conn=conn)}
+
+
+def _iter_with_tags(
+    since: Optional[str], batch_size: int, conn: Optional[sqlite3.Connection]
+) -> Iterator[Tuple[Dict[str, Any], List[str]]]:
+    notes = repository.iter_notes(batch_size=batch_size, since=since, conn=conn)
+    while True:
+        page = list(islice(notes, batch_size))
+        if not page:
+            return
+        tags = repository.get_tags_for_notes((n["id"] for n in page), conn=conn)
+        for note in page:
+            yield note, tags[note["id"]]
+
+
+def export_jsonl(
+    dest: str | Path,
+    since: Optional[str] = None,
+    batch_size: int = 500,
+    conn: Optional[sqlite3.Connection] = None,
+) -> ExportResult:
+    """Write one JSON object per note to `dest`."""
+    result = ExportResult(next_since=since)
+    started = repository.now_ts(conn)
+    notebooks = _notebook_names(conn)
+    with open(dest, "w", encoding="utf-8") as fh:
+        for note, tags in _iter_with_tags(since, batch_size, conn):
+            record = dict(note)
+            record["notebook"] = notebooks.get(note["notebook_id"])
+            record["tags"] = tags
+            fh.write(json.dumps(record, ensure_ascii=False))
+            fh.write("\n")
+            result.count += 1
+            result.last_updated_at = note["updated_at"]
+            result.next_since = repository.since_token(note, started)
+    return result
+
+
+def _safe_component(name: str) -> str:
+    cleaned = _unsafe_re.sub("_", name).strip(" .")
+    return cleaned or "_"
+
+
+def _archive_path(note: Dict[str, Any], notebook: Optional[str]) -> str:
+    slug = _slug_re.sub("-", note["title"]).strip("-").lower()[:60] or "note"
+    filename = f"{slug}-{note['id']}.md"
+    if not notebook:
+        return filename
+    folders = [_safe_component(part) for part in notebook.split("/") if part.strip()]
+    return "/".join(folders + [filename])
+
+
+def _markdown(note: Dict[str, Any], notebook: Optional[str], tags: List[str]) -> str:
+    lines = ["---", f"id: {note['id']}", f"title: {json.dumps(note['title'], ensure_ascii=False)}"]
+    if notebook:
+        lines.append(f"notebook: {json.dumps(notebook, ensure_ascii=False)}")
+    if tags:
+        lines.append("tags:")
+        lines.extend(f"  - {json.dumps(t, ensure_ascii=False)}" for t in tags)
+    lines.append(f"created_at: {note['created_at']}")
+    lines.append(f"updated_at: {note['updated_at']}")
+    lines.append("---")
+    return "\n".join(lines) + "\n" + note["body"]
+
+
+def export_markdown_zip(
+    dest: str | Path,
+    since: Optional[str] = None,
+    batch_size: int = 500,
+    conn: Optional[sqlite3.Connection] = None,
+) -> ExportResult:
+    """Write a zip with one Markdown file per note, in notebook folders."""
+    result = ExportResult(next_since=since)
+    started = repository.now_ts(conn)
+    notebooks = _notebook_names(conn)
+    with zipfile.ZipFile(dest, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        for note, tags in _iter_with_tags(since, batch_size, conn):
+            notebook = notebooks.get(note["notebook_id"])
+            zf.writestr(_archive_path(note, notebook), _markdown(note, notebook, tags))
+            result.count += 1
+            result.last_updated_at = note["updated_at"]
+            result.next_since = repository.since_token(note, started)
+    return result
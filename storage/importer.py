@@ -0,0 +1,291 @@
+"""Streaming bulk import of Markdown/text folders into notebooks.
+
+Files are discovered lazily in a deterministic (sorted) order, so an
+interrupted import can resume from a checkpoint file. Each subfolder becomes
+a notebook named after its path relative to the import root, and `tags:` in
+YAML-style front matter become note tags. The full-text index triggers are
+suspended during the load and the indexes are rebuilt once at the end. If
+the process dies in between, the next `migrations.migrate_connection()`
+(i.e. the next app start) recreates the triggers and rebuilds the indexes.
+"""
+from __future__ import annotations
+import json
+import os
+import re
+import sqlite3
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from . import migrations, repository
+
+IMPORT_SUFFIXES = (".md", ".markdown", ".txt")
+
+_heading_re = re.compile(r"^#\s+(.+?)\s*#*\s*$", re.MULTILINE)
+
+
+@dataclass
+class ImportProgress:
+    files_seen: int = 0
+    imported: int = 0
+    skipped: int = 0
+    current: Optional[str] = None
+    errors: List[str] = field(default_factory=list)
+
+
+@dataclass
+class _Pending:
+    rel: str
+    title: str
+    body: str
+    folder: str
+    tags: Tuple[str, ...]
+
+
+def iter_note_files(root: str | Path, resume_after: Optional[str] = None) -> Iterator[Tuple[Path, str]]:
+    """Yield `(path, relative_posix_path)` for importable files under `root`.
+
+    Entries are visited in sorted order without listing the whole tree up
+    front. Files at or before `resume_after` (a relative path) are skipped,
+    and directories entirely before it are not descended into.
+    """
+    root = Path(root)
+    after = tuple(resume_after.split("/")) if resume_after else None
+
+    def walk(directory: Path, prefix: Tuple[str, ...]) -> Iterator[Tuple[Path, str]]:
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return
+        for entry in entries:
+            parts = prefix + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                if after is not None and parts < after[: len(parts)]:
+                    continue
+                yield from walk(Path(entry.path), parts)
+            elif entry.is_file() and entry.name.lower().endswith(IMPORT_SUFFIXES):
+                if after is not None and parts <= after:
+                    continue
+                yield Path(entry.path), "/".join(parts)
+
+    yield from walk(root, ())
+
+
+def parse_front_matter(text: str) -> Tuple[Dict[str, object], str]:
+    """Split a leading `---` front-matter block from `text`.
+
+    Supports the subset we need without a YAML dependency: `key: value`,
+    inline lists (`tags: [a, b]` or `tags: a, b`) and block lists
+    (`- item` lines under a key).
+    """
+    if not text.startswith("---"):
+        return {}, text
+    lines = text.splitlines(keepends=True)
+    if lines[0].strip() != "---":
+        return {}, text
+    meta: Dict[str, object] = {}
+    key: Optional[str] = None
+    for idx in range(1, len(lines)):
+        line = lines[idx].rstrip("\r\n")
+        if line.strip() in ("---", "..."):
+            return meta, "".join(lines[idx + 1:]).lstrip("\r\n")
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if stripped.startswith("- ") and key is not None:
+            existing = meta.get(key)
+            items = existing if isinstance(existing, list) else []
+            items.append(_unquote(stripped[2:]))
+            meta[key] = items
+            continue
+        if ":" in line:
+            key, _, value = line.partition(":")
+            key = key.strip().lower()
+            value = value.strip()
+            if value.startswith("[") and value.endswith("]"):
+                meta[key] = [_unquote(v) for v in value[1:-1].split(",") if v.strip()]
+            else:
+                meta[key] = _unquote(value) if value else []
+    # No closing delimiter: not front matter after all.
+    return {}, text
+
+
+def _unquote(value: str) -> str:
+    value = value.strip()
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in "'\"":
+        return value[1:-1]
+    return value
+
+
+def _tags_from_meta(meta: Dict[str, object]) -> List[str]:
+    raw = meta.get("tags")
+    if isinstance(raw, str):
+        raw = [t for t in raw.split(",")]
+    if not isinstance(raw, list):
+        return []
+    return [t for t in raw if isinstance(t, str) and t.strip()]
+
+
+def _title_for(path: Path, meta: Dict[str, object], body: str) -> str:
+    title = meta.get("title")
+    if isinstance(title, str) and title.strip():
+        return title.strip()
+    if path.suffix.lower() in (".md", ".markdown"):
+        m = _heading_re.search(body[:4096])
+        if m:
+            return m.group(1)
+    return path.stem
+
+
+def _load_checkpoint(path: Optional[Path], root: Path) -> Dict[str, object]:
+    if path is None or not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as fh:
+        data = json.load(fh)
+    if data.get("root") != str(root.resolve()):
+        raise ValueError(f"Checkpoint {path} belongs to a different import root: {data.get('root')}")
+    return data
+
+
+def _save_checkpoint(path: Optional[Path], data: Dict[str, object]) -> None:
+    if path is None:
+        return
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(data, fh)
+    os.replace(tmp, path)
+
+
+def _suspend_fts_triggers(conn: Optional[sqlite3.Connection]) -> None:
+    with repository.transaction(conn) as tx:
+        migrations.suspend_index_triggers(tx)
+
+
+def _restore_fts_triggers(conn: Optional[sqlite3.Connection]) -> None:
+    """Recreate the suspended triggers and rebuild each full-text index once."""
+    with repository.transaction(conn) as tx:
+        migrations.restore_index_triggers(tx)
+
+
+class _NotebookCache:
+    def __init__(self) -> None:
+        self.ids: Dict[str, int] = {}
+
+    def get(self, conn: sqlite3.Connection, name: str) -> int:
+        nid = self.ids.get(name)
+        if nid is None:
+            row = conn.execute("SELECT id FROM notebooks WHERE name = ? ORDER BY id LIMIT 1", (name,)).fetchone()
+            nid = row[0] if row else repository.create_notebook(name, conn=conn)
+            self.ids[name] = nid
+        return nid
+
+
+def import_folder(
+    root: str | Path,
+    batch_size: int = 500,
+    checkpoint_path: str | Path | None = None,
+    progress: Optional[Callable[[ImportProgress], None]] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> ImportProgress:
+    """Import every `.md`/`.txt` file under `root`.
+
+    Notes are inserted `batch_size` at a time, one transaction per batch.
+    Without `conn` each batch takes the shared writer only for its own
+    transaction, so autosave and other writers get in between batches.
+    When `checkpoint_path` is given, the last committed file is recorded
+    there after every batch. Re-running with the same checkpoint resumes
+    after that file. The checkpoint is removed once the import completes.
+    The full-text triggers are restored when the import ends, whether it
+    completed or failed.
+    """
+    root = Path(root)
+    checkpoint = Path(checkpoint_path) if checkpoint_path else None
+    state = _load_checkpoint(checkpoint, root)
+    report = ImportProgress(imported=int(state.get("imported", 0)))
+    _suspend_fts_triggers(conn)
+    state = {"root": str(root.resolve()), "last": state.get("last"), "imported": report.imported}
+    _save_checkpoint(checkpoint, state)
+
+    notebooks = _NotebookCache()
+    pending: List[_Pending] = []
+
+    def flush() -> None:
+        if not pending:
+            return
+        with repository.transaction(conn) as tx:
+            ids = repository.create_notes(
+                ((p.title, p.body, notebooks.get(tx, p.folder) if p.folder else None) for p in pending), conn=tx
+            )
+            by_tags: Dict[Tuple[str, ...], List[int]] = {}
+            for note_id, p in zip(ids, pending):
+                if p.tags:
+                    by_tags.setdefault(p.tags, []).append(note_id)
+            for tags, note_ids in by_tags.items():
+                repository.add_tags(note_ids, tags, conn=tx)
+        report.imported += len(pending)
+        state["last"] = pending[-1].rel
+        state["imported"] = report.imported
+        _save_checkpoint(checkpoint, state)
+        pending.clear()
+        if progress is not None:
+            progress(report)
+
+    try:
+        for path, rel in iter_note_files(root, resume_after=state["last"]):
+            report.files_seen += 1
+            report.current = rel
+            try:
+                text = path.read_text(encoding="utf-8", errors="replace")
+            except OSError as e:
+                report.skipped += 1
+                report.errors.append(f"{rel}: {e}")
+                continue
+            meta, body = parse_front_matter(text)
+            pending.append(
+                _Pending(
+                    rel=rel,
+                    title=_title_for(path, meta, body),
+                    body=body,
+                    folder=rel.rpartition("/")[0],
+                    tags=tuple(_tags_from_meta(meta)),
+                )
+            )
+            if len(pending) >= batch_size:
+                flush()
+        flush()
+    finally:
+        # Also on failure, so notes saved before a resumed run (which
+        # suspends them again) are indexed.
+        _restore_fts_triggers(conn)
+
+    if checkpoint is not None and checkpoint.exists():
+        checkpoint.unlink()
+    report.current = None
+    if progress is not None:
+        progress(report)
+    return report
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Import a folder of .md/.txt notes.")
+    parser.add_argument("root")
+    parser.add_argument("--db", default=None, help="database path (default: app database)")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--checkpoint", default=None)
+    args = parser.parse_args()
+
+    from .db import get_manager
+
+    def show(p: ImportProgress) -> None:
+        print(f"imported={p.imported} seen={p.files_seen} skipped={p.skipped} {p.current or 'done'}")
+
+    with get_manager(args.db).writer() as conn:
+        report = import_folder(args.root, batch_size=args.batch_size, checkpoint_path=args.checkpoint, progress=show, conn=conn)
+    print(json.dumps(asdict(report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,289 @@
+"""Pure-Python BM25 search for SQLite builds without FTS5.
+
+Migration 5 creates `search_index_docs` only when FTS5 is missing. Each row
+holds one note's term vector (terms plus packed term frequencies). Rows are
+written by the repository write paths through `sync_notes()`, in the same
+transaction as the note itself, so the persisted index never drifts from
+`notes`. At first use the in-memory `InvertedIndex` is loaded from those rows
+without re-tokenizing any bodies. Notes missing from the table (e.g. written
+by raw SQL) are indexed in memory then; loading never writes, since it runs
+on reader connections and possibly inside a caller's transaction. `catch_up()`
+persists those rows later, on the writer (see
+`repository.catch_up_search_index()`, run at app start).
+
+Chunked notes (empty `notes.body`) are indexed from their `note_chunks`.
+
+Posting lists are `array('I')` pairs of note ids and term frequencies, so
+memory stays close to 8 bytes per posting.
+"""
+from __future__ import annotations
+import math
+import re
+import sqlite3
+import threading
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from . import chunks
+
+TITLE_WEIGHT = 10
+K1 = 1.2
+B = 0.75
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+# A query term: a word, optionally quoted, optionally followed by `*` for prefix match.
+_query_re = re.compile(r'"?(\w+)"?(\*?)', re.UNICODE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t.lower() for t in _token_re.findall(text)]
+
+
+def _term_vector(title: str, body: str) -> Counter:
+    tf: Counter = Counter(tokenize(body))
+    for term in tokenize(title):
+        tf[term] += TITLE_WEIGHT
+    return tf
+
+
+def _note_vector(conn: sqlite3.Connection, note_id: int, title: str, body: str) -> Counter:
+    """`_term_vector()` of a note; chunked notes (empty `body`) use their chunks."""
+    if not body:
+        body = "".join(chunks.contents(conn, note_id))
+    return _term_vector(title, body)
+
+
+
+class InvertedIndex:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._docs: Dict[str, array] = {}
+        self._tfs: Dict[str, array] = {}
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._vocab: Optional[List[str]] = None  # sorted, for prefix lookups
+        # Terms of notes indexed at load time but not yet in search_index_docs.
+        self._unsaved: Dict[int, List[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._doc_len)
+
+    def add(self, note_id: int, tf: Dict[str, int]) -> None:
+        with self._lock:
+            for term, count in tf.items():
+                docs = self._docs.get(term)
+                if docs is None:
+                    docs = self._docs[term] = array("I")
+                    self._tfs[term] = array("I")
+                    self._vocab = None
+                docs.append(note_id)
+                self._tfs[term].append(count)
+            length = sum(tf.values())
+            self._doc_len[note_id] = length
+            self._total_len += length
+
+    def remove(self, note_id: int, terms: Iterable[str]) -> None:
+        with self._lock:
+            for term in terms:
+                docs = self._docs.get(term)
+                if docs is None:
+                    continue
+                try:
+                    idx = docs.index(note_id)
+                except ValueError:
+                    continue
+                del docs[idx]
+                del self._tfs[term][idx]
+                if not docs:
+                    del self._docs[term]
+                    del self._tfs[term]
+                    self._vocab = None
+            self._total_len -= self._doc_len.pop(note_id, 0)
+
+    def _expand(self, term: str, prefix: bool) -> List[str]:
+        if not prefix:
+            return [term] if term in self._docs else []
+        if self._vocab is None:
+            self._vocab = sorted(self._docs)
+        out = []
+        i = bisect_left(self._vocab, term)
+        while i < len(self._vocab) and self._vocab[i].startswith(term):
+            out.append(self._vocab[i])
+            i += 1
+        return out
+
+    def score(self, query: str) -> List[Tuple[int, float]]:
+        """`(note_id, score)` for notes matching every query term, best first.
+
+        Terms may be quoted and may end in `*` for a prefix match, so the
+        output of `repository.prefix_query()` works unchanged.
+        """
+        parsed = [(m.group(1).lower(), bool(m.group(2))) for m in _query_re.finditer(query)]
+        if not parsed:
+            return []
+        with self._lock:
+            n = len(self._doc_len)
+            if n == 0:
+                return []
+            avgdl = self._total_len / n
+            scores: Optional[Dict[int, float]] = None
+            for term, prefix in parsed:
+                # A prefix counts as one term, as in FTS5: frequencies of all
+                # expansions add up and df is the number of distinct notes.
+                counts: Dict[int, int] = {}
+                for t in self._expand(term, prefix):
+                    for doc, tf in zip(self._docs[t], self._tfs[t]):
+                        counts[doc] = counts.get(doc, 0) + tf
+                idf = math.log((n - len(counts) + 0.5) / (len(counts) + 0.5) + 1.0)
+                term_scores: Dict[int, float] = {}
+                for doc, tf in counts.items():
+                    dl = self._doc_len[doc]
+                    term_scores[doc] = idf * tf * (K1 + 1) / (tf + K1 * (1 - B + B * dl / avgdl))
+                if scores is None:
+                    scores = term_scores
+                else:
+                    # AND semantics, like a plain FTS5 query.
+                    scores = {d: scores[d] + s for d, s in term_scores.items() if d in scores}
+                if not scores:
+                    return []
+        return sorted(scores.items(), key=lambda kv: (-kv[1], kv[0]))
+
+
+_indexes: Dict[str, InvertedIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def enabled(conn: sqlite3.Connection) -> bool:
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='search_index_docs'")
+    return cur.fetchone() is not None
+
+
+def _key(conn: sqlite3.Connection) -> str:
+    for _seq, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or f"memory:{id(conn)}"
+    return f"memory:{id(conn)}"
+
+
+def _pack(tf: Dict[str, int]) -> Tuple[str, bytes]:
+    return " ".join(tf), array("I", tf.values()).tobytes()
+
+
+def _unpack(terms: str, tfs: bytes) -> Dict[str, int]:
+    counts = array("I")
+    counts.frombytes(tfs)
+    return dict(zip(terms.split(" ") if terms else [], counts))
+
+
+_MISSING_SQL = "SELECT id FROM notes WHERE id NOT IN (SELECT note_id FROM search_index_docs)"
+_STALE_SQL = "SELECT note_id FROM search_index_docs WHERE note_id NOT IN (SELECT id FROM notes)"
+
+
+def _load(conn: sqlite3.Connection) -> InvertedIndex:
+    """Build the in-memory index; read-only, so safe on any connection."""
+    index = InvertedIndex()
+    rows = conn.execute(
+        "SELECT d.note_id, d.terms, d.tfs FROM search_index_docs d JOIN notes n ON n.id = d.note_id"
+    )
+    for note_id, terms, tfs in rows:
+        index.add(note_id, _unpack(terms, tfs))
+    for note_id, title, body in conn.execute(f"SELECT id, title, body FROM notes WHERE id IN ({_MISSING_SQL})"):
+        tf = _note_vector(conn, note_id, title, body)
+        index.add(note_id, tf)
+        index._unsaved[note_id] = list(tf)
+    return index
+
+
+def get_index(conn: sqlite3.Connection) -> InvertedIndex:
+    """The in-memory index for the database behind `conn`, loaded on first use."""
+    key = _key(conn)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            index = _indexes[key] = _load(conn)
+        return index
+
+
+def invalidate(conn: sqlite3.Connection) -> None:
+    """Drop the in-memory index (e.g. after a rollback); it reloads on next use."""
+    with _indexes_lock:
+        _indexes.pop(_key(conn), None)
+
+
+def _sync(conn: sqlite3.Connection, index: InvertedIndex, note_ids: List[int]) -> None:
+    for note_id in note_ids:
+        old = conn.execute("SELECT terms FROM search_index_docs WHERE note_id = ?", (note_id,)).fetchone()
+        if old is not None:
+            index.remove(note_id, old[0].split(" ") if old[0] else [])
+        elif note_id in index._unsaved:
+            index.remove(note_id, index._unsaved.pop(note_id))
+        row = conn.execute("SELECT title, body FROM notes WHERE id = ?", (note_id,)).fetchone()
+        if row is None:
+            conn.execute("DELETE FROM search_index_docs WHERE note_id = ?", (note_id,))
+            continue
+        tf = _note_vector(conn, note_id, row[0], row[1])
+        index.add(note_id, tf)
+        terms, tfs = _pack(tf)
+        conn.execute(
+            "INSERT INTO search_index_docs (note_id, terms, tfs) VALUES (?, ?, ?) "
+            "ON CONFLICT(note_id) DO UPDATE SET terms = excluded.terms, tfs = excluded.tfs",
+            (note_id, terms, tfs),
+        )
+
+
+def rebuild(conn: sqlite3.Connection, batch_size: int = 1000) -> None:
+    """Persist term vectors for every note from scratch."""
+    conn.execute("DELETE FROM search_index_docs")
+    invalidate(conn)
+    index = InvertedIndex()
+    last = 0
+    while True:
+        ids = [r[0] for r in conn.execute("SELECT id FROM notes WHERE id > ? ORDER BY id LIMIT ?", (last, batch_size))]
+        if not ids:
+            return
+        _sync(conn, index, ids)
+        last = ids[-1]
+
+
+def sync_notes(conn: sqlite3.Connection, note_ids: Iterable[int]) -> None:
+    """Re-index `note_ids` (deleted ids are dropped); no-op when FTS5 exists."""
+    note_ids = list(note_ids)
+    if not note_ids or not enabled(conn):
+        return
+    key = _key(conn)
+    with _indexes_lock:
+        index = _indexes.get(key)
+    if index is None:
+        # Not loaded yet: only persist; the first search loads everything.
+        index = InvertedIndex()
+    _sync(conn, index, note_ids)
+
+
+def catch_up(conn: sqlite3.Connection) -> int:
+    """Persist vectors for unindexed notes and drop rows of deleted ones.
+
+    Writes: call on the writer inside a transaction. Returns the number of
+    notes re-synced; 0 when FTS5 exists or nothing drifted.
+    """
+    if not enabled(conn):
+        return 0
+    note_ids = [r[0] for r in conn.execute(_MISSING_SQL)] + [r[0] for r in conn.execute(_STALE_SQL)]
+    sync_notes(conn, note_ids)
+    return len(note_ids)
+
+
+def search(query: str, conn: sqlite3.Connection, limit: int = 50) -> List[Dict[str, Any]]:
+    """Same contract as `repository.search()`: dicts with id, title and body."""
+    ranked = get_index(conn).score(query)[:limit]
+    if not ranked:
+        return []
+    ids = [note_id for note_id, _score in ranked]
+    placeholders = ",".join("?" * len(ids))
+    rows = {r[0]: r for r in conn.execute(f"SELECT id, title, body, chunked FROM notes WHERE id IN ({placeholders})", ids)}
+    return [
+        {"id": i, "title": rows[i][1], "body": chunks.assemble(conn, i) if rows[i][3] else rows[i][2]}
+        for i in ids
+        if i in rows
+    ]
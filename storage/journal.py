@@ -0,0 +1,246 @@
+"""Write-behind saves: append-only journal plus one coalescing writer thread.
+
+Editors hand every snapshot to `WriteBehind.submit()`. It appends the
+snapshot to a local JSONL journal, which is cheap: one buffered write, plus
+an fsync only under the `safe` profile. Then it records the snapshot as the
+note's pending version. A single writer thread wakes every `interval`
+seconds and writes the latest version of every pending note in one
+`update_notes()` transaction, so a burst of edits across many notes costs
+one commit and one FTS update per note. Snapshots carry only the body, so
+a queued save never writes back a title renamed meanwhile. After the commit the journal is
+truncated, or gets a `committed` marker if newer snapshots arrived
+meanwhile.
+
+If the process dies before a commit, `get_write_behind()` replays the
+journal's uncommitted snapshots (`WriteBehind.replay()`) before accepting
+new ones. Unreadable lines are skipped and logged; a journal whose
+snapshots cannot be committed is renamed aside, so a bad journal never
+stops the app from starting. The journal is flushed to the OS on every append and fsynced when the
+database profile fsyncs commits, so saves are exactly as durable as direct
+SQLite writes.
+"""
+from __future__ import annotations
+import atexit
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from . import repository
+from .db import get_manager
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_SUFFIX = ".saves.jsonl"
+
+
+class SaveJournal:
+    """Append-only log of note snapshots not yet committed to the database."""
+
+    def __init__(self, path: str | Path, sync: bool = False) -> None:
+        self.path = Path(path)
+        self.sync = sync
+        self._fh = None
+        self._seq = max((seq for seq, _b in self.pending().values()), default=0)
+
+    def _file(self):
+        if self._fh is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fh = open(self.path, "a", encoding="utf-8")
+        return self._fh
+
+    def _write(self, record: Dict[str, object]) -> None:
+        fh = self._file()
+        fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+        fh.flush()
+        if self.sync:
+            os.fsync(fh.fileno())
+
+    def append(self, note_id: int, body: str) -> int:
+        """Record a snapshot and return its sequence number."""
+        self._seq += 1
+        self._write({"seq": self._seq, "note_id": note_id, "body": body})
+        return self._seq
+
+    def mark_committed(self, seq: int) -> None:
+        """Everything up to `seq` is in the database; truncate when that is all."""
+        if seq >= self._seq:
+            fh = self._file()
+            fh.seek(0)
+            fh.truncate()
+            if self.sync:
+                os.fsync(fh.fileno())
+        else:
+            self._write({"committed": seq})
+
+    def pending(self) -> Dict[int, Tuple[int, str]]:
+        """Latest uncommitted `(seq, body)` per note id."""
+        entries: Dict[int, Tuple[int, str]] = {}
+        if not self.path.exists():
+            return entries
+        with open(self.path, "r", encoding="utf-8", errors="replace") as fh:
+            for lineno, line in enumerate(fh, 1):
+                try:
+                    record = json.loads(line)
+                    if "committed" in record:
+                        committed = int(record["committed"])
+                        entries = {k: v for k, v in entries.items() if v[0] > committed}
+                    else:
+                        entry = (int(record["seq"]), str(record["body"]))
+                        entries[int(record["note_id"])] = entry
+                except (ValueError, KeyError, TypeError):
+                    # e.g. a torn final write from a crash
+                    logger.warning("Skipping unreadable line %d of %s", lineno, self.path)
+        return entries
+
+    def set_aside(self) -> Path:
+        """Rename the journal out of the way (kept for manual recovery)."""
+        self.close()
+        aside = self.path.with_name(self.path.name + ".bad")
+        n = 1
+        while aside.exists():
+            n += 1
+            aside = self.path.with_name(f"{self.path.name}.bad{n}")
+        os.replace(self.path, aside)
+        return aside
+
+    def close(self) -> None:
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
+
+
+class WriteBehind:
+    """Coalesce note saves from any thread into periodic batched commits."""
+
+    def __init__(
+        self,
+        db_path: str | Path | None = None,
+        journal_path: str | Path | None = None,
+        interval: float = 1.0,
+    ) -> None:
+        manager = get_manager(db_path)
+        self.db_path = manager.db_path
+        if journal_path is None:
+            journal_path = self.db_path.with_name(self.db_path.name + JOURNAL_SUFFIX)
+        self.journal = SaveJournal(journal_path, sync=manager.profile.synchronous in ("FULL", "EXTRA"))
+        self.interval = interval
+        self._cond = threading.Condition()
+        self._pending: Dict[int, Tuple[int, str]] = {}
+        self._busy = False
+        self._urgent = False
+        self._closed = False
+        self.recovered = 0
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    def replay(self) -> int:
+        """Commit the snapshots a crash left in the journal; call before `submit()`.
+
+        Never raises: if the snapshots cannot be committed, the journal is
+        renamed aside (see `SaveJournal.set_aside()`) and 0 is returned.
+        Returns the number of notes recovered.
+        """
+        pending = self.journal.pending()
+        if not pending:
+            return 0
+        try:
+            self._commit(pending)
+        except Exception:
+            aside = self.journal.set_aside()
+            logger.exception("Could not replay %s; moved it to %s", self.journal.path, aside)
+            return 0
+        logger.info("Recovered %d unsaved note(s) from %s", len(pending), self.journal.path)
+        self.recovered = len(pending)
+        return self.recovered
+
+    def submit(self, note_id: int, body: str) -> None:
+        """Queue `body` as the note's latest text; the title is left alone."""
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("WriteBehind is closed")
+            # Journal and queue under one lock so a commit never truncates a
+            # snapshot that is not yet queued.
+            seq = self.journal.append(note_id, body)
+            self._pending[note_id] = (seq, body)
+            self._cond.notify_all()
+
+    def _commit(self, batch: Dict[int, Tuple[int, str]]) -> None:
+        with get_manager(self.db_path).writer() as conn:
+            repository.update_notes(((nid, None, body) for nid, (_seq, body) in batch.items()), conn=conn)
+        with self._cond:
+            self.journal.mark_committed(max(seq for seq, _b in batch.values()))
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                # Give other notes' edits a chance to join this commit.
+                self._cond.wait_for(lambda: self._closed or self._urgent, timeout=self.interval)
+                batch, self._pending = self._pending, {}
+                self._busy = True
+                self._urgent = False
+            try:
+                self._commit(batch)
+            except Exception:
+                logger.exception("Write-behind commit failed; will retry")
+                with self._cond:
+                    for note_id, entry in batch.items():
+                        self._pending.setdefault(note_id, entry)
+                    self._cond.wait_for(lambda: self._closed, timeout=self.interval)
+                    if self._closed:
+                        self._busy = False
+                        self._cond.notify_all()
+                        return  # the journal still holds the snapshots
+            with self._cond:
+                self._busy = False
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Commit everything submitted so far; False if `timeout` expired."""
+        with self._cond:
+            self._urgent = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._pending and not self._busy, timeout=timeout)
+
+    def close(self) -> None:
+        self.flush(timeout=10.0)
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=10.0)
+        self.journal.close()
+
+
+_writers: Dict[Path, WriteBehind] = {}
+_writers_lock = threading.Lock()
+
+
+def get_write_behind(db_path: str | Path | None = None) -> WriteBehind:
+    """Return the process-wide write-behind queue for `db_path`.
+
+    Creating it replays any journal left behind by a crash.
+    """
+    key = get_manager(db_path).db_path.resolve()
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = _writers[key] = WriteBehind(key)
+            writer.replay()
+        return writer
+
+
+def close_all() -> None:
+    """Flush and stop every write-behind queue; registered with `atexit`."""
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+atexit.register(close_all)
@@ -1,7 +1,16 @@
-"""Simple migration runner for initial schema."""
+"""Versioned schema migrations recorded in `PRAGMA user_version`.
+
+Each entry in `MIGRATIONS` is a numbered step. `migrate_connection` reads the
+stored version once and returns immediately when the schema is current;
+otherwise every pending step runs in its own transaction and bumps
+`user_version` on commit. A flag bit in the same pragma marks a database
+whose index triggers a bulk load has dropped (see `suspend_index_triggers`).
+"""
 from __future__ import annotations
 import sqlite3
+import threading
 from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
 INITIAL_SQL = """
 PRAGMA foreign_keys = ON;
@@ -58,39 +67,478 @@ CREATE TABLE IF NOT EXISTS rewrite_modes (
   created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
--- FTS5 virtual table created conditionally in code if supported
+-- FTS5 virtual table created conditionally by a later migration step
 """
 
-def apply_initial_migration(conn: sqlite3.Connection) -> None:
-    cur = conn.cursor()
-    cur.executescript(INITIAL_SQL)
-    conn.commit()
-    # Try to create FTS5 virtual table if SQLite supports it. Fail gracefully if not.
+# Re-index only when an indexed column actually changed, so metadata-only
+# updates (notebook, generated fields) never touch the full-text tables.
+FTS_UPDATE_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS notes_ai_after_update AFTER UPDATE OF title, body ON notes
+WHEN old.title IS NOT new.title OR old.body IS NOT new.body BEGIN
+  INSERT INTO notes_fts(notes_fts, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
+  INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+FTS_TRIGGERS_SQL = """
+CREATE TRIGGER IF NOT EXISTS notes_ai_after_insert AFTER INSERT ON notes BEGIN
+  INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+""" + FTS_UPDATE_TRIGGER_SQL + """
+CREATE TRIGGER IF NOT EXISTS notes_ai_after_delete AFTER DELETE ON notes BEGIN
+  INSERT INTO notes_fts(notes_fts, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
+END;
+"""
+
+FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(title, body, content='notes', content_rowid='id');
+""" + FTS_TRIGGERS_SQL
+
+# Prefix indexes keep `"abc"*` queries fast for search-as-you-type.
+FTS_PREFIX_SQL = """
+DROP TRIGGER IF EXISTS notes_ai_after_insert;
+DROP TRIGGER IF EXISTS notes_ai_after_update;
+DROP TRIGGER IF EXISTS notes_ai_after_delete;
+DROP TABLE IF EXISTS notes_fts;
+CREATE VIRTUAL TABLE notes_fts USING fts5(title, body, content='notes', content_rowid='id', prefix='2 3 4');
+""" + FTS_TRIGGERS_SQL + """
+INSERT INTO notes_fts(notes_fts) VALUES('rebuild');
+"""
+
+TRIGRAM_UPDATE_TRIGGER_SQL = """
+CREATE TRIGGER IF NOT EXISTS notes_ai_trigram_after_update AFTER UPDATE OF title, body ON notes
+WHEN old.title IS NOT new.title OR old.body IS NOT new.body BEGIN
+  INSERT INTO notes_trigram(notes_trigram, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
+  INSERT INTO notes_trigram(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+"""
+
+TRIGRAM_TRIGGERS_SQL = """
+CREATE TRIGGER IF NOT EXISTS notes_ai_trigram_after_insert AFTER INSERT ON notes BEGIN
+  INSERT INTO notes_trigram(rowid, title, body) VALUES (new.id, new.title, new.body);
+END;
+""" + TRIGRAM_UPDATE_TRIGGER_SQL + """
+CREATE TRIGGER IF NOT EXISTS notes_ai_trigram_after_delete AFTER DELETE ON notes BEGIN
+  INSERT INTO notes_trigram(notes_trigram, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
+END;
+"""
+
+# Substring index: FTS5's trigram tokenizer (SQLite 3.34+).
+TRIGRAM_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS notes_trigram USING fts5(title, body, content='notes', content_rowid='id', tokenize='trigram');
+""" + TRIGRAM_TRIGGERS_SQL + """
+INSERT INTO notes_trigram(notes_trigram) VALUES('rebuild');
+"""
+
+# Fallback substring index, maintained by the repository write paths.
+TRIGRAM_SIDE_SQL = """
+CREATE TABLE IF NOT EXISTS note_trigrams (
+  trigram TEXT NOT NULL,
+  note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+  PRIMARY KEY (trigram, note_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_note_trigrams_note ON note_trigrams(note_id);
+"""
+
+# Pure-Python BM25 index for builds without FTS5 (see storage/inverted_index.py).
+SEARCH_INDEX_SQL = """
+CREATE TABLE IF NOT EXISTS search_index_docs (
+  note_id INTEGER PRIMARY KEY REFERENCES notes(id) ON DELETE CASCADE,
+  terms TEXT NOT NULL,
+  tfs BLOB NOT NULL
+);
+"""
+
+# One `recent` row per note: drop duplicates and orphans, then key on note_id.
+# Recency is ordered by a counter, since wall-clock times can tie or go
+# backwards; existing rows are numbered by their timestamps.
+RECENT_UPSERT_SQL = """
+DELETE FROM recent WHERE note_id IS NULL OR note_id NOT IN (SELECT id FROM notes);
+DELETE FROM recent WHERE id NOT IN (
+  SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY note_id ORDER BY last_opened_at DESC, id DESC) AS rn FROM recent)
+  WHERE rn = 1
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_recent_note ON recent(note_id);
+ALTER TABLE recent ADD COLUMN open_seq INTEGER NOT NULL DEFAULT 0;
+UPDATE recent SET open_seq = (
+  SELECT count(*) FROM recent r2 WHERE (r2.last_opened_at, r2.id) <= (recent.last_opened_at, recent.id)
+);
+CREATE INDEX IF NOT EXISTS idx_recent_open_seq ON recent(open_seq);
+"""
+
+# Integer epoch copies of the text timestamps for cheap range scans. The
+# repository writes them in the same statement as the text columns; the
+# guarded triggers only fill them in for other writers (raw SQL). They are
+# not `notes_ai_` triggers, so bulk imports never suspend them.
+EPOCH_COLUMNS_SQL = """
+ALTER TABLE notes ADD COLUMN created_ts INTEGER;
+ALTER TABLE notes ADD COLUMN updated_ts INTEGER;
+UPDATE notes SET
+  created_ts = CAST(strftime('%s', created_at) AS INTEGER),
+  updated_ts = CAST(strftime('%s', updated_at) AS INTEGER);
+CREATE TRIGGER IF NOT EXISTS notes_ts_after_insert AFTER INSERT ON notes
+WHEN new.created_ts IS NULL OR new.updated_ts IS NULL BEGIN
+  UPDATE notes SET
+    created_ts = CAST(strftime('%s', new.created_at) AS INTEGER),
+    updated_ts = CAST(strftime('%s', new.updated_at) AS INTEGER)
+  WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS notes_ts_after_update AFTER UPDATE OF updated_at ON notes
+WHEN new.updated_ts IS NOT CAST(strftime('%s', new.updated_at) AS INTEGER) BEGIN
+  UPDATE notes SET updated_ts = CAST(strftime('%s', new.updated_at) AS INTEGER) WHERE id = new.id;
+END;
+CREATE INDEX IF NOT EXISTS idx_notes_updated ON notes(updated_ts);
+CREATE INDEX IF NOT EXISTS idx_notes_notebook_updated ON notes(notebook_id, updated_ts);
+CREATE INDEX IF NOT EXISTS idx_note_tags_tag ON note_tags(tag_id, note_id);
+CREATE INDEX IF NOT EXISTS idx_notebooks_name ON notebooks(name);
+"""
+
+# Materialized tag cardinalities for the sidebar and autocomplete.
+TAG_COUNTS_SQL = """
+ALTER TABLE tags ADD COLUMN note_count INTEGER NOT NULL DEFAULT 0;
+UPDATE tags SET note_count = (SELECT count(*) FROM note_tags WHERE tag_id = tags.id);
+CREATE TRIGGER IF NOT EXISTS note_tags_count_after_insert AFTER INSERT ON note_tags BEGIN
+  UPDATE tags SET note_count = note_count + 1 WHERE id = new.tag_id;
+END;
+CREATE TRIGGER IF NOT EXISTS note_tags_count_after_delete AFTER DELETE ON note_tags BEGIN
+  UPDATE tags SET note_count = note_count - 1 WHERE id = old.tag_id;
+END;
+CREATE TRIGGER IF NOT EXISTS note_tags_count_after_update AFTER UPDATE OF tag_id ON note_tags
+WHEN old.tag_id IS NOT new.tag_id BEGIN
+  UPDATE tags SET note_count = note_count - 1 WHERE id = old.tag_id;
+  UPDATE tags SET note_count = note_count + 1 WHERE id = new.tag_id;
+END;
+CREATE INDEX IF NOT EXISTS idx_tags_note_count ON tags(note_count DESC, name);
+"""
+
+# Large bodies stored as ordered chunks (see storage/chunks.py).
+NOTE_CHUNKS_SQL = """
+ALTER TABLE notes ADD COLUMN chunked INTEGER NOT NULL DEFAULT 0;
+CREATE TABLE IF NOT EXISTS note_chunks (
+  id INTEGER PRIMARY KEY,
+  note_id INTEGER NOT NULL REFERENCES notes(id) ON DELETE CASCADE,
+  seq INTEGER NOT NULL,
+  content TEXT NOT NULL,
+  UNIQUE(note_id, seq)
+);
+CREATE INDEX IF NOT EXISTS idx_notes_chunked ON notes(id) WHERE chunked = 1;
+"""
+
+# Per-chunk content hashes and sizes; sizes give a chunk's offset in the body.
+CHUNK_HASH_SQL = """
+ALTER TABLE note_chunks ADD COLUMN hash BLOB;
+ALTER TABLE note_chunks ADD COLUMN size INTEGER NOT NULL DEFAULT 0;
+UPDATE note_chunks SET size = length(content);
+"""
+
+# One full-text row per chunk, so editing a chunk re-indexes only that chunk.
+CHUNK_FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS note_chunks_fts USING fts5(content, content='note_chunks', content_rowid='id', prefix='2 3 4');
+CREATE TRIGGER IF NOT EXISTS note_chunks_ai_after_insert AFTER INSERT ON note_chunks BEGIN
+  INSERT INTO note_chunks_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS note_chunks_ai_after_update AFTER UPDATE OF content ON note_chunks
+WHEN old.content IS NOT new.content BEGIN
+  INSERT INTO note_chunks_fts(note_chunks_fts, rowid, content) VALUES('delete', old.id, old.content);
+  INSERT INTO note_chunks_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS note_chunks_ai_after_delete AFTER DELETE ON note_chunks BEGIN
+  INSERT INTO note_chunks_fts(note_chunks_fts, rowid, content) VALUES('delete', old.id, old.content);
+END;
+INSERT INTO note_chunks_fts(note_chunks_fts) VALUES('rebuild');
+"""
+
+# External-content full-text tables kept in sync with `notes` by triggers,
+# with the names and canonical SQL of those triggers.
+INDEX_TRIGGERS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    "notes_fts": (("notes_ai_after_insert", "notes_ai_after_update", "notes_ai_after_delete"), FTS_TRIGGERS_SQL),
+    "notes_trigram": (
+        ("notes_ai_trigram_after_insert", "notes_ai_trigram_after_update", "notes_ai_trigram_after_delete"),
+        TRIGRAM_TRIGGERS_SQL,
+    ),
+}
+FTS_INDEX_TABLES = tuple(INDEX_TRIGGERS)
+
+_fts5_supported: Optional[bool] = None
+_trigram_supported: Optional[bool] = None
+
+
+def _iter_statements(script: str) -> Iterator[str]:
+    """Split a SQL script into complete statements (trigger bodies included)."""
+    buf = ""
+    for part in script.split(";"):
+        buf += part + ";"
+        if sqlite3.complete_statement(buf):
+            stmt = "\n".join(
+                line for line in buf.splitlines() if not line.strip().startswith("--")
+            ).strip()
+            if stmt != ";":
+                yield stmt
+            buf = ""
+
+
+def _run_script(conn: sqlite3.Connection, script: str) -> None:
+    # executescript() would commit the surrounding transaction, so run
+    # statement by statement instead.
+    for stmt in _iter_statements(script):
+        conn.execute(stmt)
+
+
+def fts5_available(conn: sqlite3.Connection) -> bool:
+    """Return True if the linked SQLite library provides FTS5."""
+    global _fts5_supported
+    if _fts5_supported is None:
+        try:
+            conn.execute("CREATE VIRTUAL TABLE temp._fts5_probe USING fts5(x)")
+            conn.execute("DROP TABLE temp._fts5_probe")
+            _fts5_supported = True
+        except sqlite3.OperationalError:
+            # Older SQLite builds may not support FTS5; continue without it.
+            _fts5_supported = False
+    return _fts5_supported
+
+
+def trigram_tokenizer_available(conn: sqlite3.Connection) -> bool:
+    """Return True if FTS5 with the `trigram` tokenizer is available."""
+    global _trigram_supported
+    if _trigram_supported is None:
+        if not fts5_available(conn):
+            _trigram_supported = False
+        else:
+            try:
+                conn.execute("CREATE VIRTUAL TABLE temp._trigram_probe USING fts5(x, tokenize='trigram')")
+                conn.execute("DROP TABLE temp._trigram_probe")
+                _trigram_supported = True
+            except sqlite3.OperationalError:
+                _trigram_supported = False
+    return _trigram_supported
+
+
+def _m001_initial_schema(conn: sqlite3.Connection) -> None:
+    _run_script(conn, INITIAL_SQL)
+
+
+def _m002_notes_fts(conn: sqlite3.Connection) -> None:
+    if fts5_available(conn):
+        _run_script(conn, FTS_SQL)
+
+
+def _m003_fts_prefix_indexes(conn: sqlite3.Connection) -> None:
+    if fts5_available(conn):
+        _run_script(conn, FTS_PREFIX_SQL)
+
+
+def _m004_trigram_index(conn: sqlite3.Connection) -> None:
+    if trigram_tokenizer_available(conn):
+        _run_script(conn, TRIGRAM_SQL)
+    else:
+        from .trigram import rebuild_side_table
+
+        _run_script(conn, TRIGRAM_SIDE_SQL)
+        rebuild_side_table(conn)
+
+
+def _m005_search_index_fallback(conn: sqlite3.Connection) -> None:
+    if not fts5_available(conn):
+        from .inverted_index import rebuild
+
+        _run_script(conn, SEARCH_INDEX_SQL)
+        rebuild(conn)
+
+
+def _m006_change_aware_fts_triggers(conn: sqlite3.Connection) -> None:
+    for table, trigger, sql in (
+        ("notes_fts", "notes_ai_after_update", FTS_UPDATE_TRIGGER_SQL),
+        ("notes_trigram", "notes_ai_trigram_after_update", TRIGRAM_UPDATE_TRIGGER_SQL),
+    ):
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone():
+            conn.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+            _run_script(conn, sql)
+
+
+def _m007_recent_upsert(conn: sqlite3.Connection) -> None:
+    _run_script(conn, RECENT_UPSERT_SQL)
+
+
+def _m008_indexes_and_epoch_columns(conn: sqlite3.Connection) -> None:
+    _run_script(conn, EPOCH_COLUMNS_SQL)
+
+
+def _m009_tag_counts(conn: sqlite3.Connection) -> None:
+    _run_script(conn, TAG_COUNTS_SQL)
+
+
+def _m010_note_chunks(conn: sqlite3.Connection) -> None:
+    _run_script(conn, NOTE_CHUNKS_SQL)
+
+
+def _m011_chunk_hashes_and_fts(conn: sqlite3.Connection) -> None:
+    from .chunks import chunk_hash
+
+    _run_script(conn, CHUNK_HASH_SQL)
+    rows = conn.execute("SELECT id, content FROM note_chunks").fetchall()
+    conn.executemany("UPDATE note_chunks SET hash = ? WHERE id = ?", ((chunk_hash(r[1]), r[0]) for r in rows))
+    if fts5_available(conn):
+        _run_script(conn, CHUNK_FTS_SQL)
+
+
+Migration = Tuple[int, str, Callable[[sqlite3.Connection], None]]
+
+MIGRATIONS: List[Migration] = [
+    (1, "initial schema", _m001_initial_schema),
+    (2, "notes full-text index", _m002_notes_fts),
+    (3, "prefix indexes on notes_fts", _m003_fts_prefix_indexes),
+    (4, "trigram substring index", _m004_trigram_index),
+    (5, "inverted index fallback", _m005_search_index_fallback),
+    (6, "change-aware full-text triggers", _m006_change_aware_fts_triggers),
+    (7, "de-duplicated recent notes", _m007_recent_upsert),
+    (8, "secondary indexes and epoch timestamps", _m008_indexes_and_epoch_columns),
+    (9, "materialized tag counts", _m009_tag_counts),
+    (10, "chunked note bodies", _m010_note_chunks),
+    (11, "chunk hashes and per-chunk full-text index", _m011_chunk_hashes_and_fts),
+]
+
+
+def schema_version() -> int:
+    """Version the code expects the database to be at."""
+    return MIGRATIONS[-1][0]
+
+
+# Set in `user_version` while the index triggers are dropped for a bulk load.
+TRIGGERS_SUSPENDED = 1 << 24
+
+
+def _user_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _set_user_version(conn: sqlite3.Connection, value: int) -> None:
+    conn.execute(f"PRAGMA user_version = {int(value)}")
+
+
+def current_version(conn: sqlite3.Connection) -> int:
+    return _user_version(conn) & ~TRIGGERS_SUSPENDED
+
+
+def migrate_connection(conn: sqlite3.Connection) -> int:
+    """Bring the database behind `conn` up to date and return its version.
+
+    The fast path is a single pragma read. Pending steps each run inside
+    `BEGIN IMMEDIATE` so concurrent openers serialize and re-check the
+    version before applying anything; they need a connection with no open
+    transaction, since this function never commits one it did not begin.
+    """
+    target = schema_version()
+    raw = _user_version(conn)
+    version = raw & ~TRIGGERS_SUSPENDED
+    if version >= target:
+        if raw & TRIGGERS_SUSPENDED:
+            _recover_index_triggers(conn)
+        return version
+    if conn.in_transaction:
+        raise RuntimeError("Cannot migrate the database inside an open transaction")
+    for number, _name, step in MIGRATIONS:
+        if number <= version:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            raw = _user_version(conn)
+            version = raw & ~TRIGGERS_SUSPENDED
+            if number > version:
+                step(conn)
+                _set_user_version(conn, number | (raw & TRIGGERS_SUSPENDED))
+                version = number
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+    if _user_version(conn) & TRIGGERS_SUSPENDED:
+        _recover_index_triggers(conn)
+    return version
+
+
+# Databases whose index triggers a bulk load in this process has suspended;
+# `migrate_connection` must not restore them behind the loader's back.
+_suspended: Set[str] = set()
+_suspended_lock = threading.Lock()
+
+
+def _db_key(conn: sqlite3.Connection) -> str:
+    for _seq, name, path in conn.execute("PRAGMA database_list"):
+        if name == "main":
+            return path or f"memory:{id(conn)}"
+    return f"memory:{id(conn)}"
+
+
+def _tables_missing_triggers(conn: sqlite3.Connection) -> List[str]:
+    present = {
+        r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+    }
+    return [
+        table for table, (triggers, _sql) in INDEX_TRIGGERS.items()
+        if table in present and not set(triggers) <= present
+    ]
+
+
+def suspend_index_triggers(conn: sqlite3.Connection) -> None:
+    """Drop the full-text index triggers on `notes` for a bulk load.
+
+    Runs in the caller's transaction and sets `TRIGGERS_SUSPENDED`. Until
+    `restore_index_triggers()`, `migrate_connection` in this process leaves
+    them dropped; in any other process (including this one after a crash)
+    the flag makes it recreate them.
+    """
+    with _suspended_lock:
+        _suspended.add(_db_key(conn))
+    for triggers, _sql in INDEX_TRIGGERS.values():
+        for name in triggers:
+            conn.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+    _set_user_version(conn, _user_version(conn) | TRIGGERS_SUSPENDED)
+
+
+def restore_index_triggers(conn: sqlite3.Connection) -> List[str]:
+    """Recreate missing index triggers and rebuild those indexes once.
+
+    Runs in the caller's transaction, clears `TRIGGERS_SUSPENDED` and
+    returns the rebuilt tables.
+    """
+    with _suspended_lock:
+        _suspended.discard(_db_key(conn))
+    tables = _tables_missing_triggers(conn)
+    for table in tables:
+        _run_script(conn, INDEX_TRIGGERS[table][1])
+        conn.execute(f"INSERT INTO {table}({table}) VALUES('rebuild')")
+    _set_user_version(conn, _user_version(conn) & ~TRIGGERS_SUSPENDED)
+    return tables
+
+
+def _recover_index_triggers(conn: sqlite3.Connection) -> None:
+    """Put back index triggers a crashed bulk load left dropped."""
+    with _suspended_lock:
+        if _db_key(conn) in _suspended:
+            return
+    if conn.in_transaction:
+        # Join the caller's transaction; its commit keeps the repair.
+        restore_index_triggers(conn)
+        return
+    conn.execute("BEGIN IMMEDIATE")
     try:
-        cur.execute("CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(title, body, content='notes', content_rowid='id')")
-        # Create triggers to keep notes_fts in sync
-        cur.executescript("""
-        CREATE TRIGGER IF NOT EXISTS notes_ai_after_insert AFTER INSERT ON notes BEGIN
-          INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
-        END;
-        CREATE TRIGGER IF NOT EXISTS notes_ai_after_update AFTER UPDATE ON notes BEGIN
-          INSERT INTO notes_fts(notes_fts, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
-          INSERT INTO notes_fts(rowid, title, body) VALUES (new.id, new.title, new.body);
-        END;
-        CREATE TRIGGER IF NOT EXISTS notes_ai_after_delete AFTER DELETE ON notes BEGIN
-          INSERT INTO notes_fts(notes_fts, rowid, title, body) VALUES('delete', old.id, old.title, old.body);
-        END;
-        """)
+        restore_index_triggers(conn)
         conn.commit()
     except Exception:
-        # Older SQLite builds may not support FTS5; continue without it.
-        pass
+        conn.rollback()
+        raise
+
+
+def apply_initial_migration(conn: sqlite3.Connection) -> None:
+    """Apply all pending migrations to an already-open connection."""
+    migrate_connection(conn)
 
 def migrate(db_path: str | Path) -> None:
     db_path = Path(db_path)
     db_path.parent.mkdir(parents=True, exist_ok=True)
     conn = sqlite3.connect(str(db_path))
     try:
-        apply_initial_migration(conn)
+        migrate_connection(conn)
     finally:
         conn.close()
@@ -1,174 +1,966 @@
 """Minimal repository implementation for notes and notebooks."""
 from __future__ import annotations
+import re
 import sqlite3
-from typing import List, Optional, Dict, Any
-from .db import get_connection
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from functools import lru_cache
+from dataclasses import dataclass, field
+from typing import List, Optional, Dict, Any, Iterator, Iterable, Sequence, Tuple, Union
+from .db import get_manager
 from .utils import normalize_tag, normalize_tags
+from . import chunks, inverted_index, tag_query, trigram
+
+# Connections with a `transaction()` open on the current thread, innermost last.
+_tx_local = threading.local()
+
+
+def _tx_stack() -> List[sqlite3.Connection]:
+    stack = getattr(_tx_local, "stack", None)
+    if stack is None:
+        stack = _tx_local.stack = []
+    return stack
+
+
+def _in_transaction(conn: sqlite3.Connection) -> bool:
+    return any(c is conn for c in _tx_stack())
+
+
+def _commit(conn: sqlite3.Connection) -> None:
+    """Commit unless `conn` belongs to an enclosing `transaction()`."""
+    if not _in_transaction(conn):
+        conn.commit()
+
+
+@contextmanager
+def _write(conn: Optional[sqlite3.Connection]) -> Iterator[sqlite3.Connection]:
+    """Use `conn` if given, else the shared writer connection."""
+    if conn is not None:
+        yield conn
+        return
+    with get_manager().writer() as wconn:
+        yield wconn
+
+
+@contextmanager
+def _read(conn: Optional[sqlite3.Connection]) -> Iterator[sqlite3.Connection]:
+    """Use `conn` if given, else the calling thread's reader connection.
+
+    Inside `transaction()` reads go to the transaction's connection so they
+    see its uncommitted writes.
+    """
+    if conn is not None:
+        yield conn
+        return
+    stack = _tx_stack()
+    if stack:
+        yield stack[-1]
+        return
+    with get_manager().reader() as rconn:
+        yield rconn
+
+
+@contextmanager
+def transaction(conn: Optional[sqlite3.Connection] = None) -> Iterator[sqlite3.Connection]:
+    """Group repository calls into one atomic transaction with a single commit.
+
+    Repository functions called inside the block (with or without passing
+    the yielded connection) skip their own commits. Nested blocks join the
+    outer transaction. An exception rolls everything back.
+    """
+    with _write(conn) as conn:
+        if _in_transaction(conn):
+            yield conn
+            return
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute("BEGIN IMMEDIATE")
+        stack = _tx_stack()
+        stack.append(conn)
+        try:
+            yield conn
+        except BaseException:
+            stack.pop()
+            conn.rollback()
+            # The in-memory index already saw the rolled-back writes.
+            inverted_index.invalidate(conn)
+            raise
+        stack.pop()
+        conn.commit()
+
+
+# Epoch seconds for the `created_ts`/`updated_ts` columns; 'now' is fixed per
+# statement, so it always agrees with CURRENT_TIMESTAMP beside it.
+_NOW_TS = "CAST(strftime('%s', 'now') AS INTEGER)"
+_TOUCH = f"updated_at = CURRENT_TIMESTAMP, updated_ts = {_NOW_TS}"
+_INSERT_NOTE = f"INSERT INTO notes (notebook_id, title, body, created_ts, updated_ts) VALUES (?, ?, ?, {_NOW_TS}, {_NOW_TS})"
+
+
+def _sync_indexes(conn: sqlite3.Connection, note_ids: Iterable[int]) -> None:
+    """Update the search indexes the write paths maintain (not the triggers)."""
+    note_ids = list(note_ids)
+    trigram.sync_notes(conn, note_ids)
+    inverted_index.sync_notes(conn, note_ids)
+
+
+def catch_up_search_index(conn: Optional[sqlite3.Connection] = None) -> int:
+    """Persist search-index rows for notes written behind the repository's back.
+
+    Only the FTS5-less inverted index needs this; searching indexes such
+    notes in memory but never writes. Returns the number of notes synced.
+    """
+    with transaction(conn) as conn:
+        return inverted_index.catch_up(conn)
+
 
 def create_notebook(name: str, conn: Optional[sqlite3.Connection] = None) -> int:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO notebooks (name) VALUES (?)", (name,))
-    conn.commit()
-    nid = cur.lastrowid
-    if own:
-        conn.close()
-    return nid
+    with _write(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("INSERT INTO notebooks (name) VALUES (?)", (name,))
+        _commit(conn)
+        return cur.lastrowid
 
 def list_notebooks(conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, name, created_at, updated_at FROM notebooks ORDER BY name")
-    rows = [dict(r) for r in cur.fetchall()]
-    if own:
-        conn.close()
-    return rows
+    with _read(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id, name, created_at, updated_at FROM notebooks ORDER BY name")
+        return [dict(r) for r in cur.fetchall()]
 
 def create_note(title: str, body: str, notebook_id: Optional[int] = None, conn: Optional[sqlite3.Connection] = None) -> int:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO notes (notebook_id, title, body) VALUES (?, ?, ?)",
-        (notebook_id, title, body),
-    )
-    conn.commit()
-    nid = cur.lastrowid
-    if own:
-        conn.close()
-    return nid
-
-def get_note(note_id: int, conn: Optional[sqlite3.Connection] = None) -> Optional[Dict[str, Any]]:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
-    row = cur.fetchone()
-    if own:
-        conn.close()
-    return dict(row) if row else None
+    with _write(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            _INSERT_NOTE,
+            (notebook_id, title, body),
+        )
+        nid = cur.lastrowid
+        _sync_indexes(conn, [nid])
+        _commit(conn)
+        return nid
+
+def get_note(note_id: int, conn: Optional[sqlite3.Connection] = None, assemble: bool = True) -> Optional[Dict[str, Any]]:
+    """The note's row as a dict; chunked bodies are joined unless `assemble` is False."""
+    with _read(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT * FROM notes WHERE id = ?", (note_id,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        note = dict(row)
+        if assemble and note.get("chunked"):
+            note["body"] = chunks.assemble(conn, note_id)
+        return note
+
+
+def get_note_chunks(note_id: int, conn: Optional[sqlite3.Connection] = None) -> List[Tuple[int, str]]:
+    """`(seq, content)` pieces of a chunked note's body, in order."""
+    with _read(conn) as conn:
+        return chunks.load_chunks(conn, note_id)
+
+
+def convert_to_chunked(note_id: int, pieces: Sequence[Tuple[int, str]], conn: Optional[sqlite3.Connection] = None) -> None:
+    """Move a note's body into `pieces` (`(seq, content)`, joined = the body)."""
+    with transaction(conn) as conn:
+        chunks.write_chunks(conn, note_id, pieces)
+        _sync_indexes(conn, [note_id])
+
+
+def update_note_chunks(
+    note_id: int,
+    upserts: Dict[int, str],
+    deletes: Iterable[int] = (),
+    conn: Optional[sqlite3.Connection] = None,
+) -> bool:
+    """Rewrite only the given chunks of a chunked note and bump its timestamp."""
+    with transaction(conn) as conn:
+        chunks.apply_changes(conn, note_id, upserts, deletes)
+        cur = conn.execute(f"UPDATE notes SET {_TOUCH} WHERE id = ?", (note_id,))
+        _sync_indexes(conn, [note_id])
+        return cur.rowcount > 0
 
 def delete_note(note_id: int, conn: Optional[sqlite3.Connection] = None) -> bool:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM notes WHERE id = ?", (note_id,))
-    conn.commit()
-    changed = cur.rowcount > 0
-    if own:
-        conn.close()
-    return changed
+    with _write(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("DELETE FROM notes WHERE id = ?", (note_id,))
+        # Explicit so the side table stays clean even with foreign_keys off.
+        trigram.remove_notes(conn, [note_id])
+        inverted_index.sync_notes(conn, [note_id])
+        _commit(conn)
+        return cur.rowcount > 0
+
+def _set_columns(conn: sqlite3.Connection, note_id: int, values: Dict[str, Any]) -> bool:
+    """UPDATE only `values`' columns so untouched ones never fire their triggers."""
+    assignments = ", ".join([*(f"{col} = ?" for col in values), _TOUCH])
+    cur = conn.execute(
+        f"UPDATE notes SET {assignments} WHERE id = ?",
+        (*values.values(), note_id),
+    )
+    return cur.rowcount > 0
+
 
 def rename_note(note_id: int, new_title: str, conn: Optional[sqlite3.Connection] = None) -> bool:
-    return update_note(note_id, new_title, get_note(note_id)["body"], conn=conn)
-
-def touch_recent(note_id: int, conn: Optional[sqlite3.Connection] = None) -> None:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("INSERT INTO recent (note_id, last_opened_at) VALUES (?, CURRENT_TIMESTAMP)", (note_id,))
-    conn.commit()
-    if own:
-        conn.close()
+    with _write(conn) as conn:
+        changed = _set_columns(conn, note_id, {"title": new_title})
+        _sync_indexes(conn, [note_id])
+        _commit(conn)
+        return changed
+
+
+def set_notebook(note_id: int, notebook_id: Optional[int], conn: Optional[sqlite3.Connection] = None) -> bool:
+    """Move a note to `notebook_id` (None: no notebook) without touching its text."""
+    with _write(conn) as conn:
+        changed = _set_columns(conn, note_id, {"notebook_id": notebook_id})
+        _commit(conn)
+        return changed
+
+
+_UNSET: Any = object()
+
+
+def set_generated_metadata(
+    note_id: int,
+    generated_title: Optional[str] = _UNSET,
+    generated_summary: Optional[str] = _UNSET,
+    ai_generated_title: Optional[bool] = _UNSET,
+    conn: Optional[sqlite3.Connection] = None,
+) -> bool:
+    """Store AI-generated fields; only the arguments passed are written.
+
+    Pass None to clear a field. The full-text indexes are left alone.
+    """
+    values: Dict[str, Any] = {}
+    if generated_title is not _UNSET:
+        values["generated_title"] = generated_title
+    if generated_summary is not _UNSET:
+        values["generated_summary"] = generated_summary
+    if ai_generated_title is not _UNSET:
+        values["ai_generated_title"] = None if ai_generated_title is None else int(bool(ai_generated_title))
+    if not values:
+        return False
+    with _write(conn) as conn:
+        changed = _set_columns(conn, note_id, values)
+        _commit(conn)
+        return changed
+
+# Rows kept in `recent`; older entries are pruned on every open.
+RECENT_CAP = 50
+
+
+def touch_recent(note_id: int, cap: int = RECENT_CAP, conn: Optional[sqlite3.Connection] = None) -> None:
+    """Mark a note as just opened, keeping only the `cap` most recent notes."""
+    with _write(conn) as conn:
+        cur = conn.cursor()
+        # `open_seq` orders the list; the timestamp is only informational,
+        # so opens within the same millisecond (or a clock step back) are fine.
+        cur.execute(
+            "INSERT INTO recent (note_id, last_opened_at, open_seq) "
+            "VALUES (?, strftime('%Y-%m-%d %H:%M:%f', 'now'), (SELECT coalesce(max(open_seq), 0) + 1 FROM recent)) "
+            "ON CONFLICT(note_id) DO UPDATE SET last_opened_at = excluded.last_opened_at, open_seq = excluded.open_seq",
+            (note_id,),
+        )
+        cur.execute(
+            "DELETE FROM recent WHERE id IN (SELECT id FROM recent ORDER BY open_seq DESC LIMIT -1 OFFSET ?)",
+            (cap,),
+        )
+        _commit(conn)
 
 def list_recent(limit: int = 20, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT note_id, last_opened_at FROM recent ORDER BY last_opened_at DESC LIMIT ?", (limit,))
-    rows = [dict(r) for r in cur.fetchall()]
-    if own:
-        conn.close()
-    return rows
+    """Recently opened notes as `id`, `title`, `last_opened_at`, newest first."""
+    with _read(conn) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "SELECT r.note_id AS id, n.title AS title, r.last_opened_at AS last_opened_at "
+            "FROM recent r JOIN notes n ON n.id = r.note_id ORDER BY r.open_seq DESC LIMIT ?",
+            (limit,),
+        )
+        return [dict(r) for r in cur.fetchall()]
 
 def create_tag(name: str, conn: Optional[sqlite3.Connection] = None) -> int:
     name = normalize_tag(name)
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO tags (name) VALUES (?)", (name,))
-        conn.commit()
-        tid = cur.lastrowid
-    except sqlite3.IntegrityError:
-        cur.execute("SELECT id FROM tags WHERE name = ?", (name,))
-        tid = cur.fetchone()[0]
-    if own:
-        conn.close()
-    return tid
+    with _write(conn) as conn:
+        cur = conn.cursor()
+        try:
+            cur.execute("INSERT INTO tags (name) VALUES (?)", (name,))
+            _commit(conn)
+            return cur.lastrowid
+        except sqlite3.IntegrityError:
+            cur.execute("SELECT id FROM tags WHERE name = ?", (name,))
+            return cur.fetchone()[0]
 
 def add_tag_to_note(note_id: int, tag_name: str, conn: Optional[sqlite3.Connection] = None) -> None:
-    tid = create_tag(tag_name, conn=conn)
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    try:
-        cur.execute("INSERT INTO note_tags (note_id, tag_id) VALUES (?, ?)", (note_id, tid))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass
-    if own:
-        conn.close()
+    with transaction(conn) as conn:
+        tid = create_tag(tag_name, conn=conn)
+        cur = conn.cursor()
+        cur.execute("INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)", (note_id, tid))
 
 def get_tags_for_note(note_id: int, conn: Optional[sqlite3.Connection] = None) -> List[str]:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT t.name FROM tags t JOIN note_tags nt ON t.id = nt.tag_id WHERE nt.note_id = ? ORDER BY t.name", (note_id,))
-    rows = [r[0] for r in cur.fetchall()]
-    if own:
-        conn.close()
-    return rows
+    with _read(conn) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT t.name FROM tags t JOIN note_tags nt ON t.id = nt.tag_id WHERE nt.note_id = ? ORDER BY t.name", (note_id,))
+        return [r[0] for r in cur.fetchall()]
 
 def update_note(note_id: int, title: str, body: str, conn: Optional[sqlite3.Connection] = None) -> bool:
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE notes SET title = ?, body = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
-        (title, body, note_id),
+    with _write(conn) as conn:
+        if len(body) >= chunks.LARGE_NOTE_CHARS or chunks.is_chunked(conn, note_id):
+            return update_notes([(note_id, title, body)], conn=conn) > 0
+        cur = conn.cursor()
+        cur.execute(
+            f"UPDATE notes SET title = ?, body = ?, {_TOUCH} WHERE id = ?",
+            (title, body, note_id),
+        )
+        changed = cur.rowcount > 0
+        _sync_indexes(conn, [note_id])
+        _commit(conn)
+        return changed
+
+NoteInput = Union[Tuple[str, str], Tuple[str, str, Optional[int]], Dict[str, Any]]
+
+
+def _note_params(note: NoteInput) -> Tuple[Optional[int], str, str]:
+    if isinstance(note, dict):
+        return note.get("notebook_id"), note["title"], note["body"]
+    if len(note) == 2:
+        return None, note[0], note[1]
+    return note[2], note[0], note[1]
+
+
+def create_notes(notes: Iterable[NoteInput], conn: Optional[sqlite3.Connection] = None) -> List[int]:
+    """Insert many notes in one transaction and return their ids in order.
+
+    Each item is `(title, body)`, `(title, body, notebook_id)` or a dict with
+    those keys.
+    """
+    rows = [_note_params(n) for n in notes]
+    if not rows:
+        return []
+    with transaction(conn) as conn:
+        cur = conn.cursor()
+        cur.executemany(_INSERT_NOTE, rows)
+        # AUTOINCREMENT hands out consecutive ids while we hold the write lock.
+        cur.execute("SELECT seq FROM sqlite_sequence WHERE name = 'notes'")
+        last = cur.fetchone()[0]
+        ids = list(range(last - len(rows) + 1, last + 1))
+        _sync_indexes(conn, ids)
+    return ids
+
+
+def add_tags(note_ids: Iterable[int], tags: Iterable[str], conn: Optional[sqlite3.Connection] = None) -> List[int]:
+    """Attach every tag in `tags` to every note in `note_ids`.
+
+    Missing tags are created. Returns the tag ids in normalized-name order.
+    """
+    names = normalize_tags(list(tags))
+    note_ids = list(note_ids)
+    if not names:
+        return []
+    with transaction(conn) as conn:
+        cur = conn.cursor()
+        cur.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(n,) for n in names])
+        placeholders = ",".join("?" * len(names))
+        cur.execute(f"SELECT name, id FROM tags WHERE name IN ({placeholders})", names)
+        by_name = {r[0]: r[1] for r in cur.fetchall()}
+        tag_ids = [by_name[n] for n in names]
+        cur.executemany(
+            "INSERT OR IGNORE INTO note_tags (note_id, tag_id) VALUES (?, ?)",
+            ((nid, tid) for nid in note_ids for tid in tag_ids),
+        )
+    return tag_ids
+
+
+def list_tags(prefix: Optional[str] = None, limit: Optional[int] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """Tags in use as `id`, `name`, `note_count`, most used first.
+
+    With `prefix`, only tags whose normalized name starts with it (for
+    autocomplete). Counts come from the trigger-maintained column, so no
+    `note_tags` aggregation runs.
+    """
+    where = "WHERE note_count > 0"
+    params: List[Any] = []
+    if prefix:
+        prefix = normalize_tag(prefix)
+        # Range on the unique name index instead of LIKE, which can't use it.
+        where += " AND name >= ? AND name < ?"
+        params.extend([prefix, prefix + "\U0010ffff"])
+    sql = f"SELECT id, name, note_count FROM tags {where} ORDER BY note_count DESC, name"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with _read(conn) as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def find_notes_by_tags(expression: str, limit: Optional[int] = None, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """Notes matching a boolean tag expression such as `a AND b NOT c`.
+
+    Returns `id`, `title`, `updated_at`, most recently updated first. See
+    `storage.tag_query` for the syntax; malformed expressions raise
+    ValueError.
+    """
+    match_sql, params = tag_query.compile_expression(expression)
+    sql = (
+        f"SELECT id, title, updated_at FROM notes WHERE id IN ({match_sql}) "
+        f"ORDER BY updated_ts DESC, id DESC"
     )
-    conn.commit()
-    changed = cur.rowcount > 0
-    if own:
-        conn.close()
-    return changed
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = [*params, limit]
+    with _read(conn) as conn:
+        return [dict(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def update_notes(rows: Iterable[Sequence[Any]], conn: Optional[sqlite3.Connection] = None) -> int:
+    """Apply many `(note_id, title, body)` updates in one transaction.
+
+    A `title` of None keeps the note's current title. Notes that are
+    chunked, or whose body reaches `chunks.LARGE_NOTE_CHARS`, get only their
+    changed chunks rewritten. Returns the number of notes that were updated.
+    """
+    params = [(title, body, note_id) for note_id, title, body in rows]
+    if not params:
+        return 0
+    with transaction(conn) as conn:
+        cur = conn.cursor()
+        chunked = chunks.chunked_ids(conn, (p[2] for p in params))
+        chunked.update(p[2] for p in params if len(p[1]) >= chunks.LARGE_NOTE_CHARS)
+        cur.executemany(
+            f"UPDATE notes SET title = coalesce(?, title), body = ?, {_TOUCH} WHERE id = ?",
+            [p for p in params if p[2] not in chunked],
+        )
+        changed = max(cur.rowcount, 0)
+        for title, body, note_id in params:
+            if note_id in chunked and _set_columns(conn, note_id, {} if title is None else {"title": title}):
+                changed += 1
+                chunks.store_body(conn, note_id, body)
+        _sync_indexes(conn, (p[2] for p in params))
+        return changed
+
+
+def get_tags_for_notes(note_ids: Iterable[int], conn: Optional[sqlite3.Connection] = None) -> Dict[int, List[str]]:
+    """Tags for several notes in one query, keyed by note id."""
+    note_ids = list(note_ids)
+    out: Dict[int, List[str]] = {nid: [] for nid in note_ids}
+    if not note_ids:
+        return out
+    with _read(conn) as conn:
+        placeholders = ",".join("?" * len(note_ids))
+        cur = conn.execute(
+            f"SELECT nt.note_id, t.name FROM note_tags nt JOIN tags t ON t.id = nt.tag_id WHERE nt.note_id IN ({placeholders}) ORDER BY t.name",
+            note_ids,
+        )
+        for note_id, name in cur.fetchall():
+            out[note_id].append(name)
+    return out
+
+
+_since_token_re = re.compile(r"^(\d+):(\d*)$")
+
+
+def now_ts(conn: Optional[sqlite3.Connection] = None) -> int:
+    """The database clock as epoch seconds, as written to `updated_ts`."""
+    with _read(conn) as conn:
+        return conn.execute(f"SELECT {_NOW_TS}").fetchone()[0]
+
+
+def since_token(note: Dict[str, Any], started_ts: int) -> str:
+    """Resume point for `iter_notes(since=...)` after `note`.
+
+    `started_ts` is `now_ts()` taken before the pass began. Timestamps have
+    one-second granularity, so a note saved again within the second of
+    `note` would not sort after it. Once that second had ended before the
+    pass started, no such save can follow and the token resumes strictly
+    after `note` (`"<ts>:<id>"`). Otherwise the token (`"<ts>:"`) repeats
+    that whole second next time.
+    """
+    if note["updated_ts"] < started_ts:
+        return f"{note['updated_ts']}:{note['id']}"
+    return f"{note['updated_ts']}:"
+
+
+def _since_clause(since: str) -> Tuple[str, List[Any]]:
+    m = _since_token_re.match(since)
+    if m is None:
+        # An `updated_at` string: include its own second, for the same
+        # reason `since_token()` does.
+        return "updated_ts >= CAST(strftime('%s', ?) AS INTEGER)", [since]
+    if m.group(2):
+        return "(updated_ts, id) > (?, ?)", [int(m.group(1)), int(m.group(2))]
+    return "updated_ts >= ?", [int(m.group(1))]
+
+
+def iter_notes(
+    batch_size: int = 500,
+    since: Optional[str] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Yield every note ordered by `(updated_at, id)`, one page at a time.
+
+    Pages are fetched with keyset pagination on the indexed `updated_ts`
+    epoch column, so memory stays bounded by `batch_size` and no read
+    transaction is held between pages. `since` limits the pass to notes
+    saved after a `since_token()`, or in or after the second of an
+    `updated_at` string.
+    """
+    last: Optional[Tuple[Any, int]] = None
+    with _read(conn) as conn:
+        while True:
+            clauses = []
+            params: List[Any] = []
+            if since is not None:
+                clause, since_params = _since_clause(since)
+                clauses.append(clause)
+                params.extend(since_params)
+            if last is not None:
+                clauses.append("(updated_ts, id) > (?, ?)")
+                params.extend(last)
+            where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+            cur = conn.execute(f"SELECT * FROM notes {where}ORDER BY updated_ts, id LIMIT ?", (*params, batch_size))
+            rows = cur.fetchall()
+            for r in rows:
+                note = dict(r)
+                if note.get("chunked"):
+                    note["body"] = chunks.assemble(conn, note["id"])
+                yield note
+            if len(rows) < batch_size:
+                return
+            last = (rows[-1]["updated_ts"], rows[-1]["id"])
+
+
+# Columns `list_notes()` may project. `body` is deliberately absent:
+# `get_note()` is the only full-body fetch.
+LISTABLE_COLUMNS = (
+    "id", "notebook_id", "title", "ai_generated_title", "generated_title",
+    "generated_summary", "created_at", "updated_at", "created_ts", "updated_ts",
+)
+
+
+@lru_cache(maxsize=None)
+def note_record(columns: Tuple[str, ...]) -> type:
+    """Tuple-backed record type (no per-row `__dict__`) for a projection."""
+    return namedtuple("NoteRecord", columns)
+
+
+@dataclass
+class NotePage:
+    records: List[Any] = field(default_factory=list)
+    # Pass back as `cursor` to fetch the following page.
+    next_cursor: Optional[str] = None
+
+
+def list_notes(
+    notebook_id: Optional[int] = _UNSET,
+    columns: Sequence[str] = ("id", "title", "updated_at"),
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    conn: Optional[sqlite3.Connection] = None,
+) -> NotePage:
+    """One page of notes, most recently updated first, without bodies.
+
+    Only `columns` are read and each row is a `note_record(columns)` tuple.
+    Pages are keyset-paginated on `(updated_ts, id)`, the indexed epoch
+    copy of `updated_at`; `next_cursor` is an opaque `"<updated_ts>:<id>"`
+    string to pass back as `cursor` for the following page.
+    `notebook_id=None` lists notes outside any notebook; omit it for all.
+    """
+    columns = tuple(columns)
+    unknown = [c for c in columns if c not in LISTABLE_COLUMNS]
+    if unknown or not columns:
+        raise ValueError(f"Cannot list note columns {unknown or columns}; choose from {LISTABLE_COLUMNS}")
+    clauses: List[str] = []
+    params: List[Any] = []
+    if notebook_id is None:
+        clauses.append("notebook_id IS NULL")
+    elif notebook_id is not _UNSET:
+        clauses.append("notebook_id = ?")
+        params.append(notebook_id)
+    if cursor:
+        ts, _, last_id = cursor.partition(":")
+        clauses.append("(updated_ts, id) < (?, ?)")
+        params.extend([int(ts), int(last_id)])
+    where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+    # The keyset columns ride along after the projection.
+    select = ", ".join((*columns, "updated_ts", "id"))
+    record = note_record(columns)
+    width = len(columns)
+    with _read(conn) as conn:
+        cur = conn.cursor()
+        cur.row_factory = None
+        cur.execute(f"SELECT {select} FROM notes {where}ORDER BY updated_ts DESC, id DESC LIMIT ?", (*params, limit))
+        rows = cur.fetchall()
+    page = NotePage(records=[record._make(r[:width]) for r in rows])
+    if len(rows) == limit:
+        page.next_cursor = f"{rows[-1][-2]}:{rows[-1][-1]}"
+    return page
+
+
+# bm25() weights for the notes_fts columns (title, body): title hits rank higher.
+TITLE_WEIGHT = 10.0
+BODY_WEIGHT = 1.0
+_BM25 = f"bm25(notes_fts, {TITLE_WEIGHT}, {BODY_WEIGHT})"
+_CHUNK_BM25 = f"bm25(note_chunks_fts) * {BODY_WEIGHT}"
+
+
+def _has_fts(conn: sqlite3.Connection) -> bool:
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='notes_fts'")
+    return cur.fetchone() is not None
+
 
 def search(query: str, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
-    """Search titles and bodies with FTS5 preferred, fallback to LIKE."""
-    own = conn is None
-    if own:
-        conn = get_connection()
-    cur = conn.cursor()
-    # Check if notes_fts exists
-    try:
-        cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='notes_fts'")
-        if cur.fetchone():
-            cur.execute("SELECT notes.id, notes.title, notes.body FROM notes JOIN notes_fts ON notes.rowid = notes_fts.rowid WHERE notes_fts MATCH ? LIMIT 50", (query,))
-            rows = [dict(r) for r in cur.fetchall()]
-            if own:
-                conn.close()
-            return rows
-    except Exception:
-        # fall through to LIKE fallback
-        pass
-
-    likeq = f"%{query}%"
-    cur.execute("SELECT id, title, body FROM notes WHERE title LIKE ? OR body LIKE ? LIMIT 50", (likeq, likeq))
-    rows = [dict(r) for r in cur.fetchall()]
-    if own:
-        conn.close()
-    return rows
+    """Search titles and bodies with FTS5 preferred, fallback to substring.
+
+    FTS results are ordered best match first (bm25 with title weighting).
+    Queries FTS cannot express or match (punctuation, partial identifiers)
+    use a trigram-indexed substring search. Without FTS5 the pure-Python
+    inverted index ranks the same way.
+    """
+    with _read(conn) as conn:
+        if not _has_fts(conn) and inverted_index.enabled(conn):
+            rows = inverted_index.search(query, conn)
+            if rows:
+                return rows
+        try:
+            if _has_fts(conn):
+                page = _search_fts(conn, query, 50, 0, None, ("", ""))
+                if page.hits:
+                    return _full_rows(conn, [h.id for h in page.hits])
+        except sqlite3.OperationalError as e:
+            if _is_interrupt(e):
+                raise
+            # not a valid FTS expression; fall through to substring search
+        if not _wants_substring(query):
+            return []
+
+        # Substring match, narrowed by the trigram index when one exists.
+        predicate, params = trigram.candidate_filter(conn, query)
+        match, match_params = trigram.like_match(query)
+        ids = [
+            r[0]
+            for r in conn.execute(f"SELECT id FROM notes WHERE {predicate} AND {match} LIMIT 50", (*params, *match_params))
+        ]
+        return _full_rows(conn, ids)
+
+
+def _full_rows(conn: sqlite3.Connection, ids: List[int]) -> List[Dict[str, Any]]:
+    """`id`/`title`/`body` dicts for `ids`, in that order, chunked bodies joined."""
+    if not ids:
+        return []
+    placeholders = ",".join("?" * len(ids))
+    rows = {r[0]: r for r in conn.execute(f"SELECT id, title, body, chunked FROM notes WHERE id IN ({placeholders})", ids)}
+    return [
+        {"id": i, "title": rows[i][1], "body": chunks.assemble(conn, i) if rows[i][3] else rows[i][2]}
+        for i in ids
+        if i in rows
+    ]
+
+
+@dataclass
+class SearchHit:
+    id: int
+    title: str
+    # Title with matches wrapped in the highlight marks.
+    title_highlight: str
+    # Short excerpt of the body around the best match, marks included.
+    snippet: str
+    # Lower is better (bm25 convention); 0.0 for the LIKE fallback.
+    score: float
+    # For a match inside a chunked body: the chunk's seq and its character
+    # offset in the body, so the editor can jump to it.
+    chunk_seq: Optional[int] = None
+    chunk_offset: Optional[int] = None
+
+
+@dataclass
+class SearchPage:
+    hits: List[SearchHit] = field(default_factory=list)
+    total: int = 0
+    # Pass back as `cursor` to fetch the following page.
+    next_cursor: Optional[str] = None
+
+
+def _encode_cursor(score: float, note_id: int) -> str:
+    return f"{score!r}:{note_id}"
+
+
+def _decode_cursor(cursor: str) -> Tuple[float, int]:
+    score, _, note_id = cursor.rpartition(":")
+    return float(score), int(note_id)
+
+
+def _highlight(text: str, query: str, marks: Tuple[str, str]) -> str:
+    idx = text.lower().find(query.lower())
+    if idx < 0 or not query:
+        return text
+    end = idx + len(query)
+    return f"{text[:idx]}{marks[0]}{text[idx:end]}{marks[1]}{text[end:]}"
+
+
+def _make_snippet(body: str, query: str, marks: Tuple[str, str], width: int = 64) -> str:
+    """Excerpt of `body` around the first case-insensitive match of `query`."""
+    idx = body.lower().find(query.lower()) if query else -1
+    if idx < 0:
+        return body[:width] + ("…" if len(body) > width else "")
+    start = max(0, idx - width // 2)
+    end = min(len(body), idx + len(query) + width // 2)
+    excerpt = _highlight(body[start:end], query, marks)
+    return ("…" if start > 0 else "") + excerpt + ("…" if end < len(body) else "")
+
+
+def _point_at_chunk(conn: sqlite3.Connection, hit: SearchHit, term: str, marks: Tuple[str, str]) -> None:
+    """Take a chunked note's snippet and offset from its first chunk containing `term`."""
+    if not term:
+        return
+    row = conn.execute(
+        f"SELECT seq, content FROM note_chunks WHERE note_id = ? AND content LIKE ? {trigram.LIKE_ESCAPE} "
+        "ORDER BY seq LIMIT 1",
+        (hit.id, trigram.like_pattern(term)),
+    ).fetchone()
+    if row is None:
+        return
+    hit.snippet = _make_snippet(row[1], term, marks)
+    hit.chunk_seq = row[0]
+    hit.chunk_offset = chunks.chunk_offsets(conn, hit.id, [row[0]])[row[0]]
+
+
+def _has_chunk_fts(conn: sqlite3.Connection) -> bool:
+    cur = conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name='note_chunks_fts'")
+    return cur.fetchone() is not None
+
+
+def _search_fts(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    marks: Tuple[str, str],
+) -> SearchPage:
+    if _has_chunk_fts(conn):
+        return _search_fts_chunks(conn, query, limit, offset, cursor, marks)
+    total = conn.execute("SELECT count(*) FROM notes_fts WHERE notes_fts MATCH ?", (query,)).fetchone()[0]
+    params: List[Any] = [marks[0], marks[1], marks[0], marks[1], query]
+    keyset = ""
+    if cursor:
+        keyset = f"AND ({_BM25}, notes_fts.rowid) > (?, ?) "
+        params.extend(_decode_cursor(cursor))
+        offset = 0
+    params.extend([limit, offset])
+    rows = conn.execute(
+        f"SELECT notes_fts.rowid AS id, notes_fts.title AS title, "
+        f"highlight(notes_fts, 0, ?, ?) AS title_highlight, "
+        f"snippet(notes_fts, 1, ?, ?, '…', 16) AS snippet, {_BM25} AS score "
+        f"FROM notes_fts WHERE notes_fts MATCH ? {keyset}"
+        f"ORDER BY score, notes_fts.rowid LIMIT ? OFFSET ?",
+        params,
+    ).fetchall()
+    hits = [SearchHit(r[0], r[1], r[2], r[3], r[4]) for r in rows]
+    page = SearchPage(hits=hits, total=total)
+    if len(hits) == limit:
+        page.next_cursor = _encode_cursor(hits[-1].score, hits[-1].id)
+    return page
+
+
+def _search_fts_chunks(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    marks: Tuple[str, str],
+) -> SearchPage:
+    """`_search_fts()` over `notes_fts` plus the per-chunk index.
+
+    Each note is ranked by its best-scoring row: the note itself (title and
+    unchunked body) or one of its chunks. Chunk hits carry the chunk's seq
+    and body offset.
+    """
+    total = conn.execute(
+        "SELECT count(DISTINCT id) FROM ("
+        "SELECT rowid AS id FROM notes_fts WHERE notes_fts MATCH ? UNION ALL "
+        "SELECT c.note_id FROM note_chunks_fts JOIN note_chunks c ON c.id = note_chunks_fts.rowid "
+        "WHERE note_chunks_fts MATCH ?)",
+        (query, query),
+    ).fetchone()[0]
+    # min() makes SQLite take the other columns from each note's best row.
+    matches = (
+        "SELECT id, title, title_highlight, snippet, min(score) AS score, chunk_seq FROM ("
+        "SELECT notes_fts.rowid AS id, notes_fts.title AS title, highlight(notes_fts, 0, ?, ?) AS title_highlight, "
+        f"snippet(notes_fts, 1, ?, ?, '…', 16) AS snippet, {_BM25} AS score, NULL AS chunk_seq "
+        "FROM notes_fts WHERE notes_fts MATCH ? UNION ALL "
+        "SELECT c.note_id, n.title, n.title, snippet(note_chunks_fts, 0, ?, ?, '…', 16), "
+        f"{_CHUNK_BM25}, c.seq "
+        "FROM note_chunks_fts JOIN note_chunks c ON c.id = note_chunks_fts.rowid JOIN notes n ON n.id = c.note_id "
+        "WHERE note_chunks_fts MATCH ?) GROUP BY id"
+    )
+    params: List[Any] = [marks[0], marks[1], marks[0], marks[1], query, marks[0], marks[1], query]
+    keyset = ""
+    if cursor:
+        keyset = "WHERE (score, id) > (?, ?) "
+        params.extend(_decode_cursor(cursor))
+        offset = 0
+    params.extend([limit, offset])
+    rows = conn.execute(
+        f"SELECT id, title, title_highlight, snippet, score, chunk_seq FROM ({matches}) {keyset}"
+        f"ORDER BY score, id LIMIT ? OFFSET ?",
+        params,
+    ).fetchall()
+    hits = []
+    for r in rows:
+        hit = SearchHit(r[0], r[1], r[2], r[3], r[4])
+        if r[5] is not None:
+            hit.chunk_seq = r[5]
+            hit.chunk_offset = chunks.chunk_offsets(conn, hit.id, [r[5]])[r[5]]
+        hits.append(hit)
+    page = SearchPage(hits=hits, total=total)
+    if len(hits) == limit:
+        page.next_cursor = _encode_cursor(hits[-1].score, hits[-1].id)
+    return page
+
+
+def _search_index(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    marks: Tuple[str, str],
+) -> SearchPage:
+    # Negate BM25 so scores follow the FTS5 convention (lower is better).
+    ranked = [(-score, note_id) for note_id, score in inverted_index.get_index(conn).score(query)]
+    total = len(ranked)
+    if cursor:
+        after = _decode_cursor(cursor)
+        ranked = [r for r in ranked if r > after]
+        offset = 0
+    ranked = ranked[offset:offset + limit]
+    if not ranked:
+        return SearchPage(total=total)
+    ids = [note_id for _score, note_id in ranked]
+    placeholders = ",".join("?" * len(ids))
+    rows = {r[0]: r for r in conn.execute(f"SELECT id, title, body, chunked FROM notes WHERE id IN ({placeholders})", ids)}
+    # Highlight the first query word; the index has no match offsets.
+    words = _token_re.findall(query)
+    first = words[0] if words else ""
+    hits = []
+    for score, i in ranked:
+        if i not in rows:
+            continue
+        hit = SearchHit(i, rows[i][1], _highlight(rows[i][1], first, marks), _make_snippet(rows[i][2], first, marks), score)
+        if rows[i][3]:
+            _point_at_chunk(conn, hit, first, marks)
+        hits.append(hit)
+    page = SearchPage(hits=hits, total=total)
+    if len(hits) == limit:
+        page.next_cursor = _encode_cursor(hits[-1].score, hits[-1].id)
+    return page
+
+
+def _search_like(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int,
+    offset: int,
+    cursor: Optional[str],
+    marks: Tuple[str, str],
+) -> SearchPage:
+    likeq = trigram.like_pattern(query)
+    predicate, pred_params = trigram.candidate_filter(conn, query)
+    match, match_params = trigram.like_match(query)
+    total = conn.execute(
+        f"SELECT count(*) FROM notes WHERE {predicate} AND {match}",
+        (*pred_params, *match_params),
+    ).fetchone()[0]
+    # Title matches first (score -1.0), then body-only matches (0.0).
+    score_sql = f"(CASE WHEN title LIKE ? {trigram.LIKE_ESCAPE} THEN -1.0 ELSE 0.0 END)"
+    params: List[Any] = [likeq, *pred_params, *match_params]
+    keyset = ""
+    if cursor:
+        keyset = f"AND ({score_sql}, id) > (?, ?) "
+        params.append(likeq)
+        params.extend(_decode_cursor(cursor))
+        offset = 0
+    params.extend([limit, offset])
+    rows = conn.execute(
+        f"SELECT id, title, body, {score_sql} AS score, chunked FROM notes "
+        f"WHERE {predicate} AND {match} {keyset}ORDER BY score, id LIMIT ? OFFSET ?",
+        params,
+    ).fetchall()
+    hits = []
+    for r in rows:
+        hit = SearchHit(r[0], r[1], _highlight(r[1], query, marks), _make_snippet(r[2], query, marks), r[3])
+        if r[4]:
+            _point_at_chunk(conn, hit, query, marks)
+        hits.append(hit)
+    page = SearchPage(hits=hits, total=total)
+    if len(hits) == limit:
+        page.next_cursor = _encode_cursor(hits[-1].score, hits[-1].id)
+    return page
+
+
+_token_re = re.compile(r"\w+", re.UNICODE)
+
+
+def prefix_query(text: str) -> str:
+    """Turn typed text into an FTS5 query matching every word as a prefix.
+
+    `"hel wor"` becomes `"hel"* "wor"*`; punctuation is dropped so partial
+    input never produces an FTS syntax error.
+    """
+    return " ".join(f'"{tok}"*' for tok in _token_re.findall(text))
+
+
+def _is_interrupt(e: sqlite3.OperationalError) -> bool:
+    """True if `e` comes from `Connection.interrupt()` rather than a bad query."""
+    return "interrupt" in str(e).lower()
+
+
+_prefix_term_re = re.compile(r"\*(?:\s|$)")
+
+
+def _wants_substring(query: str) -> bool:
+    """Whether a query that FTS did not match should try the LIKE fallback.
+
+    Blank queries would match every note, and `prefix_query()` output
+    (`"hel"*`) is FTS syntax that never occurs literally in a note.
+    """
+    return bool(query.strip()) and not _prefix_term_re.search(query)
+
+
+def search_notes(
+    query: str,
+    limit: int = 20,
+    offset: int = 0,
+    cursor: Optional[str] = None,
+    marks: Tuple[str, str] = ("[", "]"),
+    conn: Optional[sqlite3.Connection] = None,
+) -> SearchPage:
+    """Ranked, paged search returning snippets instead of full bodies.
+
+    Page with `offset`/`limit`, or pass the previous page's `next_cursor`
+    for keyset paging (which ignores `offset`). `total` counts every match.
+    """
+    with _read(conn) as conn:
+        if _has_fts(conn):
+            try:
+                page = _search_fts(conn, query, limit, offset, cursor, marks)
+                if page.total:
+                    return page
+            except sqlite3.OperationalError as e:
+                if _is_interrupt(e):
+                    raise
+                # not a valid FTS expression; use the substring fallback
+        elif inverted_index.enabled(conn):
+            page = _search_index(conn, query, limit, offset, cursor, marks)
+            if page.total:
+                return page
+        if not _wants_substring(query):
+            return SearchPage()
+        return _search_like(conn, query, limit, offset, cursor, marks)
+
+
+def search_fuzzy(query: str, limit: int = 20, min_similarity: float = 0.5, conn: Optional[sqlite3.Connection] = None) -> List[Dict[str, Any]]:
+    """Typo-tolerant title/body match by trigram overlap, best first."""
+    with _read(conn) as conn:
+        return [
+            {"id": nid, "title": title, "similarity": sim}
+            for nid, title, sim in trigram.fuzzy_search(conn, query, limit=limit, min_similarity=min_similarity)
+        ]
@@ -0,0 +1,135 @@
+"""Boolean tag expressions compiled to SQL set operations.
+
+Grammar (keywords are case-insensitive, NOT binds tightest, then AND, then OR;
+adjacent terms are ANDed, and tag names with spaces or keyword names must be
+quoted):
+
+    expr   := and (OR and)*
+    and    := unary ((AND)? unary | NOT unary)*
+    unary  := NOT unary | '(' expr ')' | tag
+
+`work AND urgent NOT archived` becomes the `INTERSECT`/`EXCEPT` of per-tag
+`note_tags` lookups. Each lookup is a range read on `idx_note_tags_tag`, so
+the work depends on the tags' cardinalities, not on the size of `notes`.
+"""
+from __future__ import annotations
+import re
+from typing import Any, List, Tuple
+
+from .utils import normalize_tag
+
+_token_re = re.compile(r'\s*(?:(\()|(\))|"((?:[^"]|"")*)"|([^\s()"]+))')
+_KEYWORDS = ("AND", "OR", "NOT")
+
+Compiled = Tuple[str, List[Any]]
+
+_TAG_SQL = "SELECT note_id FROM note_tags WHERE tag_id = (SELECT id FROM tags WHERE name = ?)"
+_ALL_SQL = "SELECT id AS note_id FROM notes"
+
+
+def _tokenize(expression: str) -> List[Tuple[str, str]]:
+    tokens: List[Tuple[str, str]] = []
+    pos = 0
+    expression = expression.rstrip()
+    while pos < len(expression):
+        m = _token_re.match(expression, pos)
+        if m is None or m.end() == pos:
+            raise ValueError(f"Invalid tag expression near {expression[pos:]!r}")
+        pos = m.end()
+        if m.group(1):
+            tokens.append(("(", "("))
+        elif m.group(2):
+            tokens.append((")", ")"))
+        elif m.group(3) is not None:
+            tokens.append(("TAG", m.group(3).replace('""', '"')))
+        elif m.group(4).upper() in _KEYWORDS:
+            tokens.append((m.group(4).upper(), m.group(4)))
+        else:
+            tokens.append(("TAG", m.group(4)))
+    return tokens
+
+
+def _wrap(sql: str) -> str:
+    # SQLite won't accept a parenthesised compound select as an operand.
+    return f"SELECT note_id FROM ({sql})"
+
+
+class _Parser:
+    def __init__(self, tokens: List[Tuple[str, str]]) -> None:
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self) -> str:
+        return self.tokens[self.pos][0] if self.pos < len(self.tokens) else ""
+
+    def take(self, kind: str) -> str:
+        if self.peek() != kind:
+            found = self.tokens[self.pos][1] if self.pos < len(self.tokens) else "end of expression"
+            raise ValueError(f"Expected {kind} in tag expression, found {found!r}")
+        value = self.tokens[self.pos][1]
+        self.pos += 1
+        return value
+
+    def expr(self) -> Compiled:
+        sql, params = self.and_()
+        while self.peek() == "OR":
+            self.take("OR")
+            rsql, rparams = self.and_()
+            sql, params = f"{_wrap(sql)} UNION {_wrap(rsql)}", params + rparams
+        return sql, params
+
+    def and_(self) -> Compiled:
+        # Intersect the positive terms first and subtract negated ones, so
+        # `a NOT b` never materializes the complement of b.
+        positive: List[Compiled] = []
+        negative: List[Compiled] = []
+        while True:
+            kind = self.peek()
+            if kind == "AND":
+                self.take("AND")
+                kind = self.peek()
+                if kind not in ("NOT", "(", "TAG"):
+                    raise ValueError("AND must be followed by a tag expression")
+            if kind == "NOT":
+                self.take("NOT")
+                negative.append(self.unary())
+            elif kind in ("(", "TAG"):
+                positive.append(self.unary())
+            else:
+                break
+        if not positive and not negative:
+            raise ValueError("Empty tag expression")
+        sql, params = positive[0] if positive else (_ALL_SQL, [])
+        for psql, pparams in positive[1:]:
+            sql, params = f"{_wrap(sql)} INTERSECT {_wrap(psql)}", params + pparams
+        for nsql, nparams in negative:
+            sql, params = f"{_wrap(sql)} EXCEPT {_wrap(nsql)}", params + nparams
+        return sql, params
+
+    def unary(self) -> Compiled:
+        kind = self.peek()
+        if kind == "NOT":
+            self.take("NOT")
+            sql, params = self.unary()
+            return f"{_ALL_SQL} EXCEPT {_wrap(sql)}", params
+        if kind == "(":
+            self.take("(")
+            compiled = self.expr()
+            self.take(")")
+            return compiled
+        name = normalize_tag(self.take("TAG"))
+        if not name:
+            raise ValueError("Empty tag name in tag expression")
+        return _TAG_SQL, [name]
+
+
+def compile_expression(expression: str) -> Compiled:
+    """SQL selecting the `note_id`s matching `expression`, plus its parameters.
+
+    Raises ValueError for malformed expressions.
+    """
+    parser = _Parser(_tokenize(expression))
+    compiled = parser.expr()
+    if parser.peek():
+        raise ValueError(f"Unexpected {parser.tokens[parser.pos][1]!r} in tag expression")
+    return compiled
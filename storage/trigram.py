@@ -0,0 +1,204 @@
+"""Trigram-backed substring and fuzzy matching for notes.
+
+Databases whose SQLite has FTS5's `trigram` tokenizer use the `notes_trigram`
+table, kept in sync by triggers. Otherwise migration 4 creates the
+`note_trigrams` side table, which the repository write paths maintain
+through `sync_notes()` and, on delete, `remove_notes()`.
+
+Queries shorter than three characters cannot use either index and fall
+back to a LIKE scan.
+
+Chunked notes (see storage/chunks.py) have an empty `notes.body`. The side
+table indexes their chunk contents; `notes_trigram` cannot see chunks, so
+its candidate filter always admits chunked notes (read from the partial
+`idx_notes_chunked` index). `like_match()` gives the exact test over title,
+body and chunks.
+"""
+from __future__ import annotations
+import sqlite3
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+from . import chunks
+
+
+def trigrams(text: str) -> Set[str]:
+    """Distinct lower-cased 3-character windows of `text`."""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _has_table(conn: sqlite3.Connection, name: str) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (name,)).fetchone() is not None
+
+
+def native_available(conn: sqlite3.Connection) -> bool:
+    return _has_table(conn, "notes_trigram")
+
+
+def side_table_available(conn: sqlite3.Connection) -> bool:
+    return _has_table(conn, "note_trigrams")
+
+
+def _note_trigrams(title: str, body: str, pieces: Iterable[str] = ()) -> Set[str]:
+    # Index the columns (and chunks) separately so no trigram spans a boundary.
+    grams = trigrams(title) | trigrams(body)
+    for piece in pieces:
+        grams |= trigrams(piece)
+    return grams
+
+
+def sync_notes(conn: sqlite3.Connection, note_ids: Iterable[int]) -> None:
+    """Re-index `note_ids` in the side table; no-op when it doesn't exist."""
+    note_ids = list(note_ids)
+    if not note_ids or not side_table_available(conn):
+        return
+    cur = conn.cursor()
+    for start in range(0, len(note_ids), 500):
+        chunk = note_ids[start:start + 500]
+        placeholders = ",".join("?" * len(chunk))
+        cur.execute(f"DELETE FROM note_trigrams WHERE note_id IN ({placeholders})", chunk)
+        cur.execute(f"SELECT id, title, body FROM notes WHERE id IN ({placeholders})", chunk)
+        for note_id, title, body in cur.fetchall():
+            pieces = chunks.contents(conn, note_id) if not body else ()
+            conn.executemany(
+                "INSERT OR IGNORE INTO note_trigrams (trigram, note_id) VALUES (?, ?)",
+                ((t, note_id) for t in _note_trigrams(title, body, pieces)),
+            )
+
+
+def remove_notes(conn: sqlite3.Connection, note_ids: Iterable[int]) -> None:
+    note_ids = list(note_ids)
+    if not note_ids or not side_table_available(conn):
+        return
+    conn.executemany("DELETE FROM note_trigrams WHERE note_id = ?", ((nid,) for nid in note_ids))
+
+
+def rebuild_side_table(conn: sqlite3.Connection, batch_size: int = 1000) -> None:
+    """Index every note in the side table from scratch."""
+    conn.execute("DELETE FROM note_trigrams")
+    last = 0
+    while True:
+        ids = [r[0] for r in conn.execute("SELECT id FROM notes WHERE id > ? ORDER BY id LIMIT ?", (last, batch_size))]
+        if not ids:
+            return
+        sync_notes(conn, ids)
+        last = ids[-1]
+
+
+def _fts_phrase(text: str) -> str:
+    return '"' + text.replace('"', '""') + '"'
+
+
+def like_pattern(query: str) -> str:
+    """`%query%` with LIKE wildcards in `query` escaped; use with `LIKE_ESCAPE`."""
+    escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+LIKE_ESCAPE = "ESCAPE '\\'"
+
+
+def like_match(query: str) -> Tuple[str, List[Any]]:
+    """SQL predicate on a `notes` row: title, body or a chunk contains `query`."""
+    likeq = like_pattern(query)
+    sql = (
+        f"(notes.title LIKE ? {LIKE_ESCAPE} OR notes.body LIKE ? {LIKE_ESCAPE} OR (notes.chunked = 1 AND EXISTS "
+        f"(SELECT 1 FROM note_chunks c WHERE c.note_id = notes.id AND c.content LIKE ? {LIKE_ESCAPE})))"
+    )
+    return sql, [likeq, likeq, likeq]
+
+
+def candidate_filter(conn: sqlite3.Connection, query: str) -> Tuple[str, List[Any]]:
+    """SQL predicate on `notes.id` narrowing to notes that may contain `query`.
+
+    Returns `("1", [])` when no index can help. Callers still apply their
+    exact test (`like_match()`); the predicate just lets SQLite skip the
+    full scan.
+    """
+    if len(query) < 3:
+        return "1", []
+    if native_available(conn):
+        return (
+            "id IN (SELECT rowid FROM notes_trigram WHERE notes_trigram MATCH ? "
+            "UNION SELECT id FROM notes WHERE chunked = 1)",
+            [_fts_phrase(query)],
+        )
+    if side_table_available(conn):
+        rare = _rarest(conn, trigrams(query), 2)
+        sql = " INTERSECT ".join("SELECT note_id FROM note_trigrams WHERE trigram = ?" for _ in rare)
+        return f"id IN ({sql})", rare
+    return "1", []
+
+
+def _rarest(conn: sqlite3.Connection, grams: Set[str], n: int, cap: int = 2000) -> List[str]:
+    """The `n` trigrams with the shortest posting lists.
+
+    Counting stops at `cap` per trigram so common trigrams stay cheap to
+    size. Intersecting only the rarest lists keeps the candidate set small;
+    the caller's LIKE test removes false positives.
+    """
+    sized = []
+    for g in grams:
+        count = conn.execute(
+            "SELECT count(*) FROM (SELECT 1 FROM note_trigrams WHERE trigram = ? LIMIT ?)", (g, cap)
+        ).fetchone()[0]
+        if count == 0:
+            return [g]  # nothing can match
+        sized.append((count, g))
+    sized.sort()
+    return [g for _count, g in sized[:n]]
+
+
+def fuzzy_search(
+    conn: sqlite3.Connection,
+    query: str,
+    limit: int = 20,
+    min_similarity: float = 0.5,
+) -> List[Tuple[int, str, float]]:
+    """Notes sharing many trigrams with `query`, best first.
+
+    Returns `(id, title, similarity)` where similarity is the fraction of the
+    query's trigrams found in the note. Tolerates typos and transpositions
+    that substring search would miss.
+    """
+    grams = sorted(trigrams(query))
+    if not grams:
+        return []
+    needed = max(1, int(len(grams) * min_similarity + 0.999))
+    placeholders = ",".join("?" * len(grams))
+    if native_available(conn):
+        # Rank candidates with an OR query, then score overlap in Python.
+        match = " OR ".join(_fts_phrase(g) for g in grams)
+        rows = conn.execute(
+            "SELECT rowid, title, body FROM notes_trigram WHERE notes_trigram MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit * 5),
+        ).fetchall()
+        scored = []
+        for note_id, title, body in rows:
+            present = _note_trigrams(title, body)
+            hits = sum(1 for g in grams if g in present)
+            if hits >= needed:
+                scored.append((note_id, title, hits / len(grams)))
+        scored.sort(key=lambda r: (-r[2], r[0]))
+        return scored[:limit]
+    if side_table_available(conn):
+        rows = conn.execute(
+            f"SELECT t.note_id, n.title, count(*) AS hits FROM note_trigrams t JOIN notes n ON n.id = t.note_id "
+            f"WHERE t.trigram IN ({placeholders}) GROUP BY t.note_id HAVING hits >= ? "
+            f"ORDER BY hits DESC, t.note_id LIMIT ?",
+            (*grams, needed, limit),
+        ).fetchall()
+        return [(r[0], r[1], r[2] / len(grams)) for r in rows]
+    return []
+
+
+def substring_ids(conn: sqlite3.Connection, query: str, limit: Optional[int] = None) -> List[int]:
+    """Ids of notes whose title or body contains `query` (case-insensitive)."""
+    predicate, params = candidate_filter(conn, query)
+    match, match_params = like_match(query)
+    sql = f"SELECT id FROM notes WHERE {predicate} AND {match} ORDER BY id"
+    args: List[Any] = [*params, *match_params]
+    if limit is not None:
+        sql += " LIMIT ?"
+        args.append(limit)
+    return [r[0] for r in conn.execute(sql, args)]
@@ -2,10 +2,16 @@ from __future__ import annotations
 
 import os
 import json
+import atexit
 import base64
+import hashlib
+import hmac
 import re
+import threading
+import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List
+from typing import Callable, Dict, Optional, List
 
 try:
     import keyring
@@ -50,6 +56,149 @@ def _derive_key(passphrase: str, salt: bytes, iterations: int = 390000) -> bytes
     return key
 
 
+# Seconds a cached derived key may go unused before it is wiped; override
+# with AI_NOTEPAD_KEY_CACHE_IDLE_TTL (see config/settings.py).
+KEY_CACHE_IDLE_TTL = 15 * 60.0
+
+
+def configured_idle_ttl() -> float:
+    """The configured key-cache idle TTL, or `KEY_CACHE_IDLE_TTL`."""
+    try:
+        from config.settings import get_key_cache_idle_ttl
+
+        configured = get_key_cache_idle_ttl()
+    except Exception:
+        configured = None
+    return KEY_CACHE_IDLE_TTL if configured is None else configured
+
+
+@dataclass
+class _CachedKey:
+    salt: bytes
+    # HMAC of salt + passphrase under a per-process random key; the
+    # passphrase itself is never kept.
+    tag: bytes
+    key: bytearray
+    last_used: float
+
+
+def _zero(buf: bytearray) -> None:
+    buf[:] = bytes(len(buf))
+
+
+class DerivedKeyCache:
+    """Session cache of PBKDF2-derived Fernet keys for the encrypted fallback.
+
+    Deriving a key costs hundreds of milliseconds of CPU, so it is done once
+    per fallback file and reused while the file's salt and the passphrase
+    stay the same. Rewriting the file (new salt) or using another passphrase
+    derives again. Keys live in `bytearray`s that `wipe()` zeroes. After
+    `lock()` nothing is cached until `unlock()`. A key unused for `idle_ttl`
+    seconds is wiped by a background timer, or on the next access if that
+    comes first, so keys do not outlive their use of the fallback.
+    """
+
+    def __init__(self, idle_ttl: float = KEY_CACHE_IDLE_TTL, clock: Callable[[], float] = time.monotonic) -> None:
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[str, _CachedKey] = {}
+        self._locked = False
+        self._pepper = os.urandom(32)
+        self._timer: Optional[threading.Timer] = None
+
+    @property
+    def locked(self) -> bool:
+        return self._locked
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _tag(self, passphrase: str, salt: bytes) -> bytes:
+        return hmac.new(self._pepper, salt + passphrase.encode("utf-8"), hashlib.sha256).digest()
+
+    def _expire(self, now: float) -> None:
+        for name, entry in list(self._entries.items()):
+            if now - entry.last_used >= self.idle_ttl:
+                _zero(entry.key)
+                del self._entries[name]
+
+    def _schedule(self) -> None:
+        """Arm the idle timer for the least recently used key; lock held."""
+        if self._timer is not None or not self._entries:
+            return
+        due = min(e.last_used for e in self._entries.values()) + self.idle_ttl
+        self._timer = threading.Timer(max(0.0, due - self._clock()), self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _cancel_timer(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._expire(self._clock())
+            self._schedule()
+
+    def key_for(self, path: Path, passphrase: str, salt: bytes) -> bytes:
+        """The Fernet key for `path`'s `salt` and `passphrase`, derived at most once."""
+        name = str(Path(path).resolve())
+        tag = self._tag(passphrase, salt)
+        with self._lock:
+            now = self._clock()
+            self._expire(now)
+            entry = self._entries.get(name)
+            if entry is not None and entry.salt == salt and hmac.compare_digest(entry.tag, tag):
+                entry.last_used = now
+                return bytes(entry.key)
+        key = _derive_key(passphrase, salt)
+        self.remember(path, passphrase, salt, key)
+        return key
+
+    def remember(self, path: Path, passphrase: str, salt: bytes, key: bytes) -> None:
+        """Cache a key just derived for `path` (unless the cache is locked)."""
+        name = str(Path(path).resolve())
+        with self._lock:
+            if self._locked:
+                return
+            old = self._entries.pop(name, None)
+            if old is not None:
+                _zero(old.key)
+            self._entries[name] = _CachedKey(salt, self._tag(passphrase, salt), bytearray(key), self._clock())
+            self._schedule()
+
+    def forget(self, path: Path) -> None:
+        with self._lock:
+            entry = self._entries.pop(str(Path(path).resolve()), None)
+            if entry is not None:
+                _zero(entry.key)
+
+    def wipe(self) -> None:
+        """Zero and drop every cached key."""
+        with self._lock:
+            self._cancel_timer()
+            for entry in self._entries.values():
+                _zero(entry.key)
+            self._entries.clear()
+
+    def lock(self) -> None:
+        """Wipe the cache and stop caching until `unlock()`."""
+        with self._lock:
+            self._locked = True
+        self.wipe()
+
+    def unlock(self) -> None:
+        with self._lock:
+            self._locked = False
+
+
+key_cache = DerivedKeyCache(idle_ttl=configured_idle_ttl())
+atexit.register(key_cache.wipe)
+
+
 def store_api_key(
     service: str,
     username: str,
@@ -87,6 +236,7 @@ def delete_api_key(service: str, username: str, fallback_path: Optional[Path] =
         except Exception:
             return False
     if fallback_path and Path(fallback_path).exists():
+        key_cache.forget(fallback_path)
         try:
             Path(fallback_path).unlink()
             return True
@@ -100,6 +250,7 @@ def _store_encrypted_file(path: Path, secret: str, passphrase: str) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
     salt = os.urandom(16)
     key = _derive_key(passphrase, salt)
+    key_cache.remember(path, passphrase, salt, key)
     f = Fernet(key)
     token = f.encrypt(secret.encode("utf-8"))
     payload = {"salt": base64.b64encode(salt).decode("ascii"), "token": base64.b64encode(token).decode("ascii")}
@@ -115,10 +266,12 @@ def _load_encrypted_file(path: Path, passphrase: str) -> Optional[str]:
         payload = json.load(fh)
     salt = base64.b64decode(payload["salt"])
     token = base64.b64decode(payload["token"])
-    key = _derive_key(passphrase, salt)
+    key = key_cache.key_for(path, passphrase, salt)
     f = Fernet(key)
     try:
         secret = f.decrypt(token)
         return secret.decode("utf-8")
     except Exception:
+        # Wrong passphrase (or a corrupt file): don't keep its key.
+        key_cache.forget(path)
         return None
@@ -1,7 +1,24 @@
+import sqlite3
 import sys
 from pathlib import Path
 
+import pytest
+
 # Ensure repository root is on sys.path so local packages import correctly during tests
 ROOT = Path(__file__).resolve().parent.parent
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
+
+from storage import migrations  # noqa: E402  (needs ROOT on sys.path)
+
+
+@pytest.fixture
+def conn(tmp_path):
+    """A freshly migrated temporary database with `sqlite3.Row` rows."""
+    db_file = tmp_path / "notes.db"
+    migrations.migrate(db_file)
+    c = sqlite3.connect(str(db_file))
+    c.row_factory = sqlite3.Row
+    c.execute("PRAGMA foreign_keys = ON")
+    yield c
+    c.close()
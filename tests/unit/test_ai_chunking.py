@@ -0,0 +1,247 @@
+import json as jsonlib
+import queue
+import threading
+import time
+
+import pytest
+
+from ai import chunking
+from ai.client import AIClient
+from config import settings as app_settings
+from storage.db import RewriteMode
+
+
+class Resp:
+    status_code = 200
+    headers = {"Content-Type": "application/json"}
+
+    def __init__(self, content):
+        self.content = content
+
+    def raise_for_status(self):
+        return None
+
+    def json(self):
+        return {"choices": [{"message": {"content": self.content}}]}
+
+
+class StreamResp(Resp):
+    """A server-sent-event answer: one delta per word, then `finish_reason`."""
+
+    headers = {"Content-Type": "text/event-stream"}
+    raw = None
+
+    def __init__(self, content, finish_reason="stop"):
+        super().__init__(content)
+        self.finish_reason = finish_reason
+        self.closed = False
+
+    def iter_lines(self, chunk_size=None):
+        for word in self.content.split(" "):
+            yield "data: " + jsonlib.dumps({"choices": [{"delta": {"content": word + " "}}]})
+        yield "data: " + jsonlib.dumps({"choices": [{"delta": {}, "finish_reason": self.finish_reason}]})
+        yield "data: [DONE]"
+
+    def close(self):
+        self.closed = True
+
+
+def _client(respond, **kwargs):
+    """An AIClient whose streamed requests are answered by `respond(prompt, json)`."""
+    return AIClient(stream_transport=lambda url, headers, json, timeout: respond(json["messages"][0]["content"], json), **kwargs)
+
+
+@pytest.fixture(autouse=True)
+def settings(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "test")
+    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2024-10-01")
+    monkeypatch.setattr("ai.client.retry_loop", lambda n: [0.0] * n)
+
+
+def _note(sections=6, paras=5):
+    out = []
+    for s in range(sections):
+        out.append(f"# Section {s}\n\n")
+        out += [f"Paragraph {s}.{p} " + "words " * 40 + "\n\n" for p in range(paras)]
+    return "".join(out)
+
+
+def test_split_is_lossless_and_prefers_heading_boundaries():
+    text = _note()
+    chunks = chunking.split_for_rewrite(text, budget_tokens=400)
+    assert "".join(chunks) == text
+    assert len(chunks) > 1
+    assert all(chunking.estimate_tokens(c) <= 400 for c in chunks)
+    assert all(c.endswith("\n\n") for c in chunks)
+    assert all(c.startswith("# Section") for c in chunks[1:])
+    long_line = "x" * 5000
+    assert chunking.split_for_rewrite(long_line, budget_tokens=500) == ["x" * 2000, "x" * 2000, "x" * 1000]
+    assert not chunking.needs_chunking("short") and chunking.needs_chunking(text, budget_tokens=400)
+
+
+def test_chunks_run_concurrently_and_are_stitched_in_order():
+    lock = threading.Lock()
+    state = {"active": 0, "peak": 0, "max_tokens": set()}
+
+    def respond(prompt, json):
+        with lock:
+            state["active"] += 1
+            state["peak"] = max(state["peak"], state["active"])
+            state["max_tokens"].add(json["max_tokens"])
+        # Later chunks finish first, so ordering is the stitcher's job.
+        time.sleep(0.05 if "Section 0" in prompt else 0.01)
+        with lock:
+            state["active"] -= 1
+        return Resp(" " + prompt.upper() + " ")
+
+    text = _note()
+    client = _client(respond, max_retries=0)
+    job = chunking.ChunkedRewrite(client, text, lambda t: t, budget_tokens=400, concurrency=3, max_tokens=700)
+    assert job.result() == text.upper()
+    assert 1 < state["peak"] <= 3
+    assert state["max_tokens"] == {700}
+
+
+def test_chunks_are_streamed():
+    text = _note()
+    job = chunking.ChunkedRewrite(_client(lambda p, j: StreamResp(p.strip()), max_retries=0), text, lambda t: t, budget_tokens=400)
+    assert job.result() == text
+
+
+def test_a_truncated_chunk_fails_instead_of_being_stitched_in():
+    def respond(prompt, json):
+        return StreamResp("half an answer", finish_reason="length" if "Section 1" in prompt else "stop")
+
+    job = chunking.ChunkedRewrite(_client(respond, max_retries=0), _note(), lambda t: t, budget_tokens=400, max_tokens=50)
+    with pytest.raises(RuntimeError, match=r"chunk 2 of .*max_tokens \(50\)"):
+        job.result()
+
+
+def test_a_failing_chunk_is_retried_alone():
+    calls = []
+
+    def respond(prompt, json):
+        calls.append(prompt)
+        if "Section 2" in prompt and calls.count(prompt) == 1:
+            raise Exception("transient")
+        return Resp(prompt)
+
+    text = _note()
+    client = _client(respond, max_retries=1)
+    job = chunking.ChunkedRewrite(client, text, lambda t: t, budget_tokens=400)
+    assert job.result() == text
+    assert len(calls) == len(job.chunks) + 1
+
+    down = _client(lambda p, j: (_ for _ in ()).throw(Exception("down")), max_retries=0)
+    with pytest.raises(RuntimeError, match="chunk 1 of"):
+        chunking.rewrite_chunked(down, text, lambda t: t, budget_tokens=400)
+
+
+def test_cancel_stops_in_flight_and_remaining_chunks():
+    started = threading.Event()
+    responses = []
+
+    class Blocking(StreamResp):
+        def iter_lines(self, chunk_size=None):
+            started.set()
+            while not self.closed:  # until cancel() closes the response
+                time.sleep(0.01)
+            return iter(())
+
+    def respond(prompt, json):
+        responses.append(Blocking("never"))
+        return responses[-1]
+
+    job = chunking.ChunkedRewrite(_client(respond, max_retries=0), _note(), lambda t: t, budget_tokens=400, concurrency=1)
+    out = []
+    worker = threading.Thread(target=lambda: out.extend(job))
+    worker.start()
+    assert started.wait(5)
+    job.cancel()
+    worker.join(2)
+    assert not worker.is_alive() and out == [] and job.cancelled
+    time.sleep(0.1)
+    assert len(responses) == 1 and responses[0].closed
+
+
+def test_concurrency_setting(monkeypatch):
+    monkeypatch.setenv("AI_NOTEPAD_REWRITE_CONCURRENCY", "2")
+    app_settings.invalidate_settings()
+    assert app_settings.get_settings().rewrite_concurrency == 2
+    monkeypatch.setenv("AI_NOTEPAD_REWRITE_CONCURRENCY", "many")
+    assert app_settings.get_settings().rewrite_concurrency is None
+    monkeypatch.delenv("AI_NOTEPAD_REWRITE_CONCURRENCY")
+    app_settings.invalidate_settings()
+
+
+def test_max_tokens_is_configurable():
+    seen = []
+
+    def transport(url, headers, json, timeout):
+        seen.append(json["max_tokens"])
+        return Resp("ok")
+
+    client = AIClient(transport=transport, max_retries=0, max_tokens=128)
+    client.rewrite("a")
+    client.rewrite("a", max_tokens=64)
+    mode = RewriteMode(id=1, name="M", instruction_template="{text}", advanced_settings={"max_tokens": "2048"})
+    client.apply_rewrite_mode(mode, "a")
+    client.apply_rewrite_mode(RewriteMode(id=2, name="N", instruction_template="{text}"), "a")
+    assert seen == [128, 64, 2048, 128]
+
+
+def test_a_chunk_that_drops_mid_stream_is_restarted():
+    calls = []
+
+    class Dropping(StreamResp):
+        def iter_lines(self, chunk_size=None):
+            lines = super().iter_lines(chunk_size)
+            yield next(lines)
+            raise ConnectionError("connection reset")
+
+    def respond(prompt, json):
+        calls.append(prompt)
+        if "Section 2" in prompt and calls.count(prompt) == 1:
+            return Dropping(prompt.strip())
+        return StreamResp(prompt.strip())
+
+    text = _note()
+    job = chunking.ChunkedRewrite(_client(respond, max_retries=0), text, lambda t: t, budget_tokens=400)
+    assert job.result() == text
+    assert len(calls) == len(job.chunks) + 1
+
+
+def test_a_failed_chunk_cancels_the_others():
+    started = threading.Event()
+    responses = []
+
+    class Blocking(StreamResp):
+        def iter_lines(self, chunk_size=None):
+            started.set()
+            while not self.closed:
+                time.sleep(0.01)
+            return iter(())
+
+    def respond(prompt, json):
+        if "Section 0" in prompt:
+            assert started.wait(5)
+            raise Exception("down")
+        responses.append(Blocking("never"))
+        return responses[-1]
+
+    job = chunking.ChunkedRewrite(_client(respond, max_retries=0), _note(), lambda t: t, budget_tokens=400, concurrency=2)
+    with pytest.raises(RuntimeError, match="chunk 1 of"):
+        job.result()
+    assert job.cancelled
+    time.sleep(0.1)
+    assert responses and all(r.closed for r in responses)
+
+
+def test_preview_rejects_a_truncated_single_request():
+    ui = pytest.importorskip("desktop_app.ui")
+    stream = _client(lambda p, j: StreamResp("half an answer", finish_reason="length"), max_retries=0).rewrite_stream("x")
+    dlg = ui.PreviewDialog.__new__(ui.PreviewDialog)
+    dlg._pending, dlg.error, dlg._done = queue.SimpleQueue(), None, False
+    dlg.consume(stream)
+    assert dlg._done and "max_tokens" in dlg.error
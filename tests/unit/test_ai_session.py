@@ -0,0 +1,68 @@
+import gzip
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ai import session as ai_session
+from ai.client import AIClient
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.peers.add(self.client_address)
+        self.server.encodings.append(self.headers.get("Accept-Encoding", ""))
+        body = gzip.compress(json.dumps({"choices": [{"message": {"content": "pooled"}}]}).encode())
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.peers, srv.encodings = set(), []
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_client_reuses_one_pooled_connection(server, monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", f"http://127.0.0.1:{server.server_address[1]}")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "test")
+    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2024-10-01")
+    ai_session.close_session()
+    try:
+        client = AIClient(timeout=5.0, max_retries=0)
+        assert [client.rewrite("hi") for _ in range(5)] == ["pooled"] * 5
+        assert client.test_connection()["ok"] is True
+        # A second client shares the process-wide session and its pool.
+        assert AIClient(timeout=5.0, max_retries=0).rewrite("again") == "pooled"
+    finally:
+        ai_session.close_session()
+    assert len(server.peers) == 1
+    assert all("gzip" in e for e in server.encodings)
+
+
+def test_shared_session_is_recreated_after_close():
+    first = ai_session.get_session()
+    assert ai_session.get_session() is first
+    ai_session.close_session()
+    second = ai_session.get_session()
+    assert second is not first
+    adapter = second.get_adapter("https://example.com")
+    assert adapter._pool_maxsize == ai_session.POOL_MAXSIZE
+    ai_session.close_session()
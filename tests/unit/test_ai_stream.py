@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from ai import session as ai_session
+from ai.client import AIClient, iter_sse_tokens
+
+
+def _event(payload):
+    return f"data: {json.dumps(payload)}\n\n".encode()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.server.payloads.append(body)
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        events = [_event({"choices": [], "prompt_filter_results": []}), b": keep-alive\n\n"]
+        events += [_event({"choices": [{"delta": {"content": t}}]}) for t in self.server.tokens]
+        for i, ev in enumerate(events):
+            self._chunk(ev)
+            if i == 2:
+                # Hold the rest back until the client has shown the first token.
+                if not self.server.release.wait(5):
+                    return
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+    def _chunk(self, data):
+        try:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+            self.wfile.flush()
+        except OSError:
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(monkeypatch):
+    srv = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    srv.payloads, srv.tokens, srv.release = [], ["Hel", "lo", " world"], threading.Event()
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", f"http://127.0.0.1:{srv.server_address[1]}")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "test")
+    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2024-10-01")
+    yield srv
+    srv.release.set()
+    srv.shutdown()
+    srv.server_close()
+    ai_session.close_session()
+
+
+def test_sse_tokens_arrive_before_the_response_ends(server):
+    stream = AIClient(timeout=5.0, max_retries=0).rewrite_stream("hi")
+    tokens = iter(stream)
+    # The server is still holding the remaining events back at this point.
+    assert next(tokens) == "Hel"
+    server.release.set()
+    assert list(tokens) == ["lo", " world"]
+    assert server.payloads[0]["stream"] is True
+
+
+def test_cancel_closes_the_stream_mid_generation(server):
+    stream = AIClient(timeout=5.0, max_retries=0).rewrite_stream("hi")
+    received = []
+
+    def consume():
+        for token in stream:
+            received.append(token)
+
+    worker = threading.Thread(target=consume)
+    worker.start()
+    deadline = time.monotonic() + 5
+    while not received and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stream.cancel()
+    started = time.monotonic()
+    worker.join(2)
+    # The blocked read is interrupted, not left to run into the timeout.
+    assert time.monotonic() - started < 1
+    assert not worker.is_alive()
+    assert received == ["Hel"] and stream.cancelled
+
+
+def test_stream_falls_back_to_a_plain_json_answer(monkeypatch):
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "test")
+    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2024-10-01")
+
+    class Resp:
+        headers = {"Content-Type": "application/json"}
+
+        def raise_for_status(self):
+            return None
+
+        def json(self):
+            return {"choices": [{"message": {"content": " whole answer "}}]}
+
+        def close(self):
+            pass
+
+    calls = {"n": 0}
+
+    def transport(url, headers, json, timeout):
+        calls["n"] += 1
+        if calls["n"] == 1:
+            raise Exception("transient")
+        return Resp()
+
+    monkeypatch.setattr("ai.client.retry_loop", lambda n: [0.0] * n)
+    client = AIClient(stream_transport=transport, timeout=0.1, max_retries=1)
+    assert list(client.rewrite_stream("hi")) == ["whole answer"]
+    assert [e["success"] for e in client.log.entries] == [False, True]
+
+
+def test_iter_sse_tokens_skips_non_content_events():
+    lines = [
+        b": comment",
+        b"",
+        b'data: {"choices": [{"delta": {"role": "assistant"}}]}',
+        'data: {"choices": [{"delta": {"content": "caf\\u00e9"}}]}'.encode(),
+        b"data: [DONE]",
+        b'data: {"choices": [{"delta": {"content": "after done"}}]}',
+    ]
+    assert list(iter_sse_tokens(lines)) == ["café"]
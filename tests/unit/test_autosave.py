@@ -0,0 +1,98 @@
+from desktop_app.autosave import Autosaver
+from storage import db, journal, repository
+
+
+class FakeWidget:
+    """Stand-in for a Tk widget: `after()` timers fire only when told to."""
+
+    def __init__(self):
+        self.timers = {}
+        self._next = 0
+
+    def after(self, ms, fn, *args):
+        self._next += 1
+        after_id = f"after#{self._next}"
+        self.timers[after_id] = (fn, args)
+        return after_id
+
+    def after_cancel(self, after_id):
+        self.timers.pop(after_id, None)
+
+    def fire(self):
+        timers, self.timers = self.timers, {}
+        for fn, args in timers.values():
+            fn(*args)
+
+
+def test_debounced_save_skips_unchanged_content(tmp_path, monkeypatch):
+    db_file = tmp_path / "autosave.db"
+    widget = FakeWidget()
+    text = {"value": ""}
+    saver = Autosaver(widget, lambda: text["value"], db_path=db_file)
+    writes = []
+    real_update = repository.update_notes
+
+    def counting_update(rows, **kwargs):
+        rows = list(rows)
+        writes.append(rows)
+        return real_update(rows, **kwargs)
+
+    monkeypatch.setattr(repository, "update_notes", counting_update)
+
+    text["value"] = "first draft"
+    saver.changed()
+    saver.changed()
+    assert len(widget.timers) == 1  # re-armed, not stacked
+    widget.fire()
+    saver._executor.submit(lambda: None).result()  # wait for the worker
+    note_id = saver.document.note_id
+    assert note_id is not None
+
+    saver.changed()
+    widget.fire()  # content unchanged: no write queued
+    assert saver.flush() is None
+    assert writes == []
+
+    text["value"] = "second draft"
+    saver.flush().result()
+    saver.close()
+    journal.close_all()
+    assert len(writes) == 1
+    with db.get_manager(db_file).reader() as conn:
+        assert repository.get_note(note_id, conn=conn)["body"] == "second draft"
+
+
+def test_load_does_not_resave_loaded_text(tmp_path):
+    db_file = tmp_path / "load.db"
+    with db.get_manager(db_file).writer() as w:
+        nid = repository.create_note("Kept title", "body", conn=w)
+    text = {"value": "body"}
+    saver = Autosaver(FakeWidget(), lambda: text["value"], db_path=db_file)
+    saver.load(nid, "body", title="Kept title")
+    assert saver.flush() is None
+    text["value"] = "edited"
+    saver.flush().result()
+    saver.close()
+    journal.close_all()
+    with db.get_manager(db_file).reader() as conn:
+        note = repository.get_note(nid, conn=conn)
+    assert (note["title"], note["body"]) == ("Kept title", "edited")
+
+
+def test_on_saved_reports_created_and_updated_notes(tmp_path):
+    db_file = tmp_path / "notify.db"
+    widget = FakeWidget()
+    text = {"value": "new note"}
+    saved = []
+    saver = Autosaver(widget, lambda: text["value"], db_path=db_file, on_saved=lambda *a: saved.append(a))
+    saver.flush().result()
+    note_id = saver.document.note_id
+    widget.fire()  # callbacks are delivered through after()
+    assert saved == [(note_id, "Untitled")]
+    saver.document.title = "Renamed"
+    text["value"] = "edited"
+    saver.flush().result()
+    widget.fire()
+    assert saved[-1] == (note_id, "Renamed")
+    saver.close()
+    journal.close_all()
@@ -0,0 +1,179 @@
+import sqlite3
+import types
+
+import pytest
+
+from desktop_app.large_document import ChunkMap, ChunkedAutosaver
+from storage import chunks, db, inverted_index, journal, migrations, repository, trigram
+
+
+def test_split_body_is_paragraph_aligned_and_lossless():
+    body = "".join(f"Paragraph {i}. " + "word " * (i % 40) + "\n\n" for i in range(2000))
+    pieces = chunks.split_body(body, target=1000)
+    assert "".join(pieces) == body
+    assert all(p.endswith("\n\n") for p in pieces)
+    assert max(len(p) for p in pieces) <= 1000
+    # Content-defined cuts: an edit early on leaves the later chunks alone.
+    edited = chunks.split_body(body.replace("Paragraph 3.", "Paragraph three, edited."), target=1000)
+    assert len(set(pieces) ^ set(edited)) <= 4
+
+
+def test_split_body_falls_back_to_lines():
+    body = "".join(f"line {i}\n" for i in range(1000)) + "tail"
+    pieces = chunks.split_body(body, target=100)
+    assert "".join(pieces) == body
+    assert all(p.endswith("\n") for p in pieces[:-1])
+    assert max(len(p) for p in pieces) <= 100
+    assert chunks.split_body("x" * 250, target=100) == ["x" * 100, "x" * 100, "x" * 50]
+
+
+def test_only_changed_chunks_are_written(conn):
+    nid = repository.create_note("Log", "", conn=conn)
+    pieces = list(zip(chunks.initial_seqs(3), ["a\n", "b\n", "c\n"]))
+    repository.convert_to_chunked(nid, pieces, conn=conn)
+    note = repository.get_note(nid, conn=conn)
+    assert note["chunked"] == 1 and note["body"] == "a\nb\nc\n"
+    assert repository.get_note(nid, conn=conn, assemble=False)["body"] == ""
+
+    rowids = dict(conn.execute("SELECT seq, id FROM note_chunks").fetchall())
+    second, third = pieces[1][0], pieces[2][0]
+    repository.update_note_chunks(
+        nid, {pieces[0][0]: "a\n", second: "B\n", second + 1: "inserted\n"}, deletes=[third], conn=conn
+    )
+    after = dict(conn.execute("SELECT seq, id FROM note_chunks").fetchall())
+    # The unchanged chunk keeps its row; the edited one is updated in place.
+    assert after[pieces[0][0]] == rowids[pieces[0][0]] and after[second] == rowids[second]
+    assert third not in after
+    assert repository.get_note(nid, conn=conn)["body"] == "a\nB\ninserted\n"
+    assert [n["body"] for n in repository.iter_notes(conn=conn)] == ["a\nB\ninserted\n"]
+
+
+def test_store_body_rewrites_only_changed_chunks(conn):
+    body = "".join(f"Paragraph {i}: " + "text " * 60 + "\n\n" for i in range(4000))
+    assert len(body) > chunks.LARGE_NOTE_CHARS
+    nid = repository.create_note("Dump", "", conn=conn)
+    repository.update_note(nid, "Dump", body, conn=conn)
+    note = repository.get_note(nid, conn=conn, assemble=False)
+    assert note["chunked"] == 1 and note["body"] == ""
+    count = conn.execute("SELECT count(*) FROM note_chunks WHERE note_id = ?", (nid,)).fetchone()[0]
+    assert count > 10
+
+    edited = body.replace("Paragraph 2000:", "Paragraph 2000 (edited):")
+    written = chunks.store_body(conn, nid, edited)
+    assert 1 <= written <= 2
+    assert repository.get_note(nid, conn=conn)["body"] == edited
+    assert chunks.store_body(conn, nid, edited) == 0
+
+
+def test_search_hits_carry_chunk_offsets(conn):
+    if not repository._has_fts(conn):
+        pytest.skip("FTS5 not available")
+    body = "".join(f"Paragraph {i}: " + "filler " * 50 + "\n\n" for i in range(3000))
+    body += "The zanzibar needle is here.\n\n" + body
+    nid = repository.create_note("Haystack", "", conn=conn)
+    repository.update_note(nid, "Haystack", body, conn=conn)
+    repository.create_note("Small", "zanzibar in a small note", conn=conn)
+    page = repository.search_notes("zanzibar", conn=conn)
+    assert page.total == 2
+    hit = next(h for h in page.hits if h.id == nid)
+    assert "[zanzibar]" in hit.snippet
+    start = body[hit.chunk_offset:]
+    assert start.startswith(dict(chunks.load_chunks(conn, nid))[hit.chunk_seq])
+    assert "zanzibar" in start[:chunks.CHUNK_TARGET]
+    small = next(h for h in page.hits if h.id != nid)
+    assert small.chunk_seq is None and small.chunk_offset is None
+
+
+def test_full_updates_of_chunked_notes_replace_the_chunks(conn):
+    nid = repository.create_note("Log", "", conn=conn)
+    repository.convert_to_chunked(nid, [(1, "old")], conn=conn)
+    plain = repository.create_note("Plain", "p", conn=conn)
+    assert repository.update_notes([(nid, "Renamed", "new body"), (plain, "Plain", "q")], conn=conn) == 2
+    note = repository.get_note(nid, conn=conn)
+    assert (note["title"], note["body"]) == ("Renamed", "new body")
+    assert repository.get_note(plain, conn=conn)["body"] == "q"
+    repository.update_note(nid, "Renamed", "again", conn=conn)
+    assert repository.get_note_chunks(nid, conn=conn) == [(chunks.SEQ_GAP, "again")]
+    repository.delete_note(nid, conn=conn)
+    assert conn.execute("SELECT count(*) FROM note_chunks").fetchone()[0] == 0
+
+
+def test_conversion_is_not_overwritten_by_a_queued_snapshot(tmp_path):
+    db_file = tmp_path / "convert.db"
+    with db.get_manager(db_file).writer() as w:
+        nid = repository.create_note("Big", "small", conn=w)
+    wb = journal.get_write_behind(db_file)
+    wb.interval = 60.0
+    wb.submit(nid, "stale full body")
+
+    class Widget:
+        def after(self, ms, fn, *args):
+            return "after#1"
+
+        def after_cancel(self, after_id):
+            pass
+
+    large = types.SimpleNamespace(map=ChunkMap())  # nothing dirty; no Tk needed
+    saver = ChunkedAutosaver(Widget(), large, db_path=db_file)
+    try:
+        saver.load(nid, title="Big")
+        saver.convert(nid, [(1, "fresh "), (2, "chunks")]).result()
+    finally:
+        saver.close()
+        journal.close_all()
+    with db.get_manager(db_file).reader() as conn:
+        assert repository.get_note_chunks(nid, conn=conn) == [(1, "fresh "), (2, "chunks")]
+    db.close_all()
+
+
+def _chunked_note(conn):
+    nid = repository.create_note("Big", "", conn=conn)
+    pieces = [(1, "intro\n\n"), (2, "then foo.bar(baz) happened\n\n"), (3, "a needle at the end")]
+    repository.convert_to_chunked(nid, pieces, conn=conn)
+    return nid, len(pieces[0][1])
+
+
+@pytest.fixture(params=["fts5", "side_table", "no_fts"])
+def search_conn(request, tmp_path, monkeypatch):
+    """Databases for each search setup a chunked note must be found in."""
+    if request.param in ("side_table", "no_fts"):
+        monkeypatch.setattr(migrations, "trigram_tokenizer_available", lambda conn: False)
+    if request.param == "no_fts":
+        monkeypatch.setattr(migrations, "fts5_available", lambda conn: False)
+    db_file = tmp_path / f"{request.param}.db"
+    migrations.migrate(db_file)
+    c = sqlite3.connect(str(db_file))
+    c.row_factory = sqlite3.Row
+    yield c
+    inverted_index.invalidate(c)
+    c.close()
+
+
+def test_chunked_notes_are_found_by_every_search_path(search_conn):
+    conn = search_conn
+    nid, second_offset = _chunked_note(conn)
+    repository.create_note("Other", "unrelated", conn=conn)
+    assert trigram.substring_ids(conn, "foo.bar(baz)") == [nid]
+    page = repository.search_notes("foo.bar(baz)", conn=conn)
+    assert [h.id for h in page.hits] == [nid]
+    assert page.hits[0].chunk_offset == second_offset and "foo" in page.hits[0].snippet
+    rows = repository.search("happened", conn=conn)
+    assert [r["id"] for r in rows] == [nid] and rows[0]["body"].endswith("a needle at the end")
+    assert [r["id"] for r in repository.search("needle", conn=conn)] == [nid]
+    assert [h.id for h in repository.search_notes(repository.prefix_query("need"), conn=conn).hits] == [nid]
+    # Chunk-only edits re-index the note too.
+    repository.update_note_chunks(nid, {3: "a haystack at the end"}, conn=conn)
+    assert repository.search("needle", conn=conn) == []
+    assert [r["id"] for r in repository.search("haystack", conn=conn)] == [nid]
+
+
+def test_chunk_map_dirty_ranges_and_new_seqs():
+    cmap = ChunkMap()
+    cmap.reset([(10, "a"), (20, "b"), (30, "c")])
+    cmap.mark_dirty(30, 10)
+    assert cmap.dirty == {10, 20, 30}
+    assert cmap.new_seqs(10, 3) == [12, 15, 17]
+    assert cmap.new_seqs(30, 2) == [30 + chunks.SEQ_GAP, 30 + 2 * chunks.SEQ_GAP]
+    cmap.add(11)
+    assert cmap.new_seqs(10, 1) is None
+    assert cmap.is_unchanged(20, "b") and not cmap.is_unchanged(20, "B")
@@ -0,0 +1,48 @@
+import threading
+
+from storage import db, repository
+
+
+def test_manager_reuses_connections(tmp_path, monkeypatch):
+    db_file = tmp_path / "mgr.db"
+    monkeypatch.setattr("storage.db.DEFAULT_DB", db_file)
+    try:
+        mgr = db.get_manager()
+        assert db.get_manager(db_file) is mgr
+        with mgr.writer() as w1, mgr.writer() as w2:
+            assert w1 is w2
+        with mgr.reader() as r1, mgr.reader() as r2:
+            assert r1 is r2
+
+        seen = {}
+
+        def other_thread():
+            with mgr.reader() as r:
+                seen["conn"] = r
+
+        t = threading.Thread(target=other_thread)
+        t.start()
+        t.join()
+        assert seen["conn"] is not r1
+    finally:
+        db.close_all()
+
+
+def test_repository_uses_default_manager(tmp_path, monkeypatch):
+    monkeypatch.setattr("storage.db.DEFAULT_DB", tmp_path / "repo.db")
+    try:
+        nid = repository.create_note("Title", "Body")
+        repository.add_tag_to_note(nid, "Foo")
+        assert repository.get_note(nid)["title"] == "Title"
+        assert repository.get_tags_for_note(nid) == ["foo"]
+    finally:
+        db.close_all()
+
+
+def test_close_all_closes_connections(tmp_path):
+    mgr = db.get_manager(tmp_path / "close.db")
+    with mgr.reader():
+        pass
+    db.close_all()
+    assert db.get_manager(tmp_path / "close.db") is not mgr
+    db.close_all()
@@ -0,0 +1,64 @@
+import pytest
+
+from storage import db
+
+
+def _pragma(conn, name):
+    return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+
+def test_get_connection_applies_profile(tmp_path):
+    conn = db.get_connection(tmp_path / "p.db", profile="balanced")
+    try:
+        assert _pragma(conn, "journal_mode") == "wal"
+        assert _pragma(conn, "synchronous") == 1  # NORMAL
+        assert _pragma(conn, "cache_size") == db.PROFILES["balanced"].cache_size
+        assert _pragma(conn, "temp_store") == 2  # MEMORY
+        assert _pragma(conn, "busy_timeout") == db.PROFILES["balanced"].busy_timeout
+    finally:
+        conn.close()
+
+
+def test_manager_connections_use_profile(tmp_path):
+    mgr = db.ConnectionManager(tmp_path / "m.db", profile="safe")
+    try:
+        with mgr.writer() as w:
+            assert _pragma(w, "synchronous") == 2  # FULL
+        with mgr.reader() as r:
+            assert _pragma(r, "journal_mode") == "wal"
+            assert _pragma(r, "synchronous") == 2
+    finally:
+        mgr.close()
+
+
+def test_profile_from_environment(monkeypatch):
+    monkeypatch.setenv("AI_NOTEPAD_DB_PROFILE", "fast")
+    assert db.resolve_profile().name == "fast"
+    monkeypatch.setenv("AI_NOTEPAD_DB_PROFILE", "bogus")
+    assert db.resolve_profile().name == db.DEFAULT_PROFILE
+
+
+def test_unknown_profile_rejected():
+    with pytest.raises(ValueError):
+        db.resolve_profile("turbo")
+
+
+def test_get_connection_enforces_foreign_keys(tmp_path):
+    conn = db.get_connection(tmp_path / "fk.db")
+    try:
+        assert _pragma(conn, "foreign_keys") == 1
+    finally:
+        conn.close()
+
+
+def test_get_manager_warns_on_profile_mismatch(tmp_path, caplog):
+    try:
+        mgr = db.get_manager(tmp_path / "w.db", profile="safe")
+        with caplog.at_level("WARNING", logger="storage.db"):
+            assert db.get_manager(tmp_path / "w.db", profile="safe") is mgr
+            assert not caplog.records
+            assert db.get_manager(tmp_path / "w.db", profile="fast") is mgr
+        assert "ignoring requested profile 'fast'" in caplog.text
+        assert mgr.profile.name == "safe"
+    finally:
+        db.close_all()
@@ -0,0 +1,84 @@
+import json
+import zipfile
+
+from storage import exporter, importer, repository
+
+
+def _seed(conn):
+    nb = repository.create_notebook("Work", conn=conn)
+    a = repository.create_note("Alpha: one", "alpha body", notebook_id=nb, conn=conn)
+    b = repository.create_note("Beta", "beta body", conn=conn)
+    repository.add_tags([a], ["x", "y"], conn=conn)
+    conn.execute("UPDATE notes SET updated_at = '2024-01-01 00:00:00' WHERE id = ?", (a,))
+    conn.execute("UPDATE notes SET updated_at = '2024-02-01 00:00:00' WHERE id = ?", (b,))
+    conn.commit()
+    return a, b
+
+
+def test_iter_notes_keyset_pages(conn):
+    ids = repository.create_notes([(f"n{i}", "b") for i in range(7)], conn=conn)
+    assert [n["id"] for n in repository.iter_notes(batch_size=3, conn=conn)] == ids
+
+
+def test_export_jsonl_and_incremental(tmp_path, conn):
+    a, b = _seed(conn)
+    out = tmp_path / "notes.jsonl"
+    result = exporter.export_jsonl(out, conn=conn)
+    records = [json.loads(line) for line in out.read_text(encoding="utf-8").splitlines()]
+    assert result.count == 2
+    assert [r["id"] for r in records] == [a, b]
+    assert records[0]["notebook"] == "Work"
+    assert records[0]["tags"] == ["x", "y"]
+
+    result = exporter.export_jsonl(out, since="2024-01-15 00:00:00", conn=conn)
+    assert result.count == 1
+    assert result.last_updated_at == "2024-02-01 00:00:00"
+
+
+def test_markdown_zip_round_trips_through_importer(tmp_path, conn):
+    a, _ = _seed(conn)
+    archive = tmp_path / "notes.zip"
+    assert exporter.export_markdown_zip(archive, conn=conn).count == 2
+    with zipfile.ZipFile(archive) as zf:
+        names = zf.namelist()
+        assert f"Work/alpha-one-{a}.md" in names
+        zf.extractall(tmp_path / "unzipped")
+    meta, body = importer.parse_front_matter((tmp_path / "unzipped" / "Work" / f"alpha-one-{a}.md").read_text(encoding="utf-8"))
+    assert meta["title"] == "Alpha: one"
+    assert meta["tags"] == ["x", "y"]
+    assert body == "alpha body"
+
+
+def test_incremental_export_keeps_saves_within_the_same_second(tmp_path, conn, monkeypatch):
+    a, b = repository.create_notes([("A", "a"), ("B", "b")], conn=conn)
+    conn.execute("UPDATE notes SET updated_ts = 1000")
+    conn.commit()
+    out = tmp_path / "notes.jsonl"
+
+    def exported(since):
+        result = exporter.export_jsonl(out, since=since, conn=conn)
+        return result, {r["id"]: r["title"] for r in map(json.loads, out.read_text(encoding="utf-8").splitlines())}
+
+    # Exported while second 1000 is still running: A is saved again in it.
+    monkeypatch.setattr(repository, "now_ts", lambda conn=None: 1000)
+    first, _ = exported(None)
+    assert first.next_since == "1000:"
+    conn.execute("UPDATE notes SET title = 'A2', updated_ts = 1000 WHERE id = ?", (a,))
+    conn.commit()
+    second, notes = exported(first.next_since)
+    assert notes[a] == "A2"
+
+    # Once the second has passed, the next export resumes strictly after B.
+    monkeypatch.setattr(repository, "now_ts", lambda conn=None: 1001)
+    third, _ = exported(second.next_since)
+    assert third.next_since == f"1000:{b}"
+    conn.execute("UPDATE notes SET title = 'A3', updated_ts = 1001 WHERE id = ?", (a,))
+    conn.commit()
+    fourth, notes = exported(third.next_since)
+    assert notes == {a: "A3"}
+    # Second 1001 is still open, so A is repeated until it has passed.
+    assert fourth.next_since == "1001:"
+    assert exporter.export_jsonl(out, since=fourth.next_since, conn=conn).count == 1
+    monkeypatch.setattr(repository, "now_ts", lambda conn=None: 1002)
+    assert exporter.export_jsonl(out, since=f"1001:{a}", conn=conn).count == 0
+    assert exporter.export_jsonl(out, since=f"1001:{a}", conn=conn).next_since == f"1001:{a}"
@@ -0,0 +1,91 @@
+import pytest
+
+from storage import importer, migrations, repository
+
+
+def _tree(root):
+    (root / "work" / "projects").mkdir(parents=True)
+    (root / "top.txt").write_text("plain top level note", encoding="utf-8")
+    (root / "work" / "a.md").write_text("---\ntitle: Alpha\ntags: [Foo, bar]\n---\nalpha body zebra\n", encoding="utf-8")
+    (root / "work" / "b.md").write_text("# Beta heading\n\nbeta body\n", encoding="utf-8")
+    (root / "work" / "projects" / "c.md").write_text("---\ntags:\n  - foo\n---\ngamma body\n", encoding="utf-8")
+    (root / "work" / "ignore.bin").write_bytes(b"\x00")
+
+
+def test_parse_front_matter():
+    meta, body = importer.parse_front_matter("---\ntitle: 'X'\ntags: a, b\n---\nhello")
+    assert meta == {"title": "X", "tags": "a, b"}
+    assert body == "hello"
+    assert importer.parse_front_matter("--- not front matter") == ({}, "--- not front matter")
+
+
+def test_import_folder_maps_notebooks_tags_and_fts(tmp_path, conn):
+    root = tmp_path / "notes"
+    _tree(root)
+    seen = []
+    report = importer.import_folder(root, batch_size=2, conn=conn, progress=lambda p: seen.append(p.imported))
+    assert report.imported == 4
+    assert seen[-1] == 4
+
+    rows = {r["title"]: r for r in conn.execute("SELECT n.id, n.title, nb.name AS nb FROM notes n LEFT JOIN notebooks nb ON nb.id = n.notebook_id")}
+    assert set(rows) == {"top", "Alpha", "Beta heading", "c"}
+    assert rows["Alpha"]["nb"] == "work"
+    assert rows["c"]["nb"] == "work/projects"
+    assert rows["top"]["nb"] is None
+    assert repository.get_tags_for_note(rows["Alpha"]["id"], conn=conn) == ["bar", "foo"]
+
+    # triggers are back and the index was rebuilt
+    assert any(r["id"] == rows["Alpha"]["id"] for r in repository.search("zebra", conn=conn))
+    nid = repository.create_note("after", "quokka", conn=conn)
+    assert any(r["id"] == nid for r in repository.search("quokka", conn=conn))
+
+
+def test_import_resumes_from_checkpoint(tmp_path, conn, monkeypatch):
+    root = tmp_path / "notes"
+    _tree(root)
+    checkpoint = tmp_path / "import.ckpt"
+
+    calls = {"n": 0}
+    real = repository.create_notes
+
+    def flaky(notes, conn=None):
+        calls["n"] += 1
+        if calls["n"] == 2:
+            raise KeyboardInterrupt
+        return real(notes, conn=conn)
+
+    monkeypatch.setattr(repository, "create_notes", flaky)
+    with pytest.raises(KeyboardInterrupt):
+        importer.import_folder(root, batch_size=2, checkpoint_path=checkpoint, conn=conn)
+    assert checkpoint.exists()
+    assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 2
+    # The failed run put the triggers back, so notes saved before the
+    # resume are indexed.
+    assert not migrations._tables_missing_triggers(conn)
+    nid = repository.create_note("between", "wallaby", conn=conn)
+    assert any(r["id"] == nid for r in repository.search("wallaby", conn=conn))
+
+    monkeypatch.setattr(repository, "create_notes", real)
+    report = importer.import_folder(root, batch_size=2, checkpoint_path=checkpoint, conn=conn)
+    assert report.imported == 4
+    assert not checkpoint.exists()
+    assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 5
+    assert repository.search("gamma", conn=conn)
+
+
+def test_triggers_left_suspended_by_a_crash_are_restored_on_startup(tmp_path, conn, monkeypatch):
+    if not repository._has_fts(conn):
+        pytest.skip("FTS5 not available")
+    with repository.transaction(conn) as tx:
+        migrations.suspend_index_triggers(tx)
+    nid = repository.create_note("orphan", "wombat", conn=conn)
+    # The same process never restores behind a running import's back...
+    migrations.migrate_connection(conn)
+    fts = "SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?"
+    assert conn.execute(fts, ("wombat",)).fetchall() == []
+    # ...but a fresh process (empty in-process registry) does.
+    monkeypatch.setattr(migrations, "_suspended", set())
+    migrations.migrate_connection(conn)
+    assert [r[0] for r in conn.execute(fts, ("wombat",))] == [nid]
+    repository.rename_note(nid, "kangaroo", conn=conn)
+    assert [r[0] for r in conn.execute(fts, ("kangaroo",))] == [nid]
@@ -0,0 +1,88 @@
+import sqlite3
+
+import pytest
+
+from storage import inverted_index, migrations, repository
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "fts5_available", lambda conn: False)
+    db_file = tmp_path / "nofts.db"
+    migrations.migrate(db_file)
+    c = sqlite3.connect(str(db_file))
+    c.row_factory = sqlite3.Row
+    assert not repository._has_fts(c)
+    assert inverted_index.enabled(c)
+    yield c
+    inverted_index.invalidate(c)
+    c.close()
+
+
+def test_bm25_ranking_and_prefix():
+    index = inverted_index.InvertedIndex()
+    index.add(1, inverted_index._term_vector("Apple", "pie"))
+    index.add(2, inverted_index._term_vector("Cake", "apple apple crumble"))
+    index.add(3, inverted_index._term_vector("Soup", "leek"))
+    assert [d for d, _ in index.score("apple")] == [1, 2]  # title weighted
+    assert [d for d, _ in index.score("apple crumble")] == [2]
+    assert [d for d, _ in index.score('"app"* "cru"*')] == [2]
+    index.remove(2, inverted_index._term_vector("Cake", "apple apple crumble"))
+    assert index.score("crumble") == []
+    assert len(index) == 2
+
+
+def test_search_without_fts(conn):
+    a = repository.create_note("Apple pie", "grandma's recipe", conn=conn)
+    b = repository.create_note("Shopping", "apples, pears, an apple", conn=conn)
+    assert [r["id"] for r in repository.search("apple", conn=conn)] == [a, b]
+    page = repository.search_notes(repository.prefix_query("appl"), limit=1, conn=conn)
+    assert page.total == 2 and [h.id for h in page.hits] == [a]
+    assert page.hits[0].title_highlight == "[Appl]e pie"
+    nxt = repository.search_notes(repository.prefix_query("appl"), limit=1, cursor=page.next_cursor, conn=conn)
+    assert [h.id for h in nxt.hits] == [b]
+
+
+def test_write_paths_update_index_incrementally(conn):
+    a = repository.create_note("one", "alpha", conn=conn)
+    assert [r["id"] for r in repository.search("alpha", conn=conn)] == [a]  # loads the index
+    repository.update_note(a, "one", "beta", conn=conn)
+    ids = repository.create_notes([("two", "alpha"), ("three", "gamma")], conn=conn)
+    assert [r["id"] for r in repository.search("alpha", conn=conn)] == [ids[0]]
+    assert [r["id"] for r in repository.search("beta", conn=conn)] == [a]
+    repository.delete_note(a, conn=conn)
+    assert repository.search("beta", conn=conn) == []
+
+
+def test_persisted_index_survives_reload(conn):
+    a = repository.create_note("kept", "persistent words", conn=conn)
+    inverted_index.invalidate(conn)
+    # A note written behind the repository's back is indexed on load.
+    conn.execute("INSERT INTO notes (title, body) VALUES ('raw', 'persistent too')")
+    conn.commit()
+    ids = [r["id"] for r in repository.search("persistent", conn=conn)]
+    assert ids[0] == a and len(ids) == 2
+    # Searching never writes; the catch-up step persists the row.
+    assert conn.execute("SELECT count(*) FROM search_index_docs").fetchone()[0] == 1
+    assert repository.catch_up_search_index(conn) == 1
+    assert conn.execute("SELECT count(*) FROM search_index_docs").fetchone()[0] == 2
+    assert len(repository.search("persistent", conn=conn)) == 2  # no duplicate postings
+    assert repository.catch_up_search_index(conn) == 0
+
+
+def test_loading_leaves_caller_transaction_open(conn):
+    conn.execute("INSERT INTO notes (title, body) VALUES ('draft', 'uncommitted words')")
+    assert [r["title"] for r in repository.search("uncommitted", conn=conn)] == ["draft"]
+    assert conn.in_transaction
+    conn.rollback()
+    inverted_index.invalidate(conn)
+    assert repository.search("uncommitted", conn=conn) == []
+
+
+def test_rollback_invalidates_memory(conn):
+    repository.search("anything", conn=conn)
+    with pytest.raises(RuntimeError):
+        with repository.transaction(conn) as tx:
+            repository.create_note("ghost", "phantom", conn=tx)
+            raise RuntimeError
+    assert repository.search("phantom", conn=conn) == []
@@ -0,0 +1,114 @@
+from storage import db, journal, repository
+from storage.journal import SaveJournal, WriteBehind
+
+
+def _notes(db_file, *titles):
+    with db.get_manager(db_file).writer() as w:
+        return [repository.create_note(t, "", conn=w) for t in titles]
+
+
+def test_saves_across_notes_coalesce_into_one_commit(tmp_path, monkeypatch):
+    db_file = tmp_path / "wb.db"
+    a, b = _notes(db_file, "a", "b")
+    batches = []
+    real_update = repository.update_notes
+
+    def recording_update(rows, **kwargs):
+        rows = list(rows)
+        batches.append(rows)
+        return real_update(rows, **kwargs)
+
+    monkeypatch.setattr(repository, "update_notes", recording_update)
+    wb = WriteBehind(db_file, interval=60.0)
+    for i in range(20):
+        wb.submit(a, f"a v{i}")
+        wb.submit(b, f"b v{i}")
+    assert wb.flush(timeout=5.0)
+    assert len(batches) == 1
+    assert sorted(batches[0]) == [(a, None, "a v19"), (b, None, "b v19")]
+    assert wb.journal.path.read_text() == ""  # truncated after commit
+    wb.close()
+    with db.get_manager(db_file).reader() as conn:
+        assert repository.get_note(a, conn=conn)["body"] == "a v19"
+
+
+def test_uncommitted_snapshots_are_replayed(tmp_path):
+    db_file = tmp_path / "crash.db"
+    a, b = _notes(db_file, "a", "b")
+    path = db_file.with_name(db_file.name + journal.JOURNAL_SUFFIX)
+    # Simulate a crash: snapshots journaled, only the first one committed.
+    log = SaveJournal(path)
+    log.append(a, "committed")
+    log.append(b, "lost edit")
+    log.mark_committed(1)
+    log.close()
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"seq": 3, "note_id": ')  # torn final write
+
+    wb = WriteBehind(db_file)
+    assert wb.replay() == 1
+    assert wb.recovered == 1
+    assert path.read_text() == ""
+    wb.close()
+    with db.get_manager(db_file).reader() as conn:
+        assert repository.get_note(a, conn=conn)["body"] == ""
+        assert repository.get_note(b, conn=conn)["body"] == "lost edit"
+
+
+def test_marker_keeps_newer_snapshots(tmp_path):
+    log = SaveJournal(tmp_path / "j.jsonl")
+    log.append(1, "old")
+    log.append(2, "x")
+    log.append(1, "new")
+    log.mark_committed(2)
+    log.close()
+    assert SaveJournal(tmp_path / "j.jsonl").pending() == {1: (3, "new")}
+
+
+def test_bad_lines_are_skipped(tmp_path):
+    path = tmp_path / "j.jsonl"
+    log = SaveJournal(path)
+    log.append(1, "kept")
+    log.close()
+    with open(path, "a", encoding="utf-8") as fh:
+        fh.write('{"seq": 2, "body": "no note id"}\n[1, 2]\nnot json\n')
+        fh.write('{"seq": 3, "note_id": 2, "body": "after"}\n')
+    assert SaveJournal(path).pending() == {1: (1, "kept"), 2: (3, "after")}
+
+
+def test_unreplayable_journal_is_set_aside(tmp_path, monkeypatch):
+    db_file = tmp_path / "bad.db"
+    (a,) = _notes(db_file, "a")
+    path = db_file.with_name(db_file.name + journal.JOURNAL_SUFFIX)
+    log = SaveJournal(path)
+    log.append(a, "edit")
+    log.close()
+
+    def failing_update(rows, **kwargs):
+        raise RuntimeError("database is broken")
+
+    monkeypatch.setattr(repository, "update_notes", failing_update)
+    wb = journal.get_write_behind(db_file)
+    try:
+        assert wb.recovered == 0
+        assert not path.exists()
+        assert "edit" in path.with_name(path.name + ".bad").read_text()
+    finally:
+        monkeypatch.undo()
+        journal.close_all()
+
+
+def test_queued_snapshot_keeps_a_later_rename(tmp_path):
+    db_file = tmp_path / "rename.db"
+    (a,) = _notes(db_file, "old title")
+    wb = WriteBehind(db_file, interval=60.0)
+    try:
+        wb.submit(a, "edited body")
+        with db.get_manager(db_file).writer() as w:
+            repository.rename_note(a, "new title", conn=w)
+        assert wb.flush(timeout=5.0)
+    finally:
+        wb.close()
+    with db.get_manager(db_file).reader() as conn:
+        note = repository.get_note(a, conn=conn)
+    assert (note["title"], note["body"]) == ("new title", "edited body")
@@ -0,0 +1,32 @@
+import pytest
+
+from storage import repository
+
+
+def test_keyset_pages_cover_notebook_once(conn):
+    nb = repository.create_notebook("Big", conn=conn)
+    ids = repository.create_notes([(f"n{i}", "x" * 1000, nb) for i in range(7)], conn=conn)
+    repository.create_note("elsewhere", "", conn=conn)
+    # Same-second timestamps: the id tie-break must still order pages.
+    conn.execute("UPDATE notes SET updated_ts = 100 WHERE id IN (?, ?, ?)", ids[:3])
+    conn.commit()
+    seen, cursor = [], None
+    while True:
+        page = repository.list_notes(nb, columns=("id", "title"), limit=3, cursor=cursor, conn=conn)
+        seen.extend(page.records)
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+    assert [r.id for r in seen] == ids[3:][::-1] + ids[:3][::-1]
+    assert seen[0]._fields == ("id", "title")
+    assert not hasattr(seen[0], "__dict__")
+
+
+def test_projection_and_filters(conn):
+    nb = repository.create_notebook("A", conn=conn)
+    inside = repository.create_note("in", "body", nb, conn=conn)
+    loose = repository.create_note("loose", "body", conn=conn)
+    assert [r.title for r in repository.list_notes(None, columns=("title",), conn=conn).records] == ["loose"]
+    assert {r.id for r in repository.list_notes(conn=conn).records} == {inside, loose}
+    with pytest.raises(ValueError):
+        repository.list_notes(columns=("id", "body"), conn=conn)
@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from desktop_app.live_search import LiveSearch
+from storage import db, migrations, repository
+
+
+class FakeWidget:
+    """Stand-in for a Tk widget: runs `after()` callbacks immediately."""
+
+    def after(self, ms, fn, *args):
+        fn(*args)
+        return "after#1"
+
+    def after_cancel(self, after_id):
+        pass
+
+
+def test_prefix_query():
+    assert repository.prefix_query("hel wor") == '"hel"* "wor"*'
+    assert repository.prefix_query('a "b" (c') == '"a"* "b"* "c"*'
+    assert repository.prefix_query("  ") == ""
+
+
+def test_notes_fts_has_prefix_index(tmp_path):
+    db_file = tmp_path / "p.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    try:
+        sql = conn.execute("SELECT sql FROM sqlite_master WHERE name='notes_fts'").fetchone()[0]
+        assert "prefix='2 3 4'" in sql
+        nid = repository.create_note("Hello world", "partial words", conn=conn)
+        page = repository.search_notes(repository.prefix_query("wor par"), conn=conn)
+        assert [h.id for h in page.hits] == [nid]
+    finally:
+        conn.close()
+
+
+def test_live_search_delivers_results(tmp_path):
+    db_file = tmp_path / "live.db"
+    with db.get_manager(db_file).writer() as w:
+        nid = repository.create_note("Hello world", "x", conn=w)
+    got = threading.Event()
+    results = []
+
+    def on_results(text, page):
+        results.append((text, [h.id for h in page.hits]))
+        got.set()
+
+    live = LiveSearch(FakeWidget(), on_results, db_path=db_file)
+    try:
+        live.schedule("hel")
+        assert got.wait(5)
+        assert results == [("hel", [nid])]
+    finally:
+        live.close()
+        db.close_all()
+
+
+def test_search_notes_reraises_interrupt(conn):
+    repository.create_note("Hello world", "x", conn=conn)
+    conn.set_progress_handler(lambda: conn.interrupt(), 1)
+    try:
+        with pytest.raises(sqlite3.OperationalError, match="interrupt"):
+            repository.search_notes(repository.prefix_query("hel"), conn=conn)
+    finally:
+        conn.set_progress_handler(None, 0)
+
+
+def test_prefix_and_blank_queries_skip_substring_fallback(conn):
+    repository.create_note("spaced   out", "   ", conn=conn)
+    assert not repository._wants_substring(repository.prefix_query("qq zz"))
+    assert repository._wants_substring("foo.bar(baz)")
+    # Without the guard, LIKE '%   %' would match this note.
+    assert repository.search_notes("   ", conn=conn).total == 0
+    assert repository.search("   ", conn=conn) == []
+
+
+def test_newer_query_interrupts_running_one(tmp_path):
+    db_file = tmp_path / "interrupt.db"
+    with db.get_manager(db_file).writer() as w:
+        repository.create_note("slow note", "x", conn=w)
+        fast_id = repository.create_note("fast note", "x", conn=w)
+    started = threading.Event()
+    done = threading.Event()
+    outcomes = []
+
+    def stall():
+        started.set()
+        time.sleep(0.01)  # keeps the statement running until interrupt()
+        return 0
+
+    def search_fn(text, conn):
+        if text == "slow":
+            conn.set_progress_handler(stall, 1)
+        try:
+            return live._default_search(text, conn)
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    def on_results(text, page):
+        outcomes.append((text, [h.id for h in page.hits]))
+        done.set()
+
+    live = LiveSearch(FakeWidget(), on_results, db_path=db_file, search_fn=search_fn)
+    try:
+        live.submit("slow")
+        assert started.wait(5)
+        live.submit("fast")
+        assert done.wait(5)
+        time.sleep(0.2)  # an interrupted "slow" must not deliver late
+        assert outcomes == [("fast", [fast_id])]
+    finally:
+        live.close()
+        db.close_all()
+
+
+def test_submit_with_own_callback_cancels_pending_keystroke(tmp_path):
+    db_file = tmp_path / "enter.db"
+    with db.get_manager(db_file).writer() as w:
+        nid = repository.create_note("Hello world", "x", conn=w)
+
+    class QueuedWidget(FakeWidget):
+        def __init__(self):
+            self.timers = {}
+
+        def after(self, ms, fn, *args):
+            if ms:
+                self.timers["t"] = (fn, args)
+                return "t"
+            return super().after(ms, fn, *args)
+
+        def after_cancel(self, after_id):
+            self.timers.pop(after_id, None)
+
+    got = threading.Event()
+    typed, entered = [], []
+
+    def on_enter(text, page):
+        entered.append((text, [h.id for h in page.hits]))
+        got.set()
+
+    widget = QueuedWidget()
+    live = LiveSearch(widget, lambda text, page: typed.append(text), db_path=db_file)
+    try:
+        live.schedule("hel")
+        live.submit(
+            "hello",
+            on_results=on_enter,
+            search_fn=lambda text, conn: repository.search_notes(text, limit=1, conn=conn),
+        )
+        assert widget.timers == {}
+        assert got.wait(5)
+        assert entered == [("hello", [nid])]
+        assert typed == []
+    finally:
+        live.close()
+        db.close_all()
@@ -1,4 +1,8 @@
+import sqlite3
 import tempfile
+
+import pytest
+
 from storage import migrations
 
 
@@ -6,3 +10,109 @@ def test_migrate_creates_db(tmp_path):
     db_file = tmp_path / "test.db"
     migrations.migrate(str(db_file))
     assert db_file.exists()
+
+
+def test_migrate_records_user_version(tmp_path):
+    db_file = tmp_path / "v.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    try:
+        assert migrations.current_version(conn) == migrations.schema_version()
+    finally:
+        conn.close()
+
+
+def test_migrate_fast_path_skips_current_schema(tmp_path):
+    db_file = tmp_path / "fast.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    try:
+        # If the steps re-ran, the IF NOT EXISTS DDL would recreate this table.
+        conn.execute("DROP TABLE recent")
+        conn.commit()
+        migrations.migrate_connection(conn)
+        row = conn.execute("SELECT name FROM sqlite_master WHERE name='recent'").fetchone()
+        assert row is None
+    finally:
+        conn.close()
+
+
+def test_migrate_upgrades_unversioned_database(tmp_path):
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(str(db_file))
+    try:
+        conn.executescript(migrations.INITIAL_SQL)
+        conn.execute("INSERT INTO notes (title, body) VALUES ('t', 'b')")
+        conn.commit()
+        assert migrations.current_version(conn) == 0
+        migrations.migrate_connection(conn)
+        assert migrations.current_version(conn) == migrations.schema_version()
+        assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 1
+    finally:
+        conn.close()
+
+
+def test_failed_step_rolls_back(tmp_path, monkeypatch):
+    def broken(conn):
+        conn.execute("CREATE TABLE half_done (x INTEGER)")
+        raise RuntimeError("boom")
+
+    target = migrations.schema_version()
+    monkeypatch.setattr(migrations, "MIGRATIONS", migrations.MIGRATIONS + [(target + 1, "broken", broken)])
+    conn = sqlite3.connect(str(tmp_path / "broken.db"))
+    try:
+        with pytest.raises(RuntimeError):
+            migrations.migrate_connection(conn)
+        assert migrations.current_version(conn) == target
+        row = conn.execute("SELECT name FROM sqlite_master WHERE name='half_done'").fetchone()
+        assert row is None
+    finally:
+        conn.close()
+
+
+def test_fast_path_is_one_pragma_read_and_keeps_caller_transaction(tmp_path):
+    db_file = tmp_path / "tx.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    try:
+        conn.execute("INSERT INTO notebooks (name) VALUES ('pending')")
+        assert conn.in_transaction
+        statements = []
+        conn.set_trace_callback(statements.append)
+        migrations.migrate_connection(conn)
+        conn.set_trace_callback(None)
+        assert statements == ["PRAGMA user_version"]
+        assert conn.in_transaction
+        conn.rollback()
+        assert conn.execute("SELECT COUNT(*) FROM notebooks").fetchone()[0] == 0
+    finally:
+        conn.close()
+
+
+def test_pending_migrations_refuse_an_open_transaction(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / "open.db"))
+    try:
+        conn.execute("CREATE TABLE scratch (x INTEGER)")
+        conn.execute("INSERT INTO scratch VALUES (1)")
+        with pytest.raises(RuntimeError):
+            migrations.migrate_connection(conn)
+        assert conn.in_transaction
+    finally:
+        conn.close()
+
+
+def test_suspended_flag_does_not_change_the_version(tmp_path, monkeypatch):
+    db_file = tmp_path / "flag.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    try:
+        conn.execute("BEGIN")
+        migrations.suspend_index_triggers(conn)
+        conn.commit()
+        assert migrations.current_version(conn) == migrations.schema_version()
+        monkeypatch.setattr(migrations, "_suspended", set())
+        migrations.migrate_connection(conn)
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == migrations.schema_version()
+        assert not migrations._tables_missing_triggers(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,45 @@
+import pytest
+
+from storage import repository
+
+
+def _changes(conn, fn):
+    """Rows written by `fn`, triggers included."""
+    before = conn.total_changes
+    fn()
+    return conn.total_changes - before
+
+
+def test_metadata_updates_skip_fulltext_triggers(conn):
+    if not repository._has_fts(conn):
+        pytest.skip("SQLite build lacks FTS5")
+    nid = repository.create_note("Title", "body text", conn=conn)
+    nb = repository.create_notebook("Work", conn=conn)
+    assert _changes(conn, lambda: repository.set_notebook(nid, nb, conn=conn)) == 1
+    assert _changes(conn, lambda: repository.set_generated_metadata(nid, generated_summary="sum", conn=conn)) == 1
+    # Same text written again: the WHEN clause keeps the index untouched.
+    assert _changes(conn, lambda: repository.update_note(nid, "Title", "body text", conn=conn)) == 1
+    assert _changes(conn, lambda: repository.rename_note(nid, "Renamed", conn=conn)) > 1
+    assert [r["id"] for r in repository.search("Renamed", conn=conn)] == [nid]
+
+
+def test_column_setters_write_only_their_columns(conn):
+    nid = repository.create_note("Title", "body", conn=conn)
+    nb = repository.create_notebook("Work", conn=conn)
+    assert repository.set_notebook(nid, nb, conn=conn)
+    assert repository.set_generated_metadata(nid, generated_title="Gen", ai_generated_title=True, conn=conn)
+    assert repository.set_generated_metadata(nid, generated_summary="Sum", conn=conn)
+    assert repository.rename_note(nid, "New", conn=conn)
+    note = repository.get_note(nid, conn=conn)
+    assert (note["title"], note["body"], note["notebook_id"]) == ("New", "body", nb)
+    assert (note["generated_title"], note["generated_summary"], note["ai_generated_title"]) == ("Gen", "Sum", 1)
+    assert repository.set_generated_metadata(nid, generated_title=None, conn=conn)
+    assert repository.get_note(nid, conn=conn)["generated_title"] is None
+    assert not repository.set_generated_metadata(nid, conn=conn)
+    assert not repository.rename_note(nid + 100, "missing", conn=conn)
+
+
+def test_migration_rewrites_update_triggers(conn):
+    for (sql,) in conn.execute("SELECT sql FROM sqlite_master WHERE type='trigger' AND name LIKE 'notes_ai_%update'"):
+        assert "UPDATE OF title, body" in sql
+        assert "old.body IS NOT new.body" in sql
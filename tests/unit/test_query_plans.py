@@ -0,0 +1,79 @@
+"""EXPLAIN QUERY PLAN regression: repository queries must not full-scan tables."""
+import re
+import sqlite3
+
+import pytest
+
+from storage import migrations, repository
+
+# `SCAN t` without `USING ... INDEX` reads the whole table.
+_full_scan = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+# Schema and AUTOINCREMENT bookkeeping tables hold a handful of rows.
+_allowed = {"sqlite_master", "sqlite_schema", "sqlite_sequence"}
+
+
+@pytest.fixture
+def traced(tmp_path):
+    db_file = tmp_path / "plans.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    conn.row_factory = sqlite3.Row
+    statements = []
+    conn.set_trace_callback(statements.append)
+    yield conn, statements
+    conn.close()
+
+
+def _full_scans(conn, statements):
+    conn.set_trace_callback(None)
+    offenders = []
+    for sql in statements:
+        head = sql.lstrip().split(None, 1)[0].upper()
+        if head not in ("SELECT", "UPDATE", "DELETE", "WITH"):
+            continue
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+            m = _full_scan.match(row[3])
+            if m and m.group(1) not in _allowed:
+                offenders.append((row[3], sql))
+    return offenders
+
+
+def test_repository_queries_use_indexes(traced):
+    conn, statements = traced
+    nb = repository.create_notebook("Work", conn=conn)
+    ids = repository.create_notes([("Alpha plan", "first body", nb), ("Beta", "second body", nb)], conn=conn)
+    repository.add_tags(ids, ["project"], conn=conn)
+    repository.add_tag_to_note(ids[0], "urgent", conn=conn)
+    repository.get_note(ids[0], conn=conn)
+    repository.get_tags_for_note(ids[0], conn=conn)
+    repository.get_tags_for_notes(ids, conn=conn)
+    repository.list_tags(prefix="pro", limit=10, conn=conn)
+    repository.find_notes_by_tags("project NOT urgent", conn=conn)
+    repository.rename_note(ids[0], "Alpha", conn=conn)
+    repository.set_notebook(ids[1], None, conn=conn)
+    repository.update_note(ids[1], "Beta", "changed", conn=conn)
+    repository.convert_to_chunked(ids[1], [(1, "a"), (2, "b")], conn=conn)
+    repository.update_note_chunks(ids[1], {1: "A"}, deletes=[2], conn=conn)
+    repository.get_note(ids[1], conn=conn)
+    repository.touch_recent(ids[0], conn=conn)
+    repository.list_recent(conn=conn)
+    page = repository.list_notes(nb, limit=1, conn=conn)
+    repository.list_notes(nb, limit=1, cursor=page.next_cursor, conn=conn)
+    repository.list_notes(None, conn=conn)
+    list(repository.iter_notes(batch_size=1, since="2000-01-01 00:00:00", conn=conn))
+    if repository._has_fts(conn):
+        repository.search_notes("alpha", conn=conn)
+    repository.delete_note(ids[1], conn=conn)
+    assert _full_scans(conn, statements) == []
+
+
+def test_epoch_columns_follow_text_timestamps(traced):
+    conn, _ = traced
+    nid = repository.create_note("t", "b", conn=conn)
+    # Raw SQL writers are covered by the guarded triggers.
+    conn.execute("INSERT INTO notes (title, body, created_at, updated_at) VALUES ('raw', '', '2024-01-02 03:04:05', '2024-01-02 03:04:05')")
+    conn.execute("UPDATE notes SET updated_at = '2024-02-01 00:00:00' WHERE id = ?", (nid,))
+    rows = conn.execute(
+        "SELECT updated_ts = CAST(strftime('%s', updated_at) AS INTEGER), created_ts = CAST(strftime('%s', created_at) AS INTEGER) FROM notes"
+    ).fetchall()
+    assert [tuple(r) for r in rows] == [(1, 1), (1, 1)]
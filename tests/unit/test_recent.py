@@ -0,0 +1,82 @@
+import sqlite3
+
+from storage import migrations, repository
+
+
+def _open(db_file):
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def test_touch_recent_upserts_and_prunes(tmp_path):
+    conn = _open(tmp_path / "recent.db")
+    ids = [repository.create_note(f"Note {i}", "", conn=conn) for i in range(5)]
+    for nid in ids:
+        repository.touch_recent(nid, cap=3, conn=conn)
+    repository.touch_recent(ids[2], cap=3, conn=conn)
+    recent = repository.list_recent(conn=conn)
+    assert [r["id"] for r in recent] == [ids[2], ids[4], ids[3]]
+    assert recent[0]["title"] == "Note 2"
+    assert conn.execute("SELECT count(*) FROM recent").fetchone()[0] == 3
+    conn.close()
+
+
+def test_recent_order_survives_clock_going_back(tmp_path):
+    conn = _open(tmp_path / "clock.db")
+    a, b = (repository.create_note(t, "", conn=conn) for t in "ab")
+    repository.touch_recent(a, conn=conn)
+    repository.touch_recent(b, conn=conn)
+    # As if the clock stepped back between the two opens.
+    conn.execute("UPDATE recent SET last_opened_at = '2000-01-01 00:00:00.000' WHERE note_id = ?", (b,))
+    assert [r["id"] for r in repository.list_recent(conn=conn)] == [b, a]
+    now = conn.execute("SELECT strftime('%Y-%m-%d %H:%M:%f', 'now')").fetchone()[0]
+    assert all(r["last_opened_at"] <= now for r in repository.list_recent(conn=conn))
+    conn.close()
+
+
+def test_list_recent_uses_index(tmp_path):
+    conn = _open(tmp_path / "plan.db")
+    plan = " ".join(
+        r[3]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT r.note_id, n.title, r.last_opened_at FROM recent r "
+            "JOIN notes n ON n.id = r.note_id ORDER BY r.open_seq DESC LIMIT 20"
+        )
+    )
+    assert "idx_recent_open_seq" in plan
+    assert "TEMP B-TREE" not in plan
+    conn.close()
+
+
+def test_migration_deduplicates_legacy_rows(tmp_path):
+    db_file = tmp_path / "legacy.db"
+    conn = sqlite3.connect(str(db_file))
+    conn.executescript(migrations.INITIAL_SQL)
+    conn.execute("PRAGMA foreign_keys = OFF")  # older connections never enabled it
+    conn.execute("INSERT INTO notes (title, body) VALUES ('a', '')")
+    conn.executemany(
+        "INSERT INTO recent (note_id, last_opened_at) VALUES (?, ?)",
+        [(1, "2024-01-01 00:00:00"), (1, "2024-01-03 00:00:00"), (1, "2024-01-02 00:00:00"), (99, "2024-01-04 00:00:00")],
+    )
+    conn.commit()
+    migrations.migrate_connection(conn)
+    assert conn.execute("SELECT note_id, last_opened_at, open_seq FROM recent").fetchall() == [(1, "2024-01-03 00:00:00", 1)]
+    conn.close()
+
+
+def test_migration_numbers_existing_rows(tmp_path):
+    db_file = tmp_path / "seq.db"
+    conn = sqlite3.connect(str(db_file))
+    conn.executescript(migrations.INITIAL_SQL)
+    conn.executemany("INSERT INTO notes (title, body) VALUES (?, '')", [("a",), ("b",), ("c",)])
+    conn.executemany(
+        "INSERT INTO recent (note_id, last_opened_at) VALUES (?, ?)",
+        [(1, "2024-01-02 00:00:00"), (2, "2024-01-03 00:00:00"), (3, "2024-01-01 00:00:00")],
+    )
+    conn.commit()
+    migrations.migrate_connection(conn)
+    conn.row_factory = sqlite3.Row
+    assert [r["id"] for r in repository.list_recent(conn=conn)] == [2, 1, 3]
+    conn.close()
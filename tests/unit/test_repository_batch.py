@@ -0,0 +1,41 @@
+import pytest
+
+from storage import repository
+
+
+def test_create_notes_returns_ids_in_order(conn):
+    first = repository.create_note("Existing", "x", conn=conn)
+    ids = repository.create_notes([("A", "a"), ("B", "b", None), {"title": "C", "body": "c"}], conn=conn)
+    assert ids == [first + 1, first + 2, first + 3]
+    assert [repository.get_note(i, conn=conn)["title"] for i in ids] == ["A", "B", "C"]
+
+
+def test_add_tags_and_update_notes(conn):
+    ids = repository.create_notes([("A", "a"), ("B", "b")], conn=conn)
+    tag_ids = repository.add_tags(ids, ["Foo", " foo ", "Bar"], conn=conn)
+    assert len(tag_ids) == 2
+    assert repository.get_tags_for_note(ids[1], conn=conn) == ["bar", "foo"]
+
+    changed = repository.update_notes([(ids[0], "A2", "a2"), (ids[1], "B2", "b2"), (999, "x", "y")], conn=conn)
+    assert changed == 2
+    assert repository.get_note(ids[0], conn=conn)["body"] == "a2"
+
+
+def test_transaction_rolls_back_on_error(conn):
+    with pytest.raises(RuntimeError):
+        with repository.transaction(conn):
+            repository.create_note("Doomed", "x", conn=conn)
+            repository.add_tag_to_note(1, "t", conn=conn)
+            raise RuntimeError("abort")
+    assert conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM tags").fetchone()[0] == 0
+
+
+def test_transaction_commits_once(conn):
+    with repository.transaction(conn) as tx:
+        nid = repository.create_note("T", "B", conn=tx)
+        repository.add_tag_to_note(nid, "x", conn=tx)
+        # nothing is committed until the block exits
+        assert tx.in_transaction
+    assert not conn.in_transaction
+    assert repository.get_tags_for_note(nid, conn=conn) == ["x"]
@@ -0,0 +1,45 @@
+from storage import repository
+
+
+def _seed(conn):
+    return repository.create_notes(
+        [
+            ("Shopping", "buy apples and pears " * 20),
+            ("Apple pie recipe", "flour, butter, sugar"),
+            ("Orchard", "apple apple apple trees"),
+            ("Unrelated", "nothing to see"),
+        ],
+        conn=conn,
+    )
+
+
+def test_title_match_ranks_first_with_snippets(conn):
+    ids = _seed(conn)
+    page = repository.search_notes("apple", marks=("<", ">"), conn=conn)
+    assert page.total == 2
+    assert [h.id for h in page.hits] == [ids[1], ids[2]]
+    assert page.hits[0].title_highlight == "<Apple> pie recipe"
+    assert "<apple>" in page.hits[1].snippet
+    assert not hasattr(page.hits[0], "body")
+
+
+def test_keyset_and_offset_paging_agree(conn):
+    repository.create_notes([(f"note {i}", "common word") for i in range(5)], conn=conn)
+    first = repository.search_notes("common", limit=2, conn=conn)
+    assert first.total == 5 and first.next_cursor
+    second = repository.search_notes("common", limit=2, cursor=first.next_cursor, conn=conn)
+    by_offset = repository.search_notes("common", limit=2, offset=2, conn=conn)
+    assert [h.id for h in second.hits] == [h.id for h in by_offset.hits]
+    seen = [h.id for h in first.hits + second.hits]
+    third = repository.search_notes("common", limit=2, cursor=second.next_cursor, conn=conn)
+    assert len(third.hits) == 1 and third.next_cursor is None
+    assert len(set(seen + [third.hits[0].id])) == 5
+
+
+def test_invalid_fts_query_falls_back_to_substring(conn):
+    ids = _seed(conn)
+    page = repository.search_notes('pie "', conn=conn)
+    assert page.total == 0
+    page = repository.search_notes("flour,", conn=conn)
+    assert [h.id for h in page.hits] == [ids[1]]
+    assert "[flour,]" in page.hits[0].snippet
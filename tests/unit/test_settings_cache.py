@@ -0,0 +1,91 @@
+import dataclasses
+import os
+import threading
+
+import pytest
+
+from config import settings
+
+
+@pytest.fixture
+def counted(monkeypatch, tmp_path):
+    """Point `.env` lookup at a temp file and count full Settings loads."""
+    dotenv = tmp_path / ".env"
+    dotenv.write_text("AZURE_OPENAI_DEPLOYMENT=from-dotenv\n")
+    monkeypatch.setattr(settings, "_dotenv_candidates", lambda: [dotenv])
+    monkeypatch.setenv("AZURE_OPENAI_ENDPOINT", "https://example")
+    monkeypatch.setenv("AZURE_OPENAI_DEPLOYMENT", "placeholder")  # restored after the test
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "secret")
+    calls = {"n": 0}
+    real = settings.Settings
+
+    class Counting(real):
+        def __init__(self):
+            calls["n"] += 1
+            super().__init__()
+
+    monkeypatch.setattr(settings, "Settings", Counting)
+    settings.invalidate_settings()
+    yield dotenv, calls
+    settings.invalidate_settings()
+
+
+def test_snapshot_is_cached_and_immutable(counted):
+    _, calls = counted
+    first = settings.get_settings()
+    assert settings.get_settings() is first
+    assert calls["n"] == 1
+    assert first.azure_openai_deployment == "from-dotenv"
+    assert "secret" not in repr(first)
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.azure_openai_endpoint = "other"
+
+
+def test_invalidation_sources(counted, monkeypatch):
+    dotenv, calls = counted
+    first = settings.get_settings()
+    settings.invalidate_settings()
+    assert settings.get_settings() is not first and calls["n"] == 2
+
+    monkeypatch.setenv("AZURE_OPENAI_API_VERSION", "2099-01-01")
+    assert settings.get_settings().azure_openai_api_version == "2099-01-01"
+    assert calls["n"] == 3
+
+    monkeypatch.setattr(settings, "DOTENV_CHECK_INTERVAL", 0.0)
+    settings.get_settings()
+    assert calls["n"] == 3
+    dotenv.write_text("AZURE_OPENAI_DEPLOYMENT=edited\n")
+    stat = dotenv.stat()
+    os.utime(dotenv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert settings.get_settings().azure_openai_deployment == "edited"
+    assert calls["n"] == 4
+
+
+def test_rebuild_runs_outside_the_lock(counted, monkeypatch):
+    _, calls = counted
+    entered, release = threading.Event(), threading.Event()
+    real = settings.Settings
+
+    class Slow(real):
+        def __init__(self):
+            if not entered.is_set():
+                entered.set()
+                assert release.wait(5)
+            super().__init__()
+
+    monkeypatch.setattr(settings, "Settings", Slow)
+    slow = threading.Thread(target=settings.get_settings)
+    slow.start()
+    try:
+        assert entered.wait(5)
+        # Neither invalidating nor another caller waits on the slow build.
+        settings.invalidate_settings()
+        fresh = settings.get_settings()
+        assert calls["n"] == 1
+        assert slow.is_alive()
+    finally:
+        release.set()
+        slow.join(5)
+    # The slow build raced with invalidate_settings(), so it was not cached.
+    assert settings.get_settings() is fresh
+    assert calls["n"] == 2
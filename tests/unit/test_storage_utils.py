@@ -1,4 +1,5 @@
 import tempfile
+import time
 from pathlib import Path
 import importlib
 
@@ -46,3 +47,89 @@ def test_keyring_mocked(monkeypatch):
     assert method == "keyring"
     assert utils.get_api_key("svc", "u") == secret
     assert utils.delete_api_key("svc", "u")
+
+
+def _count_derivations(monkeypatch):
+    calls = {"n": 0}
+    real = utils._derive_key
+
+    def counting(passphrase, salt, iterations=1000):
+        calls["n"] += 1
+        return real(passphrase, salt, iterations=1000)
+
+    monkeypatch.setattr(utils, "_derive_key", counting)
+    return calls
+
+
+def test_derived_key_cache_reuses_key_until_salt_changes(tmp_path, monkeypatch):
+    calls = _count_derivations(monkeypatch)
+    monkeypatch.setattr(utils, "key_cache", utils.DerivedKeyCache())
+    path = tmp_path / "secret.json"
+    utils._store_encrypted_file(path, "s1", "pw")
+    assert [utils._load_encrypted_file(path, "pw") for _ in range(3)] == ["s1"] * 3
+    assert calls["n"] == 1
+    # A wrong passphrase derives its own key and is not cached.
+    assert utils._load_encrypted_file(path, "nope") is None
+    assert calls["n"] == 2 and len(utils.key_cache) == 0
+    utils._load_encrypted_file(path, "pw")
+    assert calls["n"] == 3
+    # Rewriting the file picks a new salt, so the old key is replaced.
+    utils._store_encrypted_file(path, "s2", "pw")
+    assert utils._load_encrypted_file(path, "pw") == "s2"
+    assert calls["n"] == 4
+
+
+def test_derived_key_cache_lock_wipe_and_idle_expiry(tmp_path, monkeypatch):
+    calls = _count_derivations(monkeypatch)
+    now = {"t": 0.0}
+    cache = utils.DerivedKeyCache(idle_ttl=60.0, clock=lambda: now["t"])
+    monkeypatch.setattr(utils, "key_cache", cache)
+    path = tmp_path / "secret.json"
+    utils._store_encrypted_file(path, "s", "pw")
+    entry = next(iter(cache._entries.values()))
+    cache.wipe()
+    assert len(cache) == 0 and not any(entry.key)
+
+    utils._load_encrypted_file(path, "pw")
+    now["t"] = 30.0
+    utils._load_encrypted_file(path, "pw")
+    assert calls["n"] == 2
+    now["t"] = 100.0
+    utils._load_encrypted_file(path, "pw")
+    assert calls["n"] == 3
+
+    cache.lock()
+    assert cache.locked and len(cache) == 0
+    utils._load_encrypted_file(path, "pw")
+    utils._load_encrypted_file(path, "pw")
+    assert calls["n"] == 5 and len(cache) == 0
+    cache.unlock()
+    utils._load_encrypted_file(path, "pw")
+    utils._load_encrypted_file(path, "pw")
+    assert calls["n"] == 6
+
+
+def test_derived_key_cache_timer_wipes_idle_keys(tmp_path, monkeypatch):
+    cache = utils.DerivedKeyCache(idle_ttl=0.05)
+    monkeypatch.setattr(utils, "key_cache", cache)
+    path = tmp_path / "secret.json"
+    utils._store_encrypted_file(path, "s", "pw")
+    entry = next(iter(cache._entries.values()))
+    # Nothing touches the cache again; the timer alone must wipe the key.
+    deadline = time.monotonic() + 5
+    while len(cache) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(cache) == 0 and not any(entry.key)
+    assert cache._timer is None
+
+
+def test_key_cache_idle_ttl_comes_from_settings(monkeypatch):
+    from config import settings
+
+    monkeypatch.setattr(settings, "_load_dotenv", lambda: None)
+    monkeypatch.setenv("AI_NOTEPAD_KEY_CACHE_IDLE_TTL", "120")
+    assert utils.configured_idle_ttl() == 120.0
+    monkeypatch.setenv("AI_NOTEPAD_KEY_CACHE_IDLE_TTL", "soon")
+    assert utils.configured_idle_ttl() == utils.KEY_CACHE_IDLE_TTL
+    monkeypatch.delenv("AI_NOTEPAD_KEY_CACHE_IDLE_TTL")
+    assert utils.configured_idle_ttl() == utils.KEY_CACHE_IDLE_TTL
@@ -1,4 +1,5 @@
 import sqlite3
+import pytest
 from storage import migrations, repository, utils
 
 def test_normalize_tags():
@@ -17,3 +18,52 @@ def test_tag_crud(tmp_path):
         assert tags == ["foo"]
     finally:
         conn.close()
+
+
+def _tagged_db(tmp_path):
+    db_file = tmp_path / "tags.db"
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    conn.row_factory = sqlite3.Row
+    a, b, c, d = (repository.create_note(t, "", conn=conn) for t in "abcd")
+    repository.add_tags([a, b, c], ["work"], conn=conn)
+    repository.add_tags([a, b], ["urgent"], conn=conn)
+    repository.add_tags([b, d], ["archived"], conn=conn)
+    repository.add_tag_to_note(c, "Bar Baz", conn=conn)
+    return conn, (a, b, c, d)
+
+
+def test_tag_expressions(tmp_path):
+    conn, (a, b, c, d) = _tagged_db(tmp_path)
+
+    def ids(expr):
+        return sorted(r["id"] for r in repository.find_notes_by_tags(expr, conn=conn))
+
+    try:
+        assert ids("work AND urgent NOT archived") == [a]
+        assert ids("work urgent") == [a, b]
+        assert ids("urgent OR archived") == [a, b, d]
+        assert ids("NOT work") == [d]
+        assert ids('(urgent or "bar baz") and not archived') == [a, c]
+        assert ids("missing") == []
+        for bad in ("", "work AND", "(work", "work )"):
+            with pytest.raises(ValueError):
+                repository.find_notes_by_tags(bad, conn=conn)
+    finally:
+        conn.close()
+
+
+def test_tag_counts_follow_note_tags(tmp_path):
+    conn, (a, b, c, d) = _tagged_db(tmp_path)
+    try:
+        counts = {t["name"]: t["note_count"] for t in repository.list_tags(conn=conn)}
+        assert counts == {"work": 3, "urgent": 2, "archived": 2, "bar baz": 1}
+        repository.add_tags([a], ["work"], conn=conn)  # already tagged: no change
+        conn.execute("PRAGMA foreign_keys = ON")  # deletes cascade to note_tags
+        repository.delete_note(b, conn=conn)
+        repository.delete_note(c, conn=conn)
+        counts = {t["name"]: t["note_count"] for t in repository.list_tags(conn=conn)}
+        assert counts == {"work": 1, "urgent": 1, "archived": 1}
+        assert [t["name"] for t in repository.list_tags(prefix="Ur", conn=conn)] == ["urgent"]
+    finally:
+        conn.close()
@@ -0,0 +1,90 @@
+import sqlite3
+
+import pytest
+
+from storage import migrations, repository, trigram
+
+
+def _open(db_file):
+    migrations.migrate(db_file)
+    conn = sqlite3.connect(str(db_file))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+@pytest.fixture(params=["native", "side_table"])
+def conn(request, tmp_path, monkeypatch):
+    if request.param == "side_table":
+        monkeypatch.setattr(migrations, "trigram_tokenizer_available", lambda conn: False)
+    elif not migrations.trigram_tokenizer_available(sqlite3.connect(":memory:")):
+        pytest.skip("SQLite build lacks the FTS5 trigram tokenizer")
+    c = _open(tmp_path / f"{request.param}.db")
+    assert trigram.native_available(c) == (request.param == "native")
+    assert trigram.side_table_available(c) == (request.param == "side_table")
+    yield c
+    c.close()
+
+
+def test_trigrams():
+    assert trigram.trigrams("AbcD") == {"abc", "bcd"}
+    assert trigram.trigrams("ab") == set()
+
+
+def test_substring_search_uses_index(conn):
+    a = repository.create_note("code", "def getHandlerFor(x): pass", conn=conn)
+    b = repository.create_note("other", "nothing here", conn=conn)
+    predicate, _ = trigram.candidate_filter(conn, "andlerF")
+    assert predicate != "1"
+    assert trigram.substring_ids(conn, "andlerF") == [a]
+    # partial identifiers that FTS tokens can't match still hit
+    page = repository.search_notes("andlerF", conn=conn)
+    assert [h.id for h in page.hits] == [a]
+    assert [r["id"] for r in repository.search("andlerF", conn=conn)] == [a]
+
+    repository.update_note(b, "other", "now mentions getHandlerFor too", conn=conn)
+    assert trigram.substring_ids(conn, "andlerF") == [a, b]
+    repository.delete_note(a, conn=conn)
+    assert trigram.substring_ids(conn, "andlerF") == [b]
+
+
+def test_batch_writes_are_indexed(conn):
+    ids = repository.create_notes([("one", "xyzzy-one"), ("two", "plugh")], conn=conn)
+    assert trigram.substring_ids(conn, "zzy-o") == [ids[0]]
+    repository.update_notes([(ids[1], "two", "xyzzy-two")], conn=conn)
+    assert trigram.substring_ids(conn, "xyzzy") == ids
+
+
+def test_delete_clears_side_table_without_cascade(conn):
+    if not trigram.side_table_available(conn):
+        pytest.skip("native trigram index is maintained by triggers")
+    conn.execute("PRAGMA foreign_keys = OFF")
+    nid = repository.create_note("gone", "xyzzy", conn=conn)
+    repository.delete_note(nid, conn=conn)
+    assert conn.execute("SELECT count(*) FROM note_trigrams").fetchone()[0] == 0
+
+
+def test_like_wildcards_in_query_are_literal(conn):
+    a = repository.create_note("sale", "5% off", conn=conn)
+    repository.create_note("stats", "50 percent", conn=conn)
+    b = repository.create_note("names", "x_y", conn=conn)
+    repository.create_note("words", "xay", conn=conn)
+    assert [h.id for h in repository.search_notes("5%", conn=conn).hits] == [a]
+    assert trigram.substring_ids(conn, "5%") == [a]
+    assert trigram.substring_ids(conn, "x_y") == [b]
+
+
+def test_native_filter_reads_chunked_notes_from_partial_index(conn):
+    if not trigram.native_available(conn):
+        pytest.skip("side table indexes chunks itself")
+    predicate, params = trigram.candidate_filter(conn, "xyzzy")
+    plan = " ".join(r[3] for r in conn.execute(f"EXPLAIN QUERY PLAN SELECT id FROM notes WHERE {predicate}", params))
+    assert "idx_notes_chunked" in plan
+    assert "note_chunks" not in plan.replace("idx_notes_chunked", "")
+
+
+def test_fuzzy_search_tolerates_typos(conn):
+    target = repository.create_note("Apple pie recipe", "grandma's", conn=conn)
+    repository.create_note("Car maintenance", "oil change", conn=conn)
+    hits = repository.search_fuzzy("recipie", conn=conn)
+    assert hits and hits[0]["id"] == target
+    assert 0.5 <= hits[0]["similarity"] <= 1.0
@@ -0,0 +1,30 @@
+from desktop_app.virtual_list import ListModel, Viewport
+
+
+def test_list_model_incremental_updates():
+    model = ListModel()
+    model.extend([(1, "a"), (2, "b"), (3, "c")])
+    assert model.upsert(2, "B") == 1
+    assert model.upsert(3, "C", position=0) == 0
+    assert model.upsert(4, "d") == 3
+    assert list(model.ids) == [3, 1, 2, 4]
+    assert model.labels == ["C", "a", "B", "d"]
+    assert model.remove(1) and not model.remove(99)
+    assert model.index(4) == 2 and model.index(1) == -1
+
+
+def test_viewport_window_and_prefetch():
+    vp = Viewport(rows=10, prefetch_pages=1)
+    total = 1000
+    assert vp.window(total) == range(0, 10)
+    assert not vp.needs_more(total)
+    vp.scroll_to_fraction(0.5, total)
+    assert vp.window(total) == range(500, 510)
+    assert vp.fractions(total) == (0.5, 0.51)
+    vp.scroll_by(10_000, total)
+    assert vp.window(total) == range(990, 1000) and vp.needs_more(total)
+    vp.ensure_visible(3, total)
+    assert vp.top == 3
+    vp.scroll_by(-50, total)
+    assert vp.top == 0
+    assert vp.fractions(5) == (0.0, 1.0)